@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# Compares the old way of pulling things out of pages (a full `html.parser`
+# tree searched with lambdas) with `python.helpers.html_extract`.
+#
+# Usage (from the repository root):
+#   python3 -m python.benchmarks.html_extraction saved-page.html [...]
+
+import argparse
+import statistics
+import time
+from typing import Callable
+
+from bs4 import BeautifulSoup
+
+from python.helpers import html_extract
+
+# What the handlers look for in embed pages
+SCRIPT_NEEDLES = [
+    "function(p,a,c,k,e,d)",
+    ";eval(",
+    "decodeURIComponent(escape(",
+    "MDCore.ref",
+    "a.redirect",
+    " src: ",
+    "document.getElementById('robotlink')",
+]
+
+
+def measure(fn: Callable[[], object], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def find_script_with_tree(page_html: str, needle: str):
+    tag = BeautifulSoup(page_html, "html.parser").find(
+        lambda tag: tag.name == "script" and needle in str(tag.string)
+    )
+    return tag.string if tag else None
+
+
+def bench_page(path: str, repeat: int) -> None:
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        page_html = f.read()
+
+    needles = [needle for needle in SCRIPT_NEEDLES if needle in page_html] or [
+        SCRIPT_NEEDLES[0]
+    ]
+
+    rows = [
+        (
+            "full parse (html.parser)",
+            measure(lambda: BeautifulSoup(page_html, "html.parser"), repeat),
+        ),
+        (
+            f"full parse ({html_extract.HTML_PARSER})",
+            measure(lambda: html_extract.parse(page_html), repeat),
+        ),
+    ]
+    for needle in needles:
+        rows += [
+            (
+                f"script {needle!r} (tree + lambda)",
+                measure(lambda: find_script_with_tree(page_html, needle), repeat),
+            ),
+            (
+                f"script {needle!r} (find_script)",
+                measure(lambda: html_extract.find_script(page_html, needle), repeat),
+            ),
+        ]
+
+    print(f"{path} ({len(page_html) / 1024:.0f} KiB, median of {repeat})")
+    width = max(len(name) for name, _ in rows)
+    for name, seconds in rows:
+        print(f"  {name.ljust(width)}  {seconds * 1000:9.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark HTML extraction on saved pages"
+    )
+    parser.add_argument("pages", nargs="+", help="Saved HTML pages")
+    parser.add_argument("-n", "--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for path in args.pages:
+        bench_page(path, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,9 @@
 import json
 import os
 import re
-import subprocess
-import tempfile
 import urllib.parse
 from dataclasses import dataclass, field
-from fractions import Fraction
-from itertools import chain
-from typing import Callable, Dict, List, TypeVar, Union, cast
+from typing import Any, Callable, Dict, List, TypeVar, Union
 from urllib.parse import (
     quote_plus as encode_url_component,
 )
@@ -17,23 +13,18 @@ from urllib.parse import (
     urlunparse,
 )
 
-import cloudscraper
 import requests
-from bs4 import BeautifulSoup, Tag
+from bs4 import Tag
 
+from python.helpers import crypto_js, html_extract, js_unpack
+from python.helpers.browser_pool import CapturedRequest, DefaultBrowserPool
 from python.helpers.deobfuscator import DefaultPlayerDeobfuscator
+from python.helpers.post_processors import POST_PROCESSORS, caption_tracks
 from python.helpers.retried_download import retried_download
+from python.helpers.routing import RoutingTable, load_route_rules, normalize_host
+from python.helpers.scraper_pool import get_scraper
 from python.log.console import Console
 
-try:
-    import playwright.sync_api
-except ImportError as err:
-    print("Installing playwright...")
-    assert os.system("pip install playwright") == 0
-    assert os.system("playwright install firefox") == 0
-import playwright.sync_api
-from playwright.sync_api import sync_playwright
-
 from .runners.js import run_js
 
 REQUEST_TIMEOUT_SECONDS = 10.0
@@ -49,12 +40,35 @@ class DownloadInfo:
     url: str
     referer: Union[str, None] = None
     headers: list[str] = field(default_factory=list)
-    after_dl: Callable[[str, "DownloadInfo"], None] = lambda x, y: None
+    # Name of the `POST_PROCESSORS` entry to run on the downloaded file...
+    post_processor: Union[str, None] = None
+    # ...and what it needs to know, which has to be JSON-serialisable
+    post_process_meta: dict[str, Any] = field(default_factory=dict)
+
+    def after_dl(self, output_file: str) -> None:
+        if self.post_processor is not None:
+            POST_PROCESSORS[self.post_processor](output_file, self.post_process_meta)
 
 
 HandlerFuncReturn = Union[None, DownloadInfo]
 
 
+def is_m3u8_url(url: str) -> bool:
+    return urllib.parse.urlparse(url).path.endswith(".m3u8")
+
+
+def download_info_from_browser_request(request: CapturedRequest) -> DownloadInfo:
+    return DownloadInfo(
+        url=request.url,
+        referer=request.headers.get("referer"),
+        headers=[
+            "Accept: */*",
+            f"Accept-Language: {request.headers.get('accept-language')}",
+            f"User-Agent: {request.headers.get('user-agent')}",
+        ],
+    )
+
+
 def handle__instagram_com(url: str) -> Union[List[str], None]:
     SESSION_ID_FILE = os.path.join(
         os.path.expanduser("~"),
@@ -136,7 +150,7 @@ def handle__streamani_net(url: str) -> HandlerFuncReturn:
 def handle__sbplay_one(url: str) -> HandlerFuncReturn:
     download_page = url.replace("/e/", "/d/")
     page_html = (
-        cloudscraper.create_scraper()
+        get_scraper(download_page)
         .get(
             download_page,
             headers={"User-Agent": DEFAULT_USER_AGENT},
@@ -146,7 +160,7 @@ def handle__sbplay_one(url: str) -> HandlerFuncReturn:
     )
 
     download_links = (
-        BeautifulSoup(page_html, "html.parser")
+        html_extract.parse(page_html, class_="contentbox")
         .find(class_="contentbox")
         .find("table")
         .find_all("td")
@@ -191,7 +205,7 @@ def handle__sbplay_one(url: str) -> HandlerFuncReturn:
     download_generator_url = f"https://sbplay.one/dl?op=download_orig&id={info.id}&mode={info.mode}&hash={info.hash}"
 
     page_html = (
-        cloudscraper.create_scraper()
+        get_scraper(download_generator_url)
         .get(
             download_generator_url,
             headers={"User-Agent": DEFAULT_USER_AGENT},
@@ -201,7 +215,7 @@ def handle__sbplay_one(url: str) -> HandlerFuncReturn:
     )
 
     download_link = (
-        BeautifulSoup(page_html, "html.parser")
+        html_extract.parse(page_html, class_="contentbox")
         .find(class_="contentbox")
         .find("a")["href"]
     )
@@ -211,7 +225,7 @@ def handle__sbplay_one(url: str) -> HandlerFuncReturn:
 
 def handle__mixdrop_co(url: str) -> HandlerFuncReturn:
     page_html = (
-        cloudscraper.create_scraper()
+        get_scraper(url)
         .get(
             url,
             headers={"User-Agent": DEFAULT_USER_AGENT},
@@ -220,11 +234,10 @@ def handle__mixdrop_co(url: str) -> HandlerFuncReturn:
         .text
     )
 
-    script_data = (
-        BeautifulSoup(page_html, "html.parser")
-        .find(lambda tag: tag.name == "script" and "MDCore.ref" in str(tag.string))
-        .string.strip()
-    )
+    script_data = html_extract.find_script(page_html, "MDCore.ref")
+    if not script_data:
+        return None
+    script_data = script_data.strip()
 
     payload = f"const MDCore = {{}}; {script_data}; process.stdout.write(`https:${{MDCore.wurl}}`);"
 
@@ -239,7 +252,7 @@ def handle__mixdrop_co(url: str) -> HandlerFuncReturn:
 def handle__vidplay_xyz(url: str) -> HandlerFuncReturn:
     parsed_url = urllib.parse.urlparse(url)
     base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
-    scraper = cloudscraper.create_scraper()
+    scraper = get_scraper(url)
 
     page_url_id = parsed_url.path.split("/")[-1]
 
@@ -304,175 +317,14 @@ def handle__vidplay_xyz(url: str) -> HandlerFuncReturn:
 
         tracks = resp_json.get("tracks")
 
-        def after_dl(output_file: str, download_info: DownloadInfo):
-            Console.log_dim("Donwnload done. Embedding metadata...", return_line=True)
-            if not tracks:
-                return None
-
-            @dataclass
-            class Metadata:
-                title: Union[str, None] = None
-                chapters: list["Chapter"] = field(default_factory=list)
-
-                def has_data(self) -> bool:
-                    return self.title is not None or len(self.chapters) > 0
-
-                def __str__(self) -> str:
-                    parts = []
-
-                    if self.title:
-                        parts.append(f"title={self.title}")
-
-                    if self.chapters:
-                        parts.extend(self.chapters)
-
-                    ret = ";FFMETADATA1\n"
-                    ret += "\n\n".join(map(lambda x: str(x).strip(), parts))
-                    return ret.strip()
-
-            @dataclass
-            class Chapter:
-                timebase: Fraction
-                start: int
-                end: int
-                title: Union[str, None] = None
-
-                def __post_init__(self):
-                    if self.start > self.end:
-                        raise ValueError("Start must be less than end")
-
-                    if self.start < 0:
-                        raise ValueError("Start must be greater than 0")
-
-                    if self.end < 0:
-                        raise ValueError("End must be greater than 0")
-
-                    if self.timebase > 1:
-                        raise ValueError("Timebase must be a fraction less than 1")
-
-                def __str__(self) -> str:
-                    parts = []
-                    if self.timebase:
-                        (num, den) = self.timebase.as_integer_ratio()
-                        parts.append(f"TIMEBASE={num}/{den}")
-                    if self.start:
-                        parts.append(f"START={str(self.start)}")
-                    if self.end:
-                        parts.append(f"END={str(self.end)}")
-                    if self.title:
-                        parts.append(f"title={self.title}")
-
-                    ret = "[CHAPTER]\n"
-                    ret += "\n".join(map(lambda x: x.strip(), parts))
-                    return ret.strip()
-
-            metadata = Metadata()
-            keep_characters = (" ", ".", "_", "-")
-
-            def safe_char(c):
-                if c.isalnum() or c in keep_characters:
-                    return c
-                return "_"
-
-            subtitles = [
-                {
-                    "lang": track["label"],
-                    "file_name": (
-                        "".join([safe_char(c) for c in track["label"]]).rstrip()
-                        + ".vtt"
-                    ).replace(r"_+", "_"),
-                    "url": track["file"],
-                }
-                for track in tracks
-                if "captions" == track.get("kind")
-            ]
-
-            cleanup_files = []
-
-            cmd_inputs = [
-                (output_file, cast(bool, True)),
-            ]
-
-            metadata_cmd = []
-            if metadata.has_data():
-                f = tempfile.NamedTemporaryFile(
-                    prefix=f"vidplay_xyz_metadata.{item_id_vrf}.",
-                    suffix=".txt",
-                    mode="w+",
-                    encoding="utf-8",
-                )
-                f.write(str(metadata))
-                f.flush()
-                cleanup_files.append(f)
-                cmd_inputs.append((f.name, False))
-                metadata_cmd.extend(
-                    [
-                        "-map_metadata",
-                        len(cmd_inputs) - 1,
-                    ]
-                )
-
-            for sub in subtitles:
-                cmd_inputs.append((sub["url"], True))
-
-            cmd = [
-                "ffmpeg",
-                *list(
-                    chain(
-                        *[["-i", cmd_input] for (cmd_input, _should_map) in cmd_inputs]
-                    )
-                ),
-                *list(
-                    chain(
-                        *[
-                            [
-                                "-map",
-                                str(i),
-                            ]
-                            for (i, (_cmd_input, should_map)) in enumerate(cmd_inputs)
-                            if should_map
-                        ]
-                    )
-                ),
-                *metadata_cmd,
-                "-c",
-                "copy",
-                *list(
-                    chain(
-                        *[
-                            [
-                                f"-metadata:s:s:{i}",
-                                f'language="{sub["lang"]}"',
-                            ]
-                            for i, sub in enumerate(subtitles)
-                        ]
-                    )
-                ),
-                os.path.splitext(output_file)[0] + ".mkv",
-            ]
-            cmd = list(map(str, cmd))
-            Console.log_dim("Embedding subtitles...", return_line=True)
-            with subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.DEVNULL,
-                bufsize=1,
-                text=True,
-            ) as proc:
-                res = proc.wait()
-
-                for f in cleanup_files:
-                    f.close()
-
-                if res != 0:
-                    return None
-
-            os.remove(output_file)
-
         return DownloadInfo(
             url=source["file"],
             referer=url,
-            after_dl=after_dl,
+            post_processor="embed_tracks" if tracks else None,
+            post_process_meta={
+                "name": f"vidplay_xyz_metadata.{item_id_vrf}",
+                "subtitles": caption_tracks(tracks or []),
+            },
         )
     except Exception:
         return None
@@ -481,7 +333,7 @@ def handle__vidplay_xyz(url: str) -> HandlerFuncReturn:
 def handle__embedsito_com(url: str) -> HandlerFuncReturn:
     api_id = url.split("/")[-1]
     resp = (
-        cloudscraper.create_scraper()
+        get_scraper(url)
         .post(
             f"https://embedsito.com/api/source/{api_id}",
             headers={
@@ -509,58 +361,40 @@ def handle__embedsito_com(url: str) -> HandlerFuncReturn:
 
 def handle__filemoon_sx(url: str) -> HandlerFuncReturn:
     page_html = (
-        cloudscraper.create_scraper()
+        get_scraper(url)
         .get(
             url,
             timeout=REQUEST_TIMEOUT_SECONDS,
         )
         .text
     )
-    packed_script = BeautifulSoup(page_html, "html.parser").find(
-        lambda tag: tag.name == "script" and "function(p,a,c,k,e,d)" in str(tag.string)
-    )
-
-    if isinstance(packed_script, Tag):
-        packed_script = packed_script.string
-    else:
-        return None
-
+    packed_script = html_extract.find_script(page_html, "function(p,a,c,k,e,d)")
     if not packed_script:
         return None
 
-    payload_regex = r"/\.setup\((\{.*?\})\);/"
-    payload = f"""
-    const fn = {packed_script[4:]};
-    const fnStr = fn.toString();
-    const fnDataMatch = {payload_regex}.exec(fnStr);
-    const fnData = fnDataMatch[1];
-    eval(`var fnFinalData = ${"{fnData}"};`);
-    console.log(JSON.stringify(fnFinalData["sources"]));
-    """
-    r = run_js(payload)
-
-    if not r:
+    setup_match = re.search(
+        r"\.setup\((\{.*?\})\);", js_unpack.unpack(packed_script), re.DOTALL
+    )
+    if not setup_match:
         return None
 
-    try:
-        video_info = json.loads(r)
-        sources = video_info
-        if len(sources) == 0:
-            return None
-
-        source = sources[0]
-
-        video_url = source["file"]
-    except Exception:
+    # The first of `sources: [{file: "..."}, ...]`
+    source_match = re.search(
+        r"""sources\s*:\s*\[\s*\{[^}]*?\bfile\s*:\s*(["'])(.+?)\1""",
+        setup_match.group(1),
+    )
+    if not source_match:
         return None
 
+    video_url = source_match.group(2)
+
     return DownloadInfo(url=video_url, referer=url)
 
 
 def handle__pahe_win(url: str, referer: str) -> HandlerFuncReturn:
     response = retried_download(
         "pahe.win page",
-        lambda: cloudscraper.create_scraper().get(
+        lambda: get_scraper(url).get(
             url,
             timeout=REQUEST_TIMEOUT_SECONDS,
             headers={
@@ -573,15 +407,7 @@ def handle__pahe_win(url: str, referer: str) -> HandlerFuncReturn:
         return None
 
     page_html = response.text
-    script_tag = BeautifulSoup(page_html, "html.parser").find(
-        lambda tag: tag.name == "script" and "a.redirect" in str(tag.string)
-    )
-
-    if not isinstance(script_tag, Tag):
-        return None
-
-    script_tag = script_tag.string
-
+    script_tag = html_extract.find_script(page_html, "a.redirect")
     if not script_tag:
         return None
 
@@ -596,7 +422,7 @@ def handle__pahe_win(url: str, referer: str) -> HandlerFuncReturn:
 
 
 def handle__kwik_si(url: str, referer: str) -> HandlerFuncReturn:
-    scraper = cloudscraper.create_scraper()
+    scraper = get_scraper(url)
 
     def handle_embed(url: str):
         response = retried_download(
@@ -616,26 +442,16 @@ def handle__kwik_si(url: str, referer: str) -> HandlerFuncReturn:
 
         page_html = response.text
 
-        script_with_src = BeautifulSoup(page_html, "html.parser").find(
-            lambda tag: tag.name == "script"
-            and "eval(" in str(tag.string)
-            and ";eval(" in str(tag.string)
-        )
-        script_with_src = (
-            script_with_src.string if isinstance(script_with_src, Tag) else None
-        )
-
+        script_with_src = html_extract.find_script(page_html, ";eval(")
         if not script_with_src:
             return None
 
-        interesting_code = script_with_src.split(";eval(")[1][:-1]
-        code_to_run = f"console.log(String({interesting_code}.substring(0, 1500))"
-        run_js_result = run_js(code_to_run)
-        if not run_js_result:
-            Console.log_dim("Couldn't run js for kwik.si embed page")
+        unpacked_code = js_unpack.unpack_chained_eval(script_with_src)
+        if unpacked_code is None:
+            Console.log_dim("Couldn't unpack kwik.si embed page script")
             return None
 
-        source_match = re.search(r"source\s*=\s*'([^']+)'\s*;", run_js_result)
+        source_match = re.search(r"source\s*=\s*'([^']+)'\s*;", unpacked_code)
         source = source_match.group(1) if source_match else None
         if not source:
             Console.log_dim("Couldn't find source for kwik.si embed page")
@@ -660,55 +476,28 @@ def handle__kwik_si(url: str, referer: str) -> HandlerFuncReturn:
             return None
 
         page_html = response.text
-        script_with_src = BeautifulSoup(page_html, "html.parser").find(
-            lambda tag: tag.name == "script"
-            and "decodeURIComponent(escape(" in str(tag.string)
+        script_with_src = html_extract.find_script(
+            page_html, "decodeURIComponent(escape("
         )
-        if isinstance(script_with_src, Tag):
-            script_with_src = script_with_src.string
-        else:
-            Console.log_dim("Couldn't find script with src for kwik.si embed page")
-            script_with_src = None
-
         if not script_with_src:
+            Console.log_dim("Couldn't find script with src for kwik.si embed page")
             return None
 
-        src_without_eval = (
-            r'var _ENCODE_URI_TO_ESCAPE_LUT = [["!","%21"],["\'","%27"],["(","%28"],[")","%29"],["+","+"],["/","/"],["@","@"],["~","%7E"],["%C2%80","%80"],["%C2%81","%81"],["%C2%82","%82"],["%C2%83","%83"],["%C2%84","%84"],["%C2%85","%85"],["%C2%86","%86"],["%C2%87","%87"],["%C2%88","%88"],["%C2%89","%89"],["%C2%8A","%8A"],["%C2%8B","%8B"],["%C2%8C","%8C"],["%C2%8D","%8D"],["%C2%8E","%8E"],["%C2%8F","%8F"],["%C2%90","%90"],["%C2%91","%91"],["%C2%92","%92"],["%C2%93","%93"],["%C2%94","%94"],["%C2%95","%95"],["%C2%96","%96"],["%C2%97","%97"],["%C2%98","%98"],["%C2%99","%99"],["%C2%9A","%9A"],["%C2%9B","%9B"],["%C2%9C","%9C"],["%C2%9D","%9D"],["%C2%9E","%9E"],["%C2%9F","%9F"],["%C2%A0","%A0"],["%C2%A1","%A1"],["%C2%A2","%A2"],["%C2%A3","%A3"],["%C2%A4","%A4"],["%C2%A5","%A5"],["%C2%A6","%A6"],["%C2%A7","%A7"],["%C2%A8","%A8"],["%C2%A9","%A9"],["%C2%AA","%AA"],["%C2%AB","%AB"],["%C2%AC","%AC"],["%C2%AD","%AD"],["%C2%AE","%AE"],["%C2%AF","%AF"],["%C2%B0","%B0"],["%C2%B1","%B1"],["%C2%B2","%B2"],["%C2%B3","%B3"],["%C2%B4","%B4"],["%C2%B5","%B5"],["%C2%B6","%B6"],["%C2%B7","%B7"],["%C2%B8","%B8"],["%C2%B9","%B9"],["%C2%BA","%BA"],["%C2%BB","%BB"],["%C2%BC","%BC"],["%C2%BD","%BD"],["%C2%BE","%BE"],["%C2%BF","%BF"],["%C3%80","%C0"],["%C3%81","%C1"],["%C3%82","%C2"],["%C3%83","%C3"],["%C3%84","%C4"],["%C3%85","%C5"],["%C3%86","%C6"],["%C3%87","%C7"],["%C3%88","%C8"],["%C3%89","%C9"],["%C3%8A","%CA"],["%C3%8B","%CB"],["%C3%8C","%CC"],["%C3%8D","%CD"],["%C3%8E","%CE"],["%C3%8F","%CF"],["%C3%90","%D0"],["%C3%91","%D1"],["%C3%92","%D2"],["%C3%93","%D3"],["%C3%94","%D4"],["%C3%95","%D5"],["%C3%96","%D6"],["%C3%97","%D7"],["%C3%98","%D8"],["%C3%99","%D9"],["%C3%9A","%DA"],["%C3%9B","%DB"],["%C3%9C","%DC"],["%C3%9D","%DD"],["%C3%9E","%DE"],["%C3%9F","%DF"],["%C3%A0","%E0"],["%C3%A1","%E1"],["%C3%A2","%E2"],["%C3%A3","%E3"],["%C3%A4","%E4"],["%C3%A5","%E5"],["%C3%A6","%E6"],["%C3%A7","%E7"],["%C3%A8","%E8"],["%C3%A9","%E9"],["%C3%AA","%EA"],["%C3%AB","%EB"],["%C3%AC","%EC"],["%C3%AD","%ED"],["%C3%AE","%EE"],["%C3%AF","%EF"],["%C3%B0","%F0"],["%C3%B1","%F1"],["%C3%B2","%F2"],["%C3%B3","%F3"],["%C3%B4","%F4"],["%C3%B5","%F5"],["%C3%B6","%F6"],["%C3%B7","%F7"],["%C3%B8","%F8"],["%C3%B9","%F9"],["%C3%BA","%FA"],["%C3%BB","%FB"],["%C3%BC","%FC"],["%C3%BD","%FD"],["%C3%BE","%FE"],["%C3%BF","%FF"]];'
-            + """
-            ;
-            function escape(string) {
-                let str = encodeURI(string);
-                for (const [encodeUriChar, escapeChar] of _ENCODE_URI_TO_ESCAPE_LUT) {
-                    str = str.replaceAll(encodeUriChar, escapeChar);
-                }
-                return str;
-            }
-            function __HANDLE_RESULT(result) {
-                result = String(result);
-                var resultLen = result.length;
-                var last1500Chars = String(result).substr(resultLen - 1500, 1500);
-                console.log(last1500Chars);
-            }
-            ;
-            """
-            + script_with_src.replace("eval(", "__HANDLE_RESULT(")
-        )
-        run_js_result = run_js(src_without_eval)
-        if not run_js_result:
-            Console.log_dim("kwik.si info page js eval failed")
+        unpacked_code = js_unpack.unpack_hunter(script_with_src)
+        if not unpacked_code:
+            Console.log_dim("Couldn't unpack kwik.si info page script")
             return None
 
         form_match = re.search(
             r'(<form action="https://kwik.si/d/[^"]+" method="POST">[^\']+</form>)',
-            run_js_result,
+            unpacked_code,
         )
         form_match = form_match.group(1) if form_match else None
         if not form_match:
             Console.log_dim("Couldn't find form in kwik.si eval result")
             return None
 
-        form_match = BeautifulSoup(form_match, "html.parser").find("form")
+        form_match = html_extract.select_one(form_match, "form")
         if not isinstance(form_match, Tag):
             Console.log_dim("Couldn't find form in kwik.si eval result")
             return None
@@ -769,22 +558,14 @@ def handle__kwik_si(url: str, referer: str) -> HandlerFuncReturn:
 
 def handle__www_mp4upload_com(url: str) -> HandlerFuncReturn:
     page_html = (
-        cloudscraper.create_scraper()
+        get_scraper(url)
         .get(
             url,
             timeout=REQUEST_TIMEOUT_SECONDS,
         )
         .text
     )
-    script_with_src = BeautifulSoup(page_html, "html.parser").find(
-        lambda tag: tag.name == "script" and " src: " in str(tag.string)
-    )
-
-    if isinstance(script_with_src, Tag):
-        script_with_src = script_with_src.string
-    else:
-        script_with_src = None
-
+    script_with_src = html_extract.find_script(page_html, " src: ")
     if not script_with_src:
         return None
 
@@ -808,7 +589,7 @@ def handle__ani_googledrive_stream(url: str) -> HandlerFuncReturn:
 
 def handle__play_api_web_site(url: str) -> HandlerFuncReturn:
     url_info = urllib.parse.urlparse(url)
-    request = cloudscraper.create_scraper().post(
+    request = get_scraper("https://play.api-web.site").post(
         "https://play.api-web.site/src.php",
         data={
             "id": urllib.parse.parse_qs(url_info.query)["id"],
@@ -830,7 +611,7 @@ def handle__play_api_web_site(url: str) -> HandlerFuncReturn:
 
 def handle__gogoplay1_com(url: str) -> HandlerFuncReturn:
     def get_embedplus_data(url: str) -> HandlerFuncReturn:
-        response = cloudscraper.create_scraper().get(
+        response = get_scraper(url).get(
             url,
             timeout=REQUEST_TIMEOUT_SECONDS,
         )
@@ -838,7 +619,7 @@ def handle__gogoplay1_com(url: str) -> HandlerFuncReturn:
             return None
         page_html = response.text
 
-        page = BeautifulSoup(page_html, "html.parser")
+        page = html_extract.parse(page_html)
 
         attr_script_crypto_a = page.find("body")["class"][0].split("-")[1]
         attr_script_crypto_b = page.find(
@@ -862,56 +643,31 @@ def handle__gogoplay1_com(url: str) -> HandlerFuncReturn:
             "data-value"
         ]
 
-        current_file_path = os.path.dirname(os.path.realpath(__file__))
-        lib_path = os.path.join(
-            current_file_path,
-            "runners",
-            "libraries",
-            "js",
-            "crypto-js.min.js",
-        )
+        try:
+            elver = crypto_js.decrypt(
+                attr_script_crypto,
+                attr_script_crypto_a,
+                attr_script_crypto_b,
+            ).decode("utf-8")
+        except ValueError:
+            return None
 
-        with open(lib_path) as f:
-            lib_contents = f.read()
-
-        result = run_js(
-            f"""
-                const CryptoJS = require('./crypto');
-
-                const attr_script_crypto_a = {json.dumps(attr_script_crypto_a)};
-                const attr_script_crypto_b = {json.dumps(attr_script_crypto_b)};
-                const attr_script_crypto = {json.dumps(attr_script_crypto)};
-
-                const candon = 
-                    CryptoJS['AES']['decrypt'](attr_script_crypto, CryptoJS['enc']['Utf8'].parse(attr_script_crypto_a), {{
-                        iv: CryptoJS.enc['Utf8']['parse'](attr_script_crypto_b)
-                    }})
-                ;
-                const elver = CryptoJS['enc']['Utf8']['stringify'](candon);
-                const dandrell = elver.substr(0, elver.indexOf("&"));
-
-                process.stdout.write(
-                    '/encrypt-ajax.php?id=' + CryptoJS.AES['encrypt'](
-                        dandrell,
-                        CryptoJS.enc.Utf8['parse'](attr_script_crypto_a),
-                        {{
-                            iv: CryptoJS['enc']['Utf8'].parse(attr_script_crypto_b)
-                        }}
-                    )['toString']() + elver.substr(elver['indexOf']("&")) + '&alias=' + dandrell
-                );
-            """,
-            files=[
-                {
-                    "name": "crypto.js",
-                    "content": lib_contents,
-                },
-            ],
+        # Same as JS' `substr` with an `indexOf` of -1
+        separator_index = elver.find("&")
+        dandrell = elver[:separator_index] if separator_index >= 0 else ""
+        query_rest = elver[separator_index:] if separator_index >= 0 else elver[-1:]
+
+        encrypted_id = crypto_js.encrypt(
+            dandrell,
+            attr_script_crypto_a,
+            attr_script_crypto_b,
         )
+        result = f"/encrypt-ajax.php?id={encrypted_id}{query_rest}&alias={dandrell}"
 
         parsed = urllib.parse.urlparse(url)
         api_url = f"{parsed.scheme}://{parsed.netloc}{result}"
 
-        response = cloudscraper.create_scraper().get(
+        response = get_scraper(api_url).get(
             api_url,
             headers={
                 "User-Agent": DEFAULT_USER_AGENT,
@@ -926,34 +682,14 @@ def handle__gogoplay1_com(url: str) -> HandlerFuncReturn:
 
         api_response = response.json()
 
-        result = run_js(
-            f"""
-                const CryptoJS = require('./crypto');
-
-                const attr_script_crypto_b = {json.dumps(attr_script_crypto_b)};
-                const attr_script_crypto_c = {json.dumps(attr_script_crypto_c)};
-
-                const resp = {json.dumps(api_response)};
-
-                process.stdout.write(
-                    CryptoJS.enc.Utf8.stringify(
-                        CryptoJS['AES'].decrypt(
-                            resp['data'],
-                            CryptoJS['enc'].Utf8['parse'](attr_script_crypto_c),
-                            {{
-                                iv: CryptoJS['enc']['Utf8']['parse'](attr_script_crypto_b)
-                            }},
-                        ),
-                    ),
-                );
-            """,
-            files=[
-                {
-                    "name": "crypto.js",
-                    "content": lib_contents,
-                },
-            ],
-        )
+        try:
+            result = crypto_js.decrypt(
+                api_response["data"],
+                attr_script_crypto_c,
+                attr_script_crypto_b,
+            ).decode("utf-8")
+        except (KeyError, ValueError):
+            return None
 
         if not result:
             return None
@@ -987,7 +723,7 @@ def handle__gogoplay1_com(url: str) -> HandlerFuncReturn:
 
 
 def handle__dood_ws(url: str) -> HandlerFuncReturn:
-    response = cloudscraper.create_scraper().get(
+    response = get_scraper(url).get(
         url,
         timeout=REQUEST_TIMEOUT_SECONDS,
     )
@@ -1002,7 +738,7 @@ def handle__dood_ws(url: str) -> HandlerFuncReturn:
     something_url = parsed_url._replace(path=f"/pass_md5/{something_url.group(1)}")
     something_url = urlunparse(something_url)
 
-    response = cloudscraper.create_scraper().get(
+    response = get_scraper(something_url).get(
         something_url,
         headers={
             "User-Agent": DEFAULT_USER_AGENT,
@@ -1021,7 +757,7 @@ def handle__dood_ws(url: str) -> HandlerFuncReturn:
 
 def handle__fembed_hd_com(url: str) -> HandlerFuncReturn:
     file_id = url.split("/")[-1]
-    response = cloudscraper.create_scraper().post(
+    response = get_scraper("https://fembed-hd.com").post(
         f"https://fembed-hd.com/api/source/{file_id}",
         data={
             "r": "",
@@ -1059,7 +795,7 @@ def handle__fembed_hd_com(url: str) -> HandlerFuncReturn:
 
 
 def handle__streamtape_net(url: str) -> HandlerFuncReturn:
-    response = cloudscraper.create_scraper().get(
+    response = get_scraper(url).get(
         url,
         headers={
             "User-Agent": DEFAULT_USER_AGENT,
@@ -1074,14 +810,12 @@ def handle__streamtape_net(url: str) -> HandlerFuncReturn:
 
     page_html = response.text
 
-    script_tag = (
-        BeautifulSoup(page_html, "html.parser")
-        .find(
-            lambda tag: tag.name == "script"
-            and "document.getElementById('robotlink')" in str(tag.string)
-        )
-        .string.strip()
+    script_tag = html_extract.find_script(
+        page_html, "document.getElementById('robotlink')"
     )
+    if not script_tag:
+        return None
+    script_tag = script_tag.strip()
 
     encoded_url = re.search(
         r"document\.getElementById\(\'robotlink\'\)\.innerHTML\s*=\s*([^;]+)",
@@ -1101,60 +835,20 @@ def handle__streamtape_net(url: str) -> HandlerFuncReturn:
 
 
 def handle__watchsb_com(url: str) -> HandlerFuncReturn:
-    class RequestHandler:
-        m3u8_url = None
-        user_agent = None
-        accept_language = None
-        referer = None
-
-        def handle_request(self, req):
-            if self.m3u8_url is not None:
-                return
-
-            parsed = urllib.parse.urlparse(req.url)
-            is_video = parsed.path.endswith(".m3u8")
-
-            if not is_video:
-                return
-
-            self.m3u8_url = req.url
-            self.accept_language = req.headers.get("accept-language")
-            self.user_agent = req.headers.get("user-agent")
-            self.referer = req.headers.get("referer")
-            page.close()
-
-    handler = RequestHandler()
-
-    try:
-        with sync_playwright() as p:
-            browser = p.firefox.launch()
-            page = browser.new_page()
-            page.on("request", handler.handle_request)
-            while handler.m3u8_url is None:
-                try:
-                    page.goto(url)
-                    page.click('#mediaplayer [aria-label="Play"]', force=True)
-                except Exception:
-                    pass
-
-            browser.close()
-    except playwright.sync_api.Error as err:
+    request = DefaultBrowserPool.capture_request(
+        url,
+        is_m3u8_url,
+        click='#mediaplayer [aria-label="Play"]',
+    )
+    if not request:
         return None
 
-    return DownloadInfo(
-        url=handler.m3u8_url,
-        referer=handler.referer,
-        headers=[
-            "Accept: */*",
-            f"Accept-Language: {handler.accept_language}",
-            f"User-Agent: {handler.user_agent}",
-        ],
-    )
+    return download_info_from_browser_request(request)
 
 
 def handle__megacloud_tv(url: str, referer: str) -> HandlerFuncReturn:
     accept_language = "en-GB,en-US;q=0.9,en;q=0.8,hr;q=0.7"
-    scraper = cloudscraper.create_scraper()
+    scraper = get_scraper(url)
     response = scraper.get(
         url,
         headers={
@@ -1169,7 +863,7 @@ def handle__megacloud_tv(url: str, referer: str) -> HandlerFuncReturn:
 
     page_html = response.text
 
-    page_parsed = BeautifulSoup(page_html, "html.parser")
+    page_parsed = html_extract.parse(page_html)
 
     player_embed_el = page_parsed.find(id="megacloud-player")
 
@@ -1206,12 +900,11 @@ def handle__megacloud_tv(url: str, referer: str) -> HandlerFuncReturn:
         if len(sources) > 0:
             m3u8_url = page_json.get("sources")[0].get("file")
     else:
-        player_url = next(
-            x
-            for x in page_parsed.find_all("script")
-            if x.attrs.get("src")
-            and x.attrs["src"].startswith("/js/player/a/prod/e1-player.min.js")
-        ).attrs["src"]
+        player_url = html_extract.select_attr(
+            page_parsed, 'script[src^="/js/player/a/prod/e1-player.min.js"]', "src"
+        )
+        if not player_url:
+            return None
         player_url = urljoin(response.url, player_url)
         Console.log_dim("Got encrypted response. Breaking...", return_line=True)
         sources_resp = DefaultPlayerDeobfuscator.post(
@@ -1240,215 +933,6 @@ def handle__megacloud_tv(url: str, referer: str) -> HandlerFuncReturn:
         except Exception:
             return None
 
-    def after_dl(output_file: str, download_info: DownloadInfo):
-        Console.log_dim("Donwnload done. Embedding metadata...", return_line=True)
-        if "tracks" not in page_json:
-            return None
-
-        @dataclass
-        class Metadata:
-            title: Union[str, None] = None
-            chapters: list["Chapter"] = field(default_factory=list)
-
-            def has_data(self) -> bool:
-                return self.title is not None or len(self.chapters) > 0
-
-            def __str__(self) -> str:
-                parts = []
-
-                if self.title:
-                    parts.append(f"title={self.title}")
-
-                if self.chapters:
-                    parts.extend(self.chapters)
-
-                ret = ";FFMETADATA1\n"
-                ret += "\n\n".join(map(lambda x: str(x).strip(), parts))
-                return ret.strip()
-
-        @dataclass
-        class Chapter:
-            timebase: Fraction
-            start: int
-            end: int
-            title: Union[str, None] = None
-
-            def __post_init__(self):
-                if self.start > self.end:
-                    raise ValueError("Start must be less than end")
-
-                if self.start < 0:
-                    raise ValueError("Start must be greater than 0")
-
-                if self.end < 0:
-                    raise ValueError("End must be greater than 0")
-
-                if self.timebase > 1:
-                    raise ValueError("Timebase must be a fraction less than 1")
-
-            def __str__(self) -> str:
-                parts = []
-                if self.timebase:
-                    (num, den) = self.timebase.as_integer_ratio()
-                    parts.append(f"TIMEBASE={num}/{den}")
-                if self.start:
-                    parts.append(f"START={str(self.start)}")
-                if self.end:
-                    parts.append(f"END={str(self.end)}")
-                if self.title:
-                    parts.append(f"title={self.title}")
-
-                ret = "[CHAPTER]\n"
-                ret += "\n".join(map(lambda x: x.strip(), parts))
-                return ret.strip()
-
-        metadata = Metadata()
-
-        if "intro" in page_json and "outro" in page_json:
-            intro = page_json["intro"]
-            outro = page_json["outro"]
-            timescale = 1000
-
-            intro_start = int(intro["start"]) * timescale
-            intro_end = int(intro["end"]) * timescale
-
-            outro_start = int(outro["start"]) * timescale
-            outro_end = int(outro["end"]) * timescale
-
-            if intro_start < intro_end and outro_start < outro_end:
-                if intro_start > 0:
-                    metadata.chapters.append(
-                        Chapter(
-                            title="Pre-intro",
-                            start=0,
-                            end=intro_start - 1,
-                            timebase=Fraction(1, timescale),
-                        )
-                    )
-                metadata.chapters.append(
-                    Chapter(
-                        title="Intro",
-                        start=intro_start,
-                        end=intro_end - 1,
-                        timebase=Fraction(1, timescale),
-                    )
-                )
-                metadata.chapters.append(
-                    Chapter(
-                        title="Story",
-                        start=intro_end,
-                        end=outro_start - 1,
-                        timebase=Fraction(1, timescale),
-                    )
-                )
-                metadata.chapters.append(
-                    Chapter(
-                        title="Outro",
-                        start=outro_start,
-                        end=outro_end - 1,
-                        timebase=Fraction(1, timescale),
-                    )
-                )
-
-        keep_characters = (" ", ".", "_", "-")
-
-        def safe_char(c):
-            if c.isalnum() or c in keep_characters:
-                return c
-            return "_"
-
-        subtitles = [
-            {
-                "lang": track["label"],
-                "file_name": (
-                    "".join([safe_char(c) for c in track["label"]]).rstrip() + ".vtt"
-                ).replace(r"_+", "_"),
-                "url": track["file"],
-            }
-            for track in page_json["tracks"]
-            if "captions" == track["kind"]
-        ]
-
-        cleanup_files = []
-
-        cmd_inputs = [
-            (output_file, True),
-        ]
-
-        metadata_cmd = []
-        if metadata.has_data():
-            f = tempfile.NamedTemporaryFile(
-                prefix=f"megacloud_tv_metadata.{item_id}.",
-                suffix=".txt",
-                mode="w+",
-                encoding="utf-8",
-            )
-            f.write(str(metadata))
-            f.flush()
-            cleanup_files.append(f)
-            cmd_inputs.append((f.name, False))
-            metadata_cmd.extend(
-                [
-                    "-map_metadata",
-                    len(cmd_inputs) - 1,
-                ]
-            )
-
-        for sub in subtitles:
-            cmd_inputs.append((sub["url"], True))
-
-        cmd = [
-            "ffmpeg",
-            *list(
-                chain(*[["-i", cmd_input] for (cmd_input, _should_map) in cmd_inputs])
-            ),
-            *list(
-                chain(
-                    *[
-                        [
-                            "-map",
-                            str(i),
-                        ]
-                        for (i, (_cmd_input, should_map)) in enumerate(cmd_inputs)
-                        if should_map
-                    ]
-                )
-            ),
-            *metadata_cmd,
-            "-c",
-            "copy",
-            *list(
-                chain(
-                    *[
-                        [
-                            f"-metadata:s:s:{i}",
-                            f'language="{sub["lang"]}"',
-                        ]
-                        for i, sub in enumerate(subtitles)
-                    ]
-                )
-            ),
-            os.path.splitext(output_file)[0] + ".mkv",
-        ]
-        cmd = list(map(str, cmd))
-        Console.log_dim("Embedding subtitles...", return_line=True)
-        with subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            bufsize=1,
-            text=True,
-        ) as proc:
-            res = proc.wait()
-
-            for f in cleanup_files:
-                f.close()
-
-            if res != 0:
-                return None
-
-        os.remove(output_file)
-
     if m3u8_url is None:
         return None
 
@@ -1461,13 +945,19 @@ def handle__megacloud_tv(url: str, referer: str) -> HandlerFuncReturn:
             # "Origin: https://rapid-cloud.co",
             f"User-Agent: {DEFAULT_USER_AGENT}",
         ],
-        after_dl=after_dl,
+        post_processor="embed_tracks" if "tracks" in page_json else None,
+        post_process_meta={
+            "name": f"megacloud_tv_metadata.{item_id}",
+            "subtitles": caption_tracks(page_json.get("tracks") or []),
+            "intro": page_json.get("intro"),
+            "outro": page_json.get("outro"),
+        },
     )
 
 
 def handle__rapid_cloud_co(url: str, referer: str) -> HandlerFuncReturn:
     accept_language = "en-GB,en-US;q=0.9,en;q=0.8,hr;q=0.7"
-    scraper = cloudscraper.create_scraper()
+    scraper = get_scraper(url)
     response = scraper.get(
         url,
         headers={
@@ -1482,7 +972,7 @@ def handle__rapid_cloud_co(url: str, referer: str) -> HandlerFuncReturn:
 
     page_html = response.text
 
-    page_parsed = BeautifulSoup(page_html, "html.parser")
+    page_parsed = html_extract.parse(page_html)
 
     player_embed_el = page_parsed.find(class_="vidcloud-player-embed")
 
@@ -1515,12 +1005,11 @@ def handle__rapid_cloud_co(url: str, referer: str) -> HandlerFuncReturn:
 
     m3u8_url = None
     if encrypted:
-        player_url = next(
-            x
-            for x in page_parsed.find_all("script")
-            if x.attrs.get("src")
-            and x.attrs["src"].startswith("/js/player/prod/e6-player.min.js")
-        ).attrs["src"]
+        player_url = html_extract.select_attr(
+            page_parsed, 'script[src^="/js/player/prod/e6-player.min.js"]', "src"
+        )
+        if not player_url:
+            return None
         player_url = urljoin(response.url, player_url)
         Console.log_dim("Got encrypted response. Breaking...", return_line=True)
         key_resp = DefaultPlayerDeobfuscator.post(
@@ -1544,37 +1033,13 @@ def handle__rapid_cloud_co(url: str, referer: str) -> HandlerFuncReturn:
         Console.log_dim(
             f"Got encryption key `{key}'. Decrypting stream info...", return_line=True
         )
-        current_file_path = os.path.dirname(os.path.realpath(__file__))
-        lib_path = os.path.join(
-            current_file_path,
-            "runners",
-            "libraries",
-            "js",
-            "crypto-js.min.js",
-        )
-
-        with open(lib_path) as f:
-            lib_contents = f.read()
-
-        payload = f"""
-            const CryptoJS = require('./crypto');
-
-            const key = {json.dumps(key)};
-            const sources = {json.dumps(page_json.get("sources"))};
-
-            process.stdout.write(
-                CryptoJS.AES.decrypt(sources, key).toString(CryptoJS.enc.Utf8),
-            );
-        """
-        result = run_js(
-            payload,
-            files=[
-                {
-                    "name": "crypto.js",
-                    "content": lib_contents,
-                },
-            ],
-        )
+        try:
+            result = crypto_js.decrypt_with_passphrase(
+                page_json.get("sources"),
+                key,
+            ).decode("utf-8")
+        except (TypeError, ValueError):
+            return None
         result = result.strip()
 
         try:
@@ -1624,98 +1089,6 @@ def handle__rapid_cloud_co(url: str, referer: str) -> HandlerFuncReturn:
     # except playwright.sync_api.Error as err:
     #     return None
 
-    def after_dl(output_file: str, download_info: DownloadInfo):
-        # item_id = page_parsed.find(id="vidcloud-player").attrs["data-id"]
-        # response = scraper.get(
-        #     f"https://rapid-cloud.co/ajax/embed-6/getSources?id={item_id}",
-        #     headers={
-        #         "Referer": url,
-        #         "User-Agent": DEFAULT_USER_AGENT,
-        #         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
-        #     },
-        # )
-        # if not response:
-        #     return None
-        # page_json = response.json()
-
-        if "tracks" not in page_json:
-            return None
-
-        keep_characters = (" ", ".", "_", "-")
-
-        def safe_char(c):
-            if c.isalnum() or c in keep_characters:
-                return c
-            return "_"
-
-        subtitles = [
-            {
-                "lang": track["label"],
-                "file_name": (
-                    "".join([safe_char(c) for c in track["label"]]).rstrip() + ".vtt"
-                ).replace(r"_+", "_"),
-                "url": track["file"],
-            }
-            for track in page_json["tracks"]
-            if "captions" == track["kind"]
-        ]
-        cmd = [
-            "ffmpeg",
-            "-i",
-            output_file,
-            *list(
-                chain(
-                    *[
-                        [
-                            "-i",
-                            sub["url"],
-                        ]
-                        for sub in subtitles
-                    ]
-                )
-            ),
-            "-map",
-            "0",
-            *list(
-                chain(
-                    *[
-                        [
-                            "-map",
-                            str(i + 1),
-                        ]
-                        for i in range(len(subtitles))
-                    ]
-                )
-            ),
-            "-c",
-            "copy",
-            *list(
-                chain(
-                    *[
-                        [
-                            # f"-metadata:s:s:{i}", f"name='{sub['lang']}'",
-                            # f"-metadata:s:s:{i}", f"language='{re.search(r'^([a-zA-Z]+)', os.path.basename(urlparse(sub['url']).path)).group(1)}'",
-                            f"-metadata:s:s:{i}",
-                            f'language="{sub["lang"]}"',
-                        ]
-                        for i, sub in enumerate(subtitles)
-                    ]
-                )
-            ),
-            os.path.splitext(output_file)[0] + ".mkv",
-        ]
-        Console.log_dim("Embedding subtitles...", return_line=True)
-        with subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            bufsize=1,
-            text=True,
-        ) as proc:
-            if proc.wait() != 0:
-                return None
-        os.remove(output_file)
-
     if m3u8_url is None:
         return None
 
@@ -1728,60 +1101,24 @@ def handle__rapid_cloud_co(url: str, referer: str) -> HandlerFuncReturn:
             # "Origin: https://rapid.cloud.co",
             f"User-Agent: {DEFAULT_USER_AGENT}",
         ],
-        after_dl=after_dl,
+        post_processor="embed_tracks" if "tracks" in page_json else None,
+        post_process_meta={
+            "name": f"rapid_cloud_co_metadata.{item_id}",
+            "subtitles": caption_tracks(page_json.get("tracks") or []),
+        },
     )
 
 
 def handle__filelions_com(url: str) -> HandlerFuncReturn:
-    class RequestHandler:
-        m3u8_url = None
-        user_agent = None
-        accept_language = None
-        referer = None
-
-        def handle_request(self, req):
-            if self.m3u8_url is not None:
-                return
-
-            parsed = urllib.parse.urlparse(req.url)
-            is_video = parsed.path.endswith(".m3u8")
-
-            if not is_video:
-                return
-
-            self.m3u8_url = req.url
-            self.accept_language = req.headers.get("accept-language")
-            self.user_agent = req.headers.get("user-agent")
-            self.referer = req.headers.get("referer")
-            page.close()
-
-    handler = RequestHandler()
-
-    try:
-        with sync_playwright() as p:
-            browser = p.firefox.launch()
-            page = browser.new_page()
-            page.on("request", handler.handle_request)
-            while handler.m3u8_url is None:
-                try:
-                    page.goto(url)
-                    page.click('#vplayer [aria-label="Play"]', force=True)
-                except Exception:
-                    pass
-
-            browser.close()
-    except playwright.sync_api.Error as err:
+    request = DefaultBrowserPool.capture_request(
+        url,
+        is_m3u8_url,
+        click='#vplayer [aria-label="Play"]',
+    )
+    if not request:
         return None
 
-    return DownloadInfo(
-        url=handler.m3u8_url,
-        referer=handler.referer,
-        headers=[
-            "Accept: */*",
-            f"Accept-Language: {handler.accept_language}",
-            f"User-Agent: {handler.user_agent}",
-        ],
-    )
+    return download_info_from_browser_request(request)
 
 
 handlers: Dict[
@@ -1811,45 +1148,59 @@ handlers: Dict[
 
 aliases: Dict[str, str] = {
     "gogo-stream.com": "gogoplay1.com",
-    "goload.io": "gogoplay1.com",
-    "goload.one": "gogoplay1.com",
-    "gogoplay.io": "gogoplay1.com",
-    "gogoplay4.com": "gogoplay1.com",
-    "gogoplay5.com": "gogoplay1.com",
     "gotaku1.com": "gogoplay1.com",
     "alions.pro": "filemoon.sx",
-    "goload.pro": "gogoplay1.com",
     "gogohd.net": "gogoplay1.com",
-    "sbplay1.com": "sbplay.one",
-    "sbplay2.com": "sbplay.one",
-    "sbplay2.xyz": "sbplay.one",
-    "dood.la": "dood.ws",
-    "dood.wf": "dood.ws",
-    "streamtape.com": "streamtape.net",
     "streamsss.net": "watchsb.com",
-    "fembed9hd.com": "fembed-hd.com",
+    "kerapoxy.cc": "filemoon.sx",
     "vid142.site": "vidplay.xyz",
-    "mcloud.bz": "vidplay.xyz",
-    "kerapoxy.cc": "filemoon.com",
     "vid2a41.site": "vidplay.xyz",
-    "megaf.cc": "vidplay.xyz",
+    # Filemoon's throwaway domains, new ones go into `ROUTES_FILE`
     "1azayf9w.xyz": "filemoon.sx",
     "smdfs40r.skin": "filemoon.sx",
     "oaaxpgp3.xyz": "filemoon.sx",
 }
 
+# Mirrors that keep moving to new domains (and their subdomains)
+suffixes: Dict[str, str] = {
+    "mcloud.bz": "vidplay.xyz",
+    "megaf.cc": "vidplay.xyz",
+}
+patterns: Dict[str, str] = {
+    r"gogoplay\d*\.(?:com|io)": "gogoplay1.com",
+    r"goload\.[a-z]+": "gogoplay1.com",
+    r"sbplay\d*\.(?:com|xyz)": "sbplay.one",
+    r"dood\.[a-z]+": "dood.ws",
+    r"streamtape\.[a-z]+": "streamtape.net",
+    r"fembed\d*hd\.com": "fembed-hd.com",
+    r"filemoon\.[a-z]+": "filemoon.sx",
+}
+
+routes = RoutingTable.compile(
+    handlers.keys(),
+    aliases=aliases,
+    suffixes=suffixes,
+    patterns=patterns,
+    extra_rules=load_route_rules,
+)
+
+
+def handler_domain(url: str) -> str:
+    """The `handlers` key for `url` (or its host name if it has no handler)."""
+
+    return routes.route(url) or normalize_host(url)
+
+
+def has_handler(url: str) -> bool:
+    return routes.route(url) is not None
+
 
 def get_download_info(
     url: str, referer: Union[str, None] = None
 ) -> Union[None, HandlerFuncReturn]:
-    parsed = urlparse(url)
-    domain = parsed.netloc
+    domain = routes.route(url)
 
-    if domain in aliases:
-        domain = aliases[domain]
-        # parsed = parsed._replace(netloc=domain)
-
-    if domain not in handlers:
+    if domain is None:
         return None
 
     try:
@@ -1876,23 +1227,9 @@ def sort_download_links(
     *,
     to_url: Callable[[T], str] = lambda x: str(x),
 ) -> List[T]:
-    handler_names = list(handlers.keys())
-
-    def get_key(item: T) -> int:
-        parsed = urlparse(to_url(item))
-        domain = parsed.netloc
-
-        if domain in aliases:
-            domain = aliases[domain]
-
-        if domain in handler_names:
-            return handler_names.index(domain)
-
-        return len(handler_names) + 1
-
     return list(
         sorted(
             urls,
-            key=get_key,
+            key=lambda item: routes.priority(to_url(item)),
         )
     )
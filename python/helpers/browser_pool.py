@@ -0,0 +1,263 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable
+
+try:
+    import playwright.sync_api
+except ImportError as err:
+    print("Installing playwright...")
+    assert os.system("pip install playwright") == 0
+    assert os.system("playwright install firefox") == 0
+import playwright.sync_api
+from playwright.sync_api import sync_playwright
+
+from python.helpers import cancellation
+from python.log.console import Console
+
+# How many browsers (each on its own thread) may resolve URLs at once
+BROWSER_WORKERS = int(os.getenv("DOWNLOADERS_BROWSER_WORKERS", "1"))
+# Hard cap on how long resolving one URL through the browser may take
+BROWSER_RESOLVE_TIMEOUT_SECONDS = float(
+    os.getenv("DOWNLOADERS_BROWSER_RESOLVE_TIMEOUT_SECONDS", "60")
+)
+# ...out of which one load of the page gets this long to request the stream
+BROWSER_ATTEMPT_TIMEOUT_SECONDS = 20.0
+BROWSER_NAVIGATION_TIMEOUT_SECONDS = 30.0
+BROWSER_CLICK_TIMEOUT_SECONDS = 10.0
+
+# Payloads the page doesn't need for the player to request its stream
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media"})
+
+
+@dataclass
+class CapturedRequest:
+    url: str
+    headers: dict[str, str]
+
+
+class _ThreadBrowser:
+    # Playwright's sync API objects belong to the thread that created them
+    playwright: playwright.sync_api.Playwright
+    browser: playwright.sync_api.Browser
+    context: playwright.sync_api.BrowserContext
+
+    def __init__(self, browser_type: str) -> None:
+        self.playwright = sync_playwright().start()
+        try:
+            self.browser = getattr(self.playwright, browser_type).launch()
+            self.context = self.browser.new_context()
+        except Exception:
+            self.playwright.stop()
+            raise
+
+    @property
+    def alive(self) -> bool:
+        return self.browser.is_connected()
+
+    def close(self) -> None:
+        try:
+            self.browser.close()
+        except Exception:
+            pass
+        self.playwright.stop()
+
+
+class BrowserPool:
+    """
+    Warm browsers (and browser contexts) reused by every resolution instead
+    of launching a browser each time.
+
+    Playwright's sync API is bound to the thread that started it, so each
+    browser lives on one of the pool's own long-lived threads and callers
+    (eg. short-lived resolver threads) hand their work over to them.
+
+    Pages only load what the player needs: images, fonts and media are
+    blocked, and the request being waited for is captured and aborted.
+    """
+
+    _browser_type: str
+    _blocked_resource_types: frozenset[str]
+    _workers: int
+    _executor: ThreadPoolExecutor
+    _local: threading.local
+
+    def __init__(
+        self,
+        *,
+        browser_type: str = "firefox",
+        blocked_resource_types: frozenset[str] = BLOCKED_RESOURCE_TYPES,
+        workers: int = BROWSER_WORKERS,
+    ) -> None:
+        self._browser_type = browser_type
+        self._blocked_resource_types = blocked_resource_types
+        self._workers = max(1, workers)
+        self._executor = self._create_executor()
+        self._local = threading.local()
+
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _create_executor(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(
+            max_workers=self._workers,
+            thread_name_prefix="browser",
+        )
+
+    def _browser(self) -> _ThreadBrowser:
+        browser: _ThreadBrowser | None = getattr(self._local, "browser", None)
+        if browser is not None and not browser.alive:
+            browser.close()
+            browser = None
+
+        if browser is None:
+            with Console.status_row():
+                Console.log_dim("Starting browser...", return_line=True)
+                browser = _ThreadBrowser(self._browser_type)
+            self._local.browser = browser
+
+        return browser
+
+    def capture_request(
+        self,
+        url: str,
+        matches: Callable[[str], bool],
+        *,
+        click: str | None = None,
+        referer: str | None = None,
+        timeout: float = BROWSER_RESOLVE_TIMEOUT_SECONDS,
+    ) -> CapturedRequest | None:
+        """
+        Opens `url` (clicking `click` once it's loaded, if given) until the
+        page requests a URL that `matches`, giving up after `timeout` seconds.
+
+        Gives up early when the caller's resolution is cancelled (see
+        `cancellation`), so the browsers move on to work that's still wanted.
+        """
+
+        cancelled = cancellation.current()
+        future = self._executor.submit(
+            self._capture_request,
+            url,
+            matches,
+            click=click,
+            referer=referer,
+            timeout=timeout,
+            cancelled=cancelled,
+        )
+        if cancelled is None:
+            return future.result()
+
+        while not future.done():
+            if cancelled.is_set():
+                # Dropped if it's still queued, otherwise it stops at its next
+                # attempt
+                future.cancel()
+                return None
+            wait([future], timeout=0.25)
+        return future.result()
+
+    def _capture_request(
+        self,
+        url: str,
+        matches: Callable[[str], bool],
+        *,
+        click: str | None,
+        referer: str | None,
+        timeout: float,
+        cancelled: threading.Event | None,
+    ) -> CapturedRequest | None:
+        deadline = time.monotonic() + timeout
+        if cancelled is not None and cancelled.is_set():
+            return None
+
+        try:
+            page = self._browser().context.new_page()
+        except playwright.sync_api.Error:
+            return None
+
+        def route(route: playwright.sync_api.Route) -> None:
+            request = route.request
+            if matches(request.url) or (
+                request.resource_type in self._blocked_resource_types
+            ):
+                route.abort()
+            else:
+                route.continue_()
+
+        try:
+            page.route("**/*", route)
+
+            attempt = 0
+            while (remaining := deadline - time.monotonic()) > 0:
+                if cancelled is not None and cancelled.is_set():
+                    return None
+                if attempt:
+                    page.wait_for_timeout(min(1.0, remaining) * 1000)
+                    remaining = deadline - time.monotonic()
+                attempt += 1
+
+                try:
+                    with page.expect_request(
+                        lambda request: matches(request.url),
+                        timeout=min(remaining, BROWSER_ATTEMPT_TIMEOUT_SECONDS)
+                        * 1000,
+                    ) as request_info:
+                        page.goto(
+                            url,
+                            referer=referer,
+                            wait_until="domcontentloaded",
+                            timeout=min(remaining, BROWSER_NAVIGATION_TIMEOUT_SECONDS)
+                            * 1000,
+                        )
+                        if click:
+                            try:
+                                page.click(
+                                    click,
+                                    force=True,
+                                    timeout=BROWSER_CLICK_TIMEOUT_SECONDS * 1000,
+                                )
+                            except playwright.sync_api.Error:
+                                # The player may start on its own anyway
+                                pass
+                    request = request_info.value
+                except playwright.sync_api.Error:
+                    continue
+
+                return CapturedRequest(url=request.url, headers=request.headers)
+
+            Console.log_dim(f"Browser gave up on {url} after {timeout:.0f}s")
+            return None
+        except playwright.sync_api.Error:
+            return None
+        finally:
+            try:
+                page.close()
+            except playwright.sync_api.Error:
+                pass
+
+    def close(self) -> None:
+        # Every worker has to close its own browser, the barrier makes sure
+        # each of them gets exactly one of the tasks
+        barrier = threading.Barrier(self._workers)
+
+        def close_thread_browser() -> None:
+            barrier.wait()
+            browser: _ThreadBrowser | None = getattr(self._local, "browser", None)
+            if browser is not None:
+                self._local.browser = None
+                browser.close()
+
+        for future in [
+            self._executor.submit(close_thread_browser) for _ in range(self._workers)
+        ]:
+            future.result()
+
+    def _reset_after_fork(self) -> None:
+        # The browser processes (and the threads driving them) belong to the parent
+        self._executor = self._create_executor()
+        self._local = threading.local()
+
+
+DefaultBrowserPool = BrowserPool()
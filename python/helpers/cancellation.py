@@ -0,0 +1,41 @@
+import contextvars
+import threading
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+# The event that tells the work running in this context (eg. resolving a
+# download URL) nobody is waiting for its result anymore. Handlers don't take
+# it as an argument, they (and what they call) look it up with `current()`
+_current: contextvars.ContextVar[threading.Event | None] = contextvars.ContextVar(
+    "cancelled",
+    default=None,
+)
+
+
+class CancelledException(Exception):
+    pass
+
+
+def run_cancellable(cancelled: threading.Event, fn: Callable[..., T], *args, **kwargs) -> T:
+    """Runs `fn` with `cancelled` as the current cancellation event."""
+
+    token = _current.set(cancelled)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _current.reset(token)
+
+
+def current() -> threading.Event | None:
+    return _current.get()
+
+
+def is_cancelled() -> bool:
+    cancelled = _current.get()
+    return cancelled is not None and cancelled.is_set()
+
+
+def check_cancelled() -> None:
+    if is_cancelled():
+        raise CancelledException()
@@ -0,0 +1,113 @@
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Self
+
+CHECKPOINT_SAVE_INTERVAL_SECONDS = 1.0
+
+
+def checkpoint_path(output_file: str) -> str:
+    # Hidden, so it never looks like a downloaded episode in the directory listing
+    directory, name = os.path.split(output_file)
+    return os.path.join(directory, f".{name}.checkpoint.json")
+
+
+@dataclass
+class DownloadCheckpoint:
+    """
+    Sidecar manifest of how much of `output_file` has been downloaded.
+
+    `identity` describes the stream as served by its source, so a restart or
+    a re-run picks up where the previous attempt left off. Whether a
+    different mirror serves the same stream can only be told by its content
+    (see `content_hash` and `resume_or_create`).
+    """
+
+    output_file: str
+    kind: str
+    identity: dict[str, Any]
+    # Hash of the first downloaded piece of the stream, if the kind has one
+    content_hash: str | None = None
+    completed_segments: int = 0
+    completed_bytes: int = 0
+    completed_ranges: list[tuple[int, int]] = field(default_factory=list)
+
+    _last_saved_at: float = field(default=0.0, repr=False, compare=False)
+
+    @property
+    def path(self) -> str:
+        return checkpoint_path(self.output_file)
+
+    @classmethod
+    def load(cls, output_file: str) -> Self | None:
+        try:
+            with open(checkpoint_path(output_file), encoding="utf-8") as f:
+                data = json.load(f)
+
+            return cls(
+                output_file=output_file,
+                kind=data["kind"],
+                identity=data["identity"],
+                content_hash=data.get("content_hash"),
+                completed_segments=int(data.get("completed_segments", 0)),
+                completed_bytes=int(data.get("completed_bytes", 0)),
+                completed_ranges=[
+                    (int(start), int(end))
+                    for start, end in data.get("completed_ranges", [])
+                ],
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    @classmethod
+    def resume_or_create(
+        cls,
+        output_file: str,
+        *,
+        kind: str,
+        identity: dict[str, Any],
+        same_content: Callable[[Self], bool] | None = None,
+    ) -> tuple[Self, bool]:
+        """
+        Returns the existing checkpoint for `output_file` if it describes the
+        same stream, otherwise a fresh one. The flag says whether to resume.
+
+        A checkpoint with another identity (eg. left by a different mirror)
+        is only resumed if `same_content` confirms it's the same stream.
+        """
+
+        checkpoint = cls.load(output_file)
+        if (
+            checkpoint is not None
+            and checkpoint.kind == kind
+            and (
+                checkpoint.identity == identity
+                or (same_content is not None and same_content(checkpoint))
+            )
+        ):
+            checkpoint.identity = identity
+            return checkpoint, True
+
+        return cls(output_file=output_file, kind=kind, identity=identity), False
+
+    def save(self, *, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_saved_at < CHECKPOINT_SAVE_INTERVAL_SECONDS:
+            return
+        self._last_saved_at = now
+
+        data = asdict(self)
+        del data["output_file"]
+        del data["_last_saved_at"]
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
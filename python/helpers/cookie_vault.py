@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+from typing import Any
+
+import requests
+
+from python.helpers.json_store import JsonStore, cache_path
+
+# Cookies without an explicit expiry (eg. DDoS-Guard's `__ddg2_`) are kept this long
+DEFAULT_COOKIE_TTL_SECONDS = float(
+    os.getenv("DOWNLOADERS_COOKIE_TTL_SECONDS", str(7 * 24 * 60 * 60))
+)
+
+
+def _domain_matches(cookie_domain: str, host: str) -> bool:
+    cookie_domain = cookie_domain.lstrip(".").lower()
+    return host == cookie_domain or host.endswith(f".{cookie_domain}")
+
+
+class CookieVault:
+    """
+    On-disk, per-host store of anti-bot cookies (Cloudflare clearance,
+    DDoS-Guard, ...) so solved challenges survive between runs.
+    """
+
+    _store: JsonStore
+    _lock: threading.Lock
+    _saved: dict[tuple[int, str], dict[str, Any]]
+
+    def __init__(self, store: JsonStore) -> None:
+        self._store = store
+        self._lock = threading.Lock()
+        self._saved = {}
+
+    def load_into(self, session: requests.Session, host: str) -> None:
+        cookies = self._host_cookies(self._store.read(), host)
+
+        for name, cookie in cookies.items():
+            session.cookies.set(
+                name,
+                cookie["value"],
+                domain=cookie["domain"],
+                path=cookie["path"],
+                expires=int(cookie["expires"]),
+                secure=cookie["secure"],
+            )
+
+        with self._lock:
+            self._saved[(id(session), host)] = cookies
+
+    def save_from(self, session: requests.Session, host: str) -> None:
+        now = time.time()
+        cookies = {
+            cookie.name: {
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "expires": cookie.expires or now + DEFAULT_COOKIE_TTL_SECONDS,
+                "secure": cookie.secure,
+            }
+            for cookie in session.cookies
+            if cookie.value is not None and _domain_matches(cookie.domain, host)
+        }
+
+        key = (id(session), host)
+        with self._lock:
+            previous = self._saved.get(key, {})
+            if {k: v["value"] for k, v in previous.items()} == {
+                k: v["value"] for k, v in cookies.items()
+            }:
+                return
+            self._saved[key] = cookies
+
+        with self._store.update() as data:
+            data[host] = cookies
+
+    def attach(self, session: requests.Session, host: str) -> None:
+        """
+        Load the stored cookies for `host` into `session` and persist any
+        changes after each successful response.
+        """
+
+        self.load_into(session, host)
+
+        def persist_on_success(response: requests.Response, *_args, **_kwargs):
+            if response.ok:
+                try:
+                    self.save_from(session, host)
+                except OSError:
+                    pass
+            return response
+
+        session.hooks["response"].append(persist_on_success)
+
+    @staticmethod
+    def _host_cookies(data: dict[str, Any], host: str) -> dict[str, Any]:
+        now = time.time()
+        return {
+            name: cookie
+            for name, cookie in dict(data.get(host, {})).items()
+            if float(cookie.get("expires", 0)) > now
+        }
+
+
+DefaultCookieVault = CookieVault(
+    JsonStore(
+        os.getenv("DOWNLOADERS_COOKIE_VAULT", cache_path("cookies.json")),
+    )
+)
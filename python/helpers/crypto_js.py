@@ -0,0 +1,232 @@
+import base64
+import hashlib
+import os
+
+# AES as CryptoJS does it by default: CBC mode with PKCS#7 padding, either
+# with an explicit key/iv or with a passphrase, in which case the key and iv
+# come from OpenSSL's EVP_BytesToKey (MD5) and the ciphertext is prefixed
+# with `Salted__` and the salt.
+#
+# Pure Python, since the payloads are small (a JSON blob or an id).
+
+SALTED_PREFIX = b"Salted__"
+
+
+def _xtime(a: int) -> int:
+    a <<= 1
+    return (a ^ 0x1B) & 0xFF if a & 0x100 else a
+
+
+def _mul(a: int, b: int) -> int:
+    result = 0
+    while b:
+        if b & 1:
+            result ^= a
+        a = _xtime(a)
+        b >>= 1
+    return result
+
+
+def _build_sbox() -> tuple[list[int], list[int]]:
+    sbox = [0] * 256
+    inv_sbox = [0] * 256
+    p = q = 1
+    while True:
+        # p runs through every non-zero element, q is its inverse
+        p = p ^ _xtime(p)
+        q ^= q << 1
+        q ^= q << 2
+        q ^= q << 4
+        q &= 0xFF
+        if q & 0x80:
+            q ^= 0x09
+
+        x = q ^ (q << 1 | q >> 7) ^ (q << 2 | q >> 6) ^ (q << 3 | q >> 5) ^ (q << 4 | q >> 4)
+        x = (x ^ 0x63) & 0xFF
+        sbox[p] = x
+        inv_sbox[x] = p
+
+        if p == 1:
+            break
+
+    sbox[0] = 0x63
+    inv_sbox[0x63] = 0
+    return sbox, inv_sbox
+
+
+_SBOX, _INV_SBOX = _build_sbox()
+_MUL = {n: [_mul(a, n) for a in range(256)] for n in (2, 3, 9, 11, 13, 14)}
+
+
+def _expand_key(key: bytes) -> list[list[int]]:
+    if len(key) not in (16, 24, 32):
+        raise ValueError(f"Invalid AES key length ({len(key)} bytes)")
+
+    key_words = len(key) // 4
+    rounds = key_words + 6
+    words = [list(key[i : i + 4]) for i in range(0, len(key), 4)]
+
+    rcon = 1
+    for i in range(key_words, 4 * (rounds + 1)):
+        word = list(words[i - 1])
+        if i % key_words == 0:
+            word = word[1:] + word[:1]
+            word = [_SBOX[b] for b in word]
+            word[0] ^= rcon
+            rcon = _xtime(rcon)
+        elif key_words > 6 and i % key_words == 4:
+            word = [_SBOX[b] for b in word]
+        words.append([a ^ b for a, b in zip(words[i - key_words], word)])
+
+    return [sum(words[r * 4 : r * 4 + 4], []) for r in range(rounds + 1)]
+
+
+def _encrypt_block(round_keys: list[list[int]], block: bytes) -> bytes:
+    s = [b ^ k for b, k in zip(block, round_keys[0])]
+    m2, m3 = _MUL[2], _MUL[3]
+
+    for round_number in range(1, len(round_keys)):
+        # SubBytes + ShiftRows
+        s = [_SBOX[s[(i + 4 * (i % 4)) % 16]] for i in range(16)]
+
+        if round_number != len(round_keys) - 1:
+            mixed = []
+            for c in range(4):
+                a0, a1, a2, a3 = s[c * 4 : c * 4 + 4]
+                mixed += [
+                    m2[a0] ^ m3[a1] ^ a2 ^ a3,
+                    a0 ^ m2[a1] ^ m3[a2] ^ a3,
+                    a0 ^ a1 ^ m2[a2] ^ m3[a3],
+                    m3[a0] ^ a1 ^ a2 ^ m2[a3],
+                ]
+            s = mixed
+
+        s = [b ^ k for b, k in zip(s, round_keys[round_number])]
+
+    return bytes(s)
+
+
+def _decrypt_block(round_keys: list[list[int]], block: bytes) -> bytes:
+    s = [b ^ k for b, k in zip(block, round_keys[-1])]
+    m9, m11, m13, m14 = _MUL[9], _MUL[11], _MUL[13], _MUL[14]
+
+    for round_number in range(len(round_keys) - 2, -1, -1):
+        # InvShiftRows + InvSubBytes
+        s = [_INV_SBOX[s[(i - 4 * (i % 4)) % 16]] for i in range(16)]
+        s = [b ^ k for b, k in zip(s, round_keys[round_number])]
+
+        if round_number != 0:
+            mixed = []
+            for c in range(4):
+                a0, a1, a2, a3 = s[c * 4 : c * 4 + 4]
+                mixed += [
+                    m14[a0] ^ m11[a1] ^ m13[a2] ^ m9[a3],
+                    m9[a0] ^ m14[a1] ^ m11[a2] ^ m13[a3],
+                    m13[a0] ^ m9[a1] ^ m14[a2] ^ m11[a3],
+                    m11[a0] ^ m13[a1] ^ m9[a2] ^ m14[a3],
+                ]
+            s = mixed
+
+    return bytes(s)
+
+
+def aes_cbc_encrypt(plaintext: bytes, key: bytes, iv: bytes) -> bytes:
+    round_keys = _expand_key(key)
+    padding = 16 - len(plaintext) % 16
+    plaintext += bytes([padding]) * padding
+
+    out = bytearray()
+    previous = iv[:16].ljust(16, b"\0")
+    for i in range(0, len(plaintext), 16):
+        block = bytes(a ^ b for a, b in zip(plaintext[i : i + 16], previous))
+        previous = _encrypt_block(round_keys, block)
+        out += previous
+    return bytes(out)
+
+
+def aes_cbc_decrypt(ciphertext: bytes, key: bytes, iv: bytes) -> bytes:
+    if len(ciphertext) % 16:
+        raise ValueError("Ciphertext isn't a whole number of blocks")
+
+    round_keys = _expand_key(key)
+
+    out = bytearray()
+    previous = iv[:16].ljust(16, b"\0")
+    for i in range(0, len(ciphertext), 16):
+        block = ciphertext[i : i + 16]
+        out += bytes(
+            a ^ b for a, b in zip(_decrypt_block(round_keys, block), previous)
+        )
+        previous = block
+
+    # Like CryptoJS, trust the padding byte without checking the padding
+    if out:
+        del out[max(0, len(out) - out[-1]) :]
+    return bytes(out)
+
+
+def evp_bytes_to_key(
+    passphrase: bytes,
+    salt: bytes,
+    *,
+    key_size: int = 32,
+    iv_size: int = 16,
+) -> tuple[bytes, bytes]:
+    derived = b""
+    block = b""
+    while len(derived) < key_size + iv_size:
+        block = hashlib.md5(block + passphrase + salt).digest()
+        derived += block
+    return derived[:key_size], derived[key_size : key_size + iv_size]
+
+
+def decrypt(ciphertext: str, key: bytes | str, iv: bytes | str) -> bytes:
+    """`CryptoJS.AES.decrypt(ciphertext, Utf8.parse(key), { iv: Utf8.parse(iv) })`"""
+
+    return aes_cbc_decrypt(
+        base64.b64decode(ciphertext),
+        key.encode("utf-8") if isinstance(key, str) else key,
+        iv.encode("utf-8") if isinstance(iv, str) else iv,
+    )
+
+
+def encrypt(plaintext: bytes | str, key: bytes | str, iv: bytes | str) -> str:
+    """`CryptoJS.AES.encrypt(plaintext, Utf8.parse(key), { iv: Utf8.parse(iv) }).toString()`"""
+
+    return base64.b64encode(
+        aes_cbc_encrypt(
+            plaintext.encode("utf-8") if isinstance(plaintext, str) else plaintext,
+            key.encode("utf-8") if isinstance(key, str) else key,
+            iv.encode("utf-8") if isinstance(iv, str) else iv,
+        )
+    ).decode("ascii")
+
+
+def decrypt_with_passphrase(ciphertext: str, passphrase: str) -> bytes:
+    """`CryptoJS.AES.decrypt(ciphertext, passphrase)`"""
+
+    data = base64.b64decode(ciphertext)
+    salt = b""
+    if data.startswith(SALTED_PREFIX):
+        salt, data = data[8:16], data[16:]
+
+    key, iv = evp_bytes_to_key(passphrase.encode("utf-8"), salt)
+    return aes_cbc_decrypt(data, key, iv)
+
+
+def encrypt_with_passphrase(
+    plaintext: bytes | str,
+    passphrase: str,
+    *,
+    salt: bytes | None = None,
+) -> str:
+    """`CryptoJS.AES.encrypt(plaintext, passphrase).toString()`"""
+
+    salt = os.urandom(8) if salt is None else salt
+    key, iv = evp_bytes_to_key(passphrase.encode("utf-8"), salt)
+    ciphertext = aes_cbc_encrypt(
+        plaintext.encode("utf-8") if isinstance(plaintext, str) else plaintext,
+        key,
+        iv,
+    )
+    return base64.b64encode(SALTED_PREFIX + salt + ciphertext).decode("ascii")
@@ -1,14 +1,54 @@
 import copy
+import json
 import os
+import threading
+import time
+from collections import OrderedDict
 from typing import Self, cast
 import urllib.parse
 import requests
+from requests.adapters import HTTPAdapter
+
+DEOBFUSCATOR_CACHE_TTL_SECONDS = float(
+    os.getenv("DOWNLOADERS_DEOBFUSCATOR_CACHE_TTL_SECONDS", str(60 * 60))
+)
+DEOBFUSCATOR_CACHE_MAX_ENTRIES = 256
+DEOBFUSCATOR_RETRIES = int(os.getenv("DOWNLOADERS_DEOBFUSCATOR_RETRIES", "2"))
+DEOBFUSCATOR_REQUEST_TIMEOUT_SECONDS = 30.0
+# After this many failed requests in a row the service is assumed to be down...
+DEOBFUSCATOR_BREAKER_THRESHOLD = 3
+# ...and isn't asked again for this long
+DEOBFUSCATOR_BREAKER_COOLDOWN_SECONDS = 30.0
+
+_RETRIED_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=16)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 class PlayerDeobfuscator:
+    """
+    Client for the player deobfuscation service.
+
+    Answers are cached by request (the same VRF or player script always
+    deobfuscates the same way), transient failures are retried, and after
+    a few failures in a row requests fail fast for a while instead of
+    each one waiting for its timeout.
+    """
+
     _endpoint: str
     _http: requests.Session
 
+    _lock: threading.Lock
+    _cache: OrderedDict[str, tuple[float, dict]]
+    _failures: int
+    _open_until: float
+
     def __init__(
         self, *, endpoint: str | None = None, http: requests.Session | None = None
     ) -> None:
@@ -17,10 +57,21 @@ class PlayerDeobfuscator:
             "https://player-deobfuscator.fxk.ch",
         )
 
-        self._http = http or requests.Session()
+        self._http = http or _create_session()
+
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._failures = 0
+        self._open_until = 0.0
+
+    def __deepcopy__(self, memo) -> Self:
+        # Copies share the connection pool, but not the cache or breaker state
+        return type(self)(endpoint=self._endpoint, http=self._http)
 
     def set_endpoint(self, endpoint: str) -> Self:
         self._endpoint = endpoint
+        with self._lock:
+            self._cache.clear()
         return self
 
     def with_endopint(self, endpoint: str) -> Self:
@@ -39,10 +90,30 @@ class PlayerDeobfuscator:
     def post(self, url: str, **kwargs):
         return self.request("POST", url, **kwargs)
 
-    def request(self, method: str, url: str, *, validate_status: bool = True, **kwargs):
+    def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        validate_status: bool = True,
+        cache: bool = True,
+        **kwargs,
+    ):
         url = urllib.parse.urljoin(self._endpoint, url)
+        cache_key = self._cache_key(method, url, validate_status, kwargs)
+
+        if cache:
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
+
+        if self._is_open():
+            return None
 
-        resp = requests.request(method, url, **kwargs)
+        kwargs.setdefault("timeout", DEOBFUSCATOR_REQUEST_TIMEOUT_SECONDS)
+        resp = self._request_with_retries(method, url, **kwargs)
+        if resp is None:
+            return None
 
         if validate_status:
             try:
@@ -51,9 +122,97 @@ class PlayerDeobfuscator:
                 return None
 
         try:
-            return cast(dict, resp.json())
+            data = cast(dict, resp.json())
         except Exception:
             return None
 
+        # Errors are reported as `{"message": ...}`
+        if cache and resp.ok and isinstance(data, dict) and "message" not in data:
+            self._cache_set(cache_key, data)
+
+        return data
+
+    def _request_with_retries(
+        self, method: str, url: str, **kwargs
+    ) -> requests.Response | None:
+        for attempt in range(DEOBFUSCATOR_RETRIES + 1):
+            if attempt:
+                if self._is_open():
+                    return None
+                time.sleep(min(0.5 * 2 ** (attempt - 1), 5))
+
+            try:
+                resp = self._http.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._record_failure()
+                continue
+
+            if resp.status_code in _RETRIED_STATUS_CODES:
+                self._record_failure()
+                if attempt < DEOBFUSCATOR_RETRIES:
+                    continue
+                return resp
+
+            self._record_success()
+            return resp
+
+        return None
+
+    @staticmethod
+    def _cache_key(method: str, url: str, validate_status: bool, kwargs: dict) -> str:
+        return json.dumps(
+            [
+                method.upper(),
+                url,
+                validate_status,
+                kwargs.get("params"),
+                kwargs.get("json"),
+                kwargs.get("data"),
+            ],
+            sort_keys=True,
+            default=str,
+        )
+
+    def _cache_get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+
+            expires_at, data = entry
+            if expires_at < time.monotonic():
+                del self._cache[key]
+                return None
+
+            self._cache.move_to_end(key)
+            return copy.deepcopy(data)
+
+    def _cache_set(self, key: str, data: dict) -> None:
+        with self._lock:
+            self._cache[key] = (
+                time.monotonic() + DEOBFUSCATOR_CACHE_TTL_SECONDS,
+                copy.deepcopy(data),
+            )
+            self._cache.move_to_end(key)
+            while len(self._cache) > DEOBFUSCATOR_CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+
+    def _is_open(self) -> bool:
+        with self._lock:
+            return time.monotonic() < self._open_until
+
+    def _record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= DEOBFUSCATOR_BREAKER_THRESHOLD:
+                self._open_until = (
+                    time.monotonic() + DEOBFUSCATOR_BREAKER_COOLDOWN_SECONDS
+                )
+
+    def _record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._open_until = 0.0
+
 
 DefaultPlayerDeobfuscator = PlayerDeobfuscator()
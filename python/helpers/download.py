@@ -1,17 +1,137 @@
-import datetime
-import re
-import subprocess
+import os
+import threading
+import time
 import traceback
-from dataclasses import dataclass, field
-from enum import StrEnum, auto
-from itertools import chain
-from typing import Callable, TypeVar
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Generator, Iterator
 from urllib.parse import urlparse
 
-from python.downloaders import DownloadInfo, get_download_info
-from python.helpers.list import flatten
+from python.downloaders import (
+    DownloadInfo,
+    get_download_info,
+    handler_domain,
+    has_handler,
+)
+from python.helpers import cancellation
+from python.helpers.download_info_cache import DefaultDownloadInfoCache, url_expiry
+from python.helpers.download_job import (
+    DownloadJob,
+    DownloadProgressInfo,
+    YtDlpDownloadJob,
+)
+from python.helpers.hls import HlsDownloadJob, is_hls_url
+from python.helpers.http_range import RangeDownloadJob
+from python.helpers.perf_store import DefaultPerfStore
+from python.helpers.routing import ROUTES_FILE
 from python.helpers.size import human_byte_size
 from python.log.console import Chalk, Console
+from python.log.events import (
+    DefaultEventBus,
+    DoneEvent,
+    DownloadProgressEvent,
+    ErrorEvent,
+    PostProcessingEvent,
+    ResolvedEvent,
+    ResolvingEvent,
+    WaitingForProgressEvent,
+)
+
+
+RESOLVE_WORKERS = int(os.getenv("DOWNLOADERS_RESOLVE_WORKERS", "4"))
+HEDGE_PROBATION_SECONDS = float(os.getenv("DOWNLOADERS_HEDGE_PROBATION_SECONDS", "20"))
+PROGRESS_POLL_SECONDS = 0.25
+# A download is given up on when its size doesn't change for
+# `STALL_SECONDS`, it's slower than real time for `LOW_SPEED_SECONDS` or it
+# stops reporting for `NO_OUTPUT_STALL_SECONDS` after it has started to. None
+# of that applies once the download itself is done and it's finishing up
+STALL_SECONDS = 30
+LOW_SPEED_SECONDS = 60
+NO_OUTPUT_STALL_SECONDS = 60
+DOWNLOAD_ENGINES = ("yt-dlp", "native")
+DOWNLOAD_ENGINE = os.getenv("DOWNLOADERS_ENGINE", "yt-dlp")
+
+
+def _resolve_download_info(
+    site: str,
+    download_url: str,
+    episode_url: str,
+    output_file: str | None = None,
+) -> DownloadInfo | None:
+    DefaultEventBus.emit(
+        ResolvingEvent(output_file=output_file, site=site, url=download_url)
+    )
+
+    lookup_started_at = time.monotonic()
+    download_info = DefaultDownloadInfoCache.get(download_url)
+    if download_info is not None:
+        DefaultEventBus.emit(
+            ResolvedEvent(
+                output_file=output_file,
+                site=site,
+                url=download_url,
+                download_url=download_info.url,
+                cached=True,
+                seconds=time.monotonic() - lookup_started_at,
+            )
+        )
+        return download_info
+
+    started_at = time.monotonic()
+    try:
+        download_info = get_download_info(download_url, episode_url)
+    except Exception:
+        download_info = None
+
+    if cancellation.is_cancelled():
+        # Given up on halfway, which says nothing about the handler
+        return None
+
+    if has_handler(download_url):
+        DefaultPerfStore.record_resolution(
+            handler_domain(download_url),
+            time.monotonic() - started_at,
+            ok=download_info is not None,
+        )
+
+    if download_info is not None:
+        DefaultDownloadInfoCache.put(download_url, download_info)
+
+    DefaultEventBus.emit(
+        ResolvedEvent(
+            output_file=output_file,
+            site=site,
+            url=download_url,
+            download_url=download_info.url if download_info is not None else None,
+            seconds=time.monotonic() - started_at,
+        )
+    )
+
+    return download_info
+
+
+def resolve_ahead(
+    *,
+    sites: dict[str, str],
+    episode_url: str,
+    output_file: str | None = None,
+    count: int = 1,
+) -> dict[str, DownloadInfo | None]:
+    """
+    Resolve just the first `count` of `sites`, for `download_infos` to pick
+    up later. The rest are only worth resolving once they're needed.
+    """
+
+    return {
+        site: _resolve_download_info(site, download_url, episode_url, output_file)
+        for site, download_url in list(sites.items())[:count]
+    }
+
+
+def _is_still_valid(download_info: DownloadInfo | None) -> bool:
+    if download_info is None:
+        return True
+    expires_at = url_expiry(download_info.url)
+    return expires_at is None or expires_at > time.time()
 
 
 def download_infos(
@@ -19,291 +139,564 @@ def download_infos(
     sites: dict[str, str],
     episode_url: str,
     unwanted_hostnames: list[str] | set[str] = [],
+    max_workers: int = RESOLVE_WORKERS,
+    output_file: str | None = None,
+    resolved_ahead: dict[str, DownloadInfo | None] | None = None,
 ):
-    last_resort_infos: list[tuple[str, DownloadInfo]] = []
-    for site in sites:
-        download_url = sites[site]
-        try:
-            download_info = get_download_info(download_url, episode_url)
+    """
+    Resolve the download info of `sites` concurrently, but still yield them
+    in the priority order of `sites`. Only the next `max_workers` sources
+    are resolved ahead of the one being yielded. Results from
+    `resolve_ahead` are used as they are, unless their URL has expired in
+    the meantime.
+
+    Closing the generator cancels the resolutions still running (they
+    notice through `cancellation`) along with the ones that haven't started.
+    """
+
+    max_workers = max(1, max_workers)
+    executor = ThreadPoolExecutor(
+        max_workers=max_workers,
+        thread_name_prefix="resolve",
+    )
+    cancelled = threading.Event()
+    site_list = list(sites.items())
+    futures: list[Future[DownloadInfo | None]] = []
+
+    def resolve(site: str, download_url: str) -> DownloadInfo | None:
+        with Console.status_row():
+            return cancellation.run_cancellable(
+                cancelled,
+                _resolve_download_info,
+                site,
+                download_url,
+                episode_url,
+                output_file,
+            )
+
+    def submit_up_to(count: int) -> None:
+        while len(futures) < min(count, len(site_list)):
+            site, download_url = site_list[len(futures)]
+            if resolved_ahead and site in resolved_ahead:
+                if _is_still_valid(resolved_ahead[site]):
+                    future: Future[DownloadInfo | None] = Future()
+                    future.set_result(resolved_ahead[site])
+                    futures.append(future)
+                    continue
+
+            futures.append(executor.submit(resolve, site, download_url))
+
+    try:
+        last_resort_infos: list[tuple[str, DownloadInfo]] = []
+        for position, (site, _) in enumerate(site_list):
+            submit_up_to(position + max_workers)
+            download_info = futures[position].result()
             if download_info is None:
                 yield (site, None)
                 continue
-        except Exception as _e:
-            yield (site, None)
-            continue
-
-        parsed_url = urlparse(download_info.url)
-        if any(
-            (
-                (parsed_url.hostname or "").endswith(hostname)
-                for hostname in unwanted_hostnames
+
+            parsed_url = urlparse(download_info.url)
+            if any(
+                (
+                    (parsed_url.hostname or "").endswith(hostname)
+                    for hostname in unwanted_hostnames
+                )
+            ) or (
+                DefaultPerfStore.adaptive
+                and DefaultPerfStore.is_cdn_demoted(parsed_url.hostname or "")
+            ):
+                Console.log(
+                    f"{Chalk.colour(Chalk.italic)}Skipping {site} to end: {download_info.url}{Chalk.colour('23m')}"
+                )
+                last_resort_infos.append((site, download_info))
+                continue
+
+            yield (site, download_info)
+
+        for download_info_group in last_resort_infos:
+            yield download_info_group
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _hedge_output_file(output_file: str, index: int) -> str:
+    stem, ext = os.path.splitext(output_file)
+    return f"{stem}.hedge-{index}{ext}"
+
+
+def start_download_job(
+    download_info: DownloadInfo,
+    output_file: str,
+    *,
+    engine: str = DOWNLOAD_ENGINE,
+) -> DownloadJob:
+    if engine == "native":
+        native_job = (
+            HlsDownloadJob(download_info, output_file)
+            if is_hls_url(download_info.url)
+            else RangeDownloadJob(download_info, output_file)
+        )
+        try:
+            return native_job.start()
+        except Exception as e:
+            Console.log_dim(
+                f"Native download not possible ({e}), using yt-dlp",
+                return_line=True,
+            )
+
+    return YtDlpDownloadJob(download_info, output_file).start()
+
+
+def race_download_infos(
+    candidates: Iterator[tuple[str, DownloadInfo | None]],
+    *,
+    output_file: str,
+    hedge: int,
+    engine: str = DOWNLOAD_ENGINE,
+) -> Generator[tuple[str, DownloadInfo | None, DownloadJob | None], None, None]:
+    """
+    Start downloading the first `hedge` resolved candidates at once, let them
+    run for `HEDGE_PROBATION_SECONDS` and keep only the fastest one running.
+
+    Yields the winner together with its running job first, then the losers
+    (to be restarted from scratch if needed) and then the remaining candidates.
+    A candidate whose download can't even be started has failed, the next
+    one races in its place. Racing jobs that aren't handed out are killed,
+    however the generator ends.
+    """
+
+    racing: list[tuple[str, DownloadJob]] = []
+    handed_out: DownloadJob | None = None
+    try:
+        for site, download_info in candidates:
+            if download_info is None:
+                yield (site, None, None)
+                continue
+
+            try:
+                job = start_download_job(
+                    download_info,
+                    _hedge_output_file(output_file, len(racing)),
+                    engine=engine,
+                )
+            except Exception as e:
+                DefaultEventBus.emit(
+                    ErrorEvent(
+                        output_file=output_file,
+                        site=site,
+                        message=str(e) or type(e).__name__,
+                        recoverable=True,
+                    )
+                )
+                Console.log_dim(f"Couldn't start {site} ({e}), skipping source")
+                continue
+
+            racing.append((site, job))
+            if len(racing) >= hedge:
+                break
+
+        if racing:
+            Console.log_dim(f"Racing {len(racing)} sources...", return_line=True)
+            deadline = time.monotonic() + HEDGE_PROBATION_SECONDS
+            while time.monotonic() < deadline and (
+                sum(job.poll() is None for _, job in racing) > 1
+            ):
+                Console.log_dim(
+                    " | ".join(
+                        f"{site}: {human_byte_size(job.throughput())}/s"
+                        for site, job in racing
+                    ),
+                    return_line=True,
+                )
+                time.sleep(PROGRESS_POLL_SECONDS)
+
+            def rank(item: tuple[str, DownloadJob]):
+                job = item[1]
+                match job.poll():
+                    case None:
+                        state = 1
+                    case 0:
+                        state = 2
+                    case _:
+                        state = 0
+                return (state, job.throughput())
+
+            (winner_site, winner), *losers = sorted(racing, key=rank, reverse=True)
+
+            for _, job in losers:
+                job.kill()
+                job.remove_partial_files()
+            racing = [(winner_site, winner)]
+
+            Console.log_dim(
+                f"Fastest source: {winner_site} ({human_byte_size(winner.throughput())}/s)"
             )
+
+            # From here on the caller is responsible for the winner
+            handed_out = winner
+            yield (winner_site, winner.download_info, winner)
+            for site, job in losers:
+                yield (site, job.download_info, None)
+
+        yield from ((site, download_info, None) for site, download_info in candidates)
+    finally:
+        for _, job in racing:
+            if job is not handed_out:
+                job.kill()
+                job.remove_partial_files()
+
+
+def _progress_event(
+    job: DownloadJob,
+    progress: DownloadProgressInfo,
+    *,
+    site: str | None,
+) -> DownloadProgressEvent:
+    try:
+        size = int(progress.get("total_size", None))
+    except (TypeError, ValueError):
+        size = None
+
+    return DownloadProgressEvent(
+        output_file=job.output_file,
+        site=site,
+        bytes=size,
+        bytes_per_second=job.throughput(),
+        speed=progress.get("speed", None),
+        out_time=progress.get("out_time", None),
+    )
+
+
+class StallWatch:
+    """
+    The stall rules for a running download, evaluated against the clock
+    rather than only when new progress comes in, so a download that stops
+    reporting altogether gets caught too.
+
+    Nothing is checked before the first progress block (eg. while yt-dlp is
+    still extracting) or after the last one (remuxing, post-processing).
+    """
+
+    _last_output_at: float | None
+    _last_size_change_at: float
+    _last_fast_at: float
+    _size: str | None
+    _speed: float | None
+    _is_processing: bool
+    _is_finishing: bool
+
+    def __init__(self, now: float) -> None:
+        self._last_output_at = None
+        self._last_size_change_at = now
+        self._last_fast_at = now
+        self._size = None
+        self._speed = None
+        self._is_processing = False
+        self._is_finishing = False
+
+    @staticmethod
+    def _parse_speed(value: str | None) -> float | None:
+        # eg. `1.23x`, or `N/A` before ffmpeg knows
+        try:
+            return float(str(value).strip().rstrip("x"))
+        except ValueError:
+            return None
+
+    def update(self, progress: DownloadProgressInfo, now: float) -> None:
+        size = progress.get("total_size", None)
+        speed = self._parse_speed(progress.get("speed", None))
+
+        self._last_output_at = now
+        self._is_finishing = progress.is_finishing
+        if size != self._size:
+            self._last_size_change_at = now
+        if speed is not None and speed > 1:
+            self._last_fast_at = now
+
+        # The same speed twice in a row while the size stays put means ffmpeg
+        # is busy with something other than downloading
+        self._is_processing = (
+            self._size is not None and speed is not None and speed == self._speed
+        )
+        self._size = size
+        self._speed = speed
+
+    def check(self, now: float) -> str | None:
+        """Why the download counts as stalled, if it does."""
+
+        if self._last_output_at is None or self._is_finishing:
+            return None
+
+        if now - self._last_output_at >= NO_OUTPUT_STALL_SECONDS:
+            return "No progress reported for too long"
+
+        if (
+            self._size is not None
+            and not self._is_processing
+            and now - self._last_size_change_at >= STALL_SECONDS
         ):
-            Console.log(
-                f"{Chalk.colour(Chalk.italic)}Skipping {site} to end: {download_info.url}{Chalk.colour('23m')}"
+            return "Stalled for too long"
+
+        if (
+            self._speed is not None
+            and self._speed < 1
+            and now - self._last_fast_at >= LOW_SPEED_SECONDS
+        ):
+            return "Speed too low"
+
+        return None
+
+
+def wait_for_download(job: DownloadJob, *, site: str | None = None):
+    Console.log_dim("Waiting for download progress...", return_line=True)
+    DefaultEventBus.emit(
+        WaitingForProgressEvent(
+            output_file=job.output_file,
+            site=site,
+            download_url=job.download_info.url,
+        )
+    )
+
+    stall_watch = StallWatch(time.monotonic())
+    seen_progress_version = 0
+    while job.poll() is None:
+        if job.progress_version != seen_progress_version:
+            seen_progress_version = job.progress_version
+            download_progress = job.progress
+            stall_watch.update(download_progress, time.monotonic())
+            DefaultEventBus.emit(_progress_event(job, download_progress, site=site))
+
+            Console.log_dim(
+                str(download_progress),
+                return_line=True,
             )
-            last_resort_infos.append((site, download_info))
-            continue
 
-        yield (site, download_info)
+        stalled = stall_watch.check(time.monotonic())
+        if stalled is not None:
+            job.kill()
+            raise DownloadStalledException(stalled)
 
-    for download_info_group in last_resort_infos:
-        yield download_info_group
+        time.sleep(PROGRESS_POLL_SECONDS)
 
+    ecode = job.wait()
+    if ecode != 0:
+        proc_stderr = job.stderr()
 
-def download_by_sites(
+        if "'Connection aborted.'" in proc_stderr:
+            raise ConnectionAbortedException("Connection aborted")
+
+        if "Unable to download webpage: HTTP Error 404: Not Found" in proc_stderr:
+            raise DownloadNotFoundException("Got 404")
+
+        print(job.describe())
+        raise Exception(f"Something broke ({ecode}):\nSTDERR:\n  {proc_stderr}")
+
+
+def download_episode(
     *,
     download_sites: dict[str, str],
     episode_url: str,
     output_file: str,
-    episode_number: int | float,
     unwanted_cdn_hostnames: list[str] | set[str] = [],
-):
+    hedge: int = 0,
+    engine: str = DOWNLOAD_ENGINE,
+    resolved_ahead: dict[str, DownloadInfo | None] | None = None,
+) -> DownloadInfo | None:
+    """
+    Try the sources in order until one of them downloads into `output_file`.
+
+    Returns the download info of the source that worked (its `after_dl` is
+    left to the caller) or `None` if all of them failed. Sources already
+    resolved by `resolve_ahead` can be passed in `resolved_ahead`.
+    """
+
     Console.log_dim("Trying to find download link...", return_line=True)
 
-    processed = 0
-    for site, download_info in download_infos(
+    resolved_infos = download_infos(
         sites=download_sites,
         episode_url=episode_url,
         unwanted_hostnames=unwanted_cdn_hostnames,
-    ):
-        processed += 1
-        try:
-            if download_info is None:
-                raise NoHandlerException("No handler")
+        output_file=output_file,
+        resolved_ahead=resolved_ahead,
+    )
+
+    if hedge > 1:
+        attempts = race_download_infos(
+            iter(resolved_infos),
+            output_file=output_file,
+            hedge=hedge,
+            engine=engine,
+        )
+    else:
+        attempts = (
+            (site, download_info, None) for site, download_info in resolved_infos
+        )
+
+    processed = 0
+    try:
+        for site, download_info, job in attempts:
+            processed += 1
+            try:
+                if download_info is None:
+                    raise NoHandlerException("No handler")
 
-            url = download_info.url
-            referer = download_info.referer or url
+                url = download_info.url
 
-            Console.log(
-                f"{Chalk.colour(Chalk.italic)}Downloading from {site}: {url}{Chalk.colour('23m')}"
-            )
+                Console.log(
+                    f"{Chalk.colour(Chalk.italic)}Downloading from {site}: {url}{Chalk.colour('23m')}"
+                )
 
-            Console.log_dim("Starting download...", return_line=True)
-            download_cmd = [
-                "yt-dlp",
-                "--ignore-config",
-                "--no-warnings",
-                "--no-check-certificate",
-                "--abort-on-unavailable-fragments",
-                "--retries",
-                "infinite",
-                "--downloader",
-                "ffmpeg",
-                "--downloader-args",
-                "-hide_banner -loglevel error -progress - -nostats",
-                "--referer",
-                referer,
-                *list(
-                    chain(
-                        *[["--add-header", header] for header in download_info.headers]
+                if job is None:
+                    Console.log_dim("Starting download...", return_line=True)
+                    job = start_download_job(download_info, output_file, engine=engine)
+
+                try:
+                    wait_for_download(job, site=site)
+                except BaseException:
+                    job.kill()
+                    if job.output_file != output_file:
+                        job.remove_partial_files()
+                    raise
+
+                if job.output_file != output_file:
+                    os.replace(job.output_file, output_file)
+
+                _record_download(
+                    download_sites[site],
+                    download_info,
+                    ok=True,
+                    job=job,
+                    output_file=output_file,
+                )
+            except KeyboardInterrupt:
+                continue
+            except Exception as e:
+                DefaultEventBus.emit(
+                    ErrorEvent(
+                        output_file=output_file,
+                        site=site,
+                        message=str(e) or type(e).__name__,
+                        recoverable=True,
                     )
-                ),
-                "--output",
-                output_file,
-                url,
-            ]
-            _download_line_native = re.compile(r"\[download\]\s+(\d+\.\d+%.*)")
-
-            with subprocess.Popen(
-                download_cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                bufsize=1,
-                text=True,
-            ) as proc:
-                Console.log_dim("Waiting for download progress...", return_line=True)
-                for line in proc.stdout or []:
-                    # if download_line_native.search(line):
-                    #     status = line.split(" ", maxsplit=1)[1].strip()
-                    #     Console.log_dim(status, return_line=True)
-                    #     continue
-
-                    # Read lines until status stuff comes along
-                    if line[0] == "[":
-                        continue
-                    break
-
-                time_last_size_change = datetime.datetime.now()
-                prev_size: str | None = None
-                time_last_speed_gt_1 = datetime.datetime.now()
-                prev_speed: str | None = None
-                download_progress = DownloadProgressInfo()
-                while proc.poll() is None:
-                    try:
-                        # Read status block
-                        for line in proc.stdout or []:
-                            if line.startswith("progress="):
-                                break
-                            key, value = line.strip().split("=", maxsplit=1)
-                            download_progress.set(key, value)
-                    except Exception:
-                        pass
-
-                    cur_speed = download_progress.get("speed", None)
-                    cur_size = download_progress.get("total_size", None)
-
-                    if cur_size != prev_size:
-                        time_last_size_change = datetime.datetime.now()
-
-                    if cur_speed is not None and float(cur_speed[:-1]) > 1:
-                        time_last_speed_gt_1 = datetime.datetime.now()
-
-                    size_same_for_s = (
-                        datetime.datetime.now() - time_last_size_change
-                    ).total_seconds()
-
-                    if prev_size is not None and cur_size == prev_size:
-                        is_processing = prev_speed == cur_speed
-                        if not is_processing and size_same_for_s >= 30:
-                            proc.kill()
-                            raise DownloadStalledException("Stalled for too long")
-
-                    if (
-                        prev_speed is not None
-                        and cur_speed is not None
-                        and float(cur_speed[:-1]) < 1
-                    ):
-                        time_speed_lt_1 = (
-                            datetime.datetime.now() - time_last_speed_gt_1
-                        ).total_seconds()
-                        if time_speed_lt_1 >= 60:
-                            proc.kill()
-                            raise DownloadStalledException("Speed too low")
-
-                    prev_size = cur_size
-                    prev_speed = cur_speed
+                )
 
+                if isinstance(e, NoHandlerException):
                     Console.log_dim(
-                        str(download_progress),
-                        return_line=True,
+                        f"No handler for {download_sites[site]} on {site}"
+                        f" (it can be routed to one in {ROUTES_FILE})"
                     )
+                    continue
 
-                ecode = proc.wait()
-                if ecode != 0:
-                    if not proc.stderr:
-                        raise Exception(f"Something broke ({ecode})")
+                # A stalled or dropped download is worth retrying from the same
+                # URL, anything else means it's probably no good anymore
+                if not isinstance(
+                    e, (DownloadStalledException, ConnectionAbortedException)
+                ):
+                    DefaultDownloadInfoCache.forget(download_sites[site])
 
-                    proc_stderr = "\n  ".join(proc.stderr.readlines())
+                if download_info is not None:
+                    _record_download(download_sites[site], download_info, ok=False)
 
-                    if "'Connection aborted.'" in proc_stderr:
-                        Console.log_dim("Connection aborted. Discarding URL")
-                        continue
+                if isinstance(e, DownloadRecoverableException):
+                    Console.log_dim(f"Got recoverable error: {e}, skipping source")
+                    continue
 
-                    if (
-                        "Unable to download webpage: HTTP Error 404: Not Found"
-                        in proc_stderr
-                    ):
-                        Console.log_dim("Got 404. Discarding URL")
-                        continue
-
-                    print(subprocess.list2cmdline(download_cmd))
-                    raise Exception(
-                        f"Something broke ({ecode}):\nSTDERR:\n  {proc_stderr}"
-                    )
-
-            download_info.after_dl(output_file, download_info)
-        except KeyboardInterrupt:
-            continue
-        except Exception as e:
-            if isinstance(e, NoHandlerException):
-                Console.log_dim(f"No handler for {download_sites[site]} on {site}")
+                print(("\n" + "=" * 32) * 2)
+                print(e, traceback.format_exc())
+                print(("=" * 32 + "\n") * 2)
                 continue
 
-            if isinstance(e, DownloadRecoverableException):
-                Console.log_dim(f"Got recoverable error: {e}, skipping source")
-                continue
-
-            print(("\n" + "=" * 32) * 2)
-            print(e, traceback.format_exc())
-            print(("=" * 32 + "\n") * 2)
-
-        for _ in range(processed):
-            Console.clear_line()
-            Console.move_up(1)
-        Console.log_success(f"Episode {episode_number} downloaded")
-        exit()
+            for _ in range(processed):
+                Console.clear_line()
+                Console.move_up(1)
+            return download_info
+    finally:
+        attempts.close()
+        resolved_infos.close()
 
     Console.clear_line()
     Console.move_up(processed)
-    Console.log_error(f"Failed to download episode {episode_number}")
-    exit(1)
+    return None
 
 
-T = TypeVar("T")
-
-
-@dataclass
-class DownloadProgressInfo:
-    _state: dict[str, str] = field(default_factory=dict)
-
-    def set(self, key: str, value: str):
-        self._state[key.strip()] = value.strip()
-
-    def get(self, key: str, default):
-        return self._state.get(key, default)
+def _record_download(
+    download_url: str,
+    download_info: DownloadInfo,
+    *,
+    ok: bool,
+    job: DownloadJob | None = None,
+    output_file: str | None = None,
+) -> None:
+    bytes_per_second = None
+    if job is not None and job.started_at is not None and output_file is not None:
+        # From the job's own start (a hedged winner started before the race
+        # was decided), counting only what this run downloaded itself
+        seconds = time.monotonic() - job.started_at
+        try:
+            downloaded = os.path.getsize(output_file) - job.resumed_bytes
+        except OSError:
+            downloaded = 0
+        if seconds > 0 and downloaded > 0:
+            bytes_per_second = downloaded / seconds
 
-    def _s(self, key, pad=0, *, default="???") -> str:
-        return self._state.get(key, default).rjust(pad, " ")
+    DefaultPerfStore.record_download(
+        handler_domain(download_url),
+        urlparse(download_info.url).hostname or "",
+        ok=ok,
+        bytes_per_second=bytes_per_second,
+    )
 
-    def _s_if(self, key, pad=0, *, default="???"):
-        if key in self._state:
-            return self._s(key=key, pad=pad, default=default)
-        return None
 
-    @staticmethod
-    def _chain_if(initial: T | None, *processors: Callable[[T], T]) -> T | None:
-        fns = flatten(processors)
-        for fn in fns:
-            if initial is None:
-                break
-            initial = fn(initial)
-        return initial
-
-    def _get_output_layout(self):
-        return [
-            {"time": lambda: self._s_if("out_time")},
-            "|",
-            {
-                "fps": lambda: self._s_if("fps", 6),
-                "speed": lambda: self._s_if("speed", 5),
-                "bitrate": lambda: self._s_if("bitrate", 6),
-            },
-            "|",
-            {
-                "size": lambda: self._chain_if(
-                    self._s_if("total_size"),
-                    lambda x: str(x).strip(),
-                    lambda x: human_byte_size(x),
-                )
-            },
-        ]
-
-    def to_str(self):
-        out: list[str] = []
-        for item in self._get_output_layout():
-            match item:
-                case dict():
-                    for name, value in item.items():
-                        match value:
-                            case gen if callable(gen):
-                                res = gen()
-                                if res is not None:
-                                    out.append(f"{name}={res}")
-                            case None:
-                                out.append(f"{name}")
-                            case value:
-                                out.append(f"{name}={value}")
-                case gen if callable(gen):
-                    res = gen()
-                    if res is not None:
-                        out.append(str(res))
-                case value:
-                    out.append(str(value))
-        return " ".join(out)
-
-    def __str__(self) -> str:
-        return self.to_str()
+def download_by_sites(
+    *,
+    download_sites: dict[str, str],
+    episode_url: str,
+    output_file: str,
+    episode_number: int | float,
+    unwanted_cdn_hostnames: list[str] | set[str] = [],
+    hedge: int = 0,
+    engine: str = DOWNLOAD_ENGINE,
+):
+    download_info = download_episode(
+        download_sites=download_sites,
+        episode_url=episode_url,
+        output_file=output_file,
+        unwanted_cdn_hostnames=unwanted_cdn_hostnames,
+        hedge=hedge,
+        engine=engine,
+    )
+
+    if download_info is None:
+        DefaultEventBus.emit(
+            ErrorEvent(
+                output_file=output_file,
+                episode=episode_number,
+                message="All sources failed",
+            )
+        )
+        Console.log_error(f"Failed to download episode {episode_number}")
+        exit(1)
+
+    post_process(download_info, output_file)
+    DefaultEventBus.emit(DoneEvent(output_file=output_file, episode=episode_number))
+    Console.log_success(f"Episode {episode_number} downloaded")
+    exit()
+
+
+def post_process(download_info: DownloadInfo, output_file: str) -> None:
+    DefaultEventBus.emit(
+        PostProcessingEvent(
+            output_file=output_file,
+            post_processor=download_info.post_processor,
+        )
+    )
+    try:
+        download_info.after_dl(output_file)
+    except Exception as e:
+        print(("\n" + "=" * 32) * 2)
+        print(e, traceback.format_exc())
+        print(("=" * 32 + "\n") * 2)
 
 
 class DownloadRecoverableException(Exception):
@@ -322,7 +715,5 @@ class DownloadStalledException(DownloadRecoverableException):
     pass
 
 
-class DownloadByInfoEvent(StrEnum):
-    WAITING_FOR_PROGRESS = auto()
-    DOWNLOAD_PROGRESS = auto()
-    ERROR = auto()
+class DownloadNotFoundException(DownloadRecoverableException):
+    pass
@@ -0,0 +1,202 @@
+import json
+import os
+import re
+import time
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import Any
+from urllib.parse import parse_qsl, urlparse
+
+import requests
+
+from python.downloaders import DownloadInfo
+from python.helpers.download_job import request_headers
+from python.helpers.json_store import JsonStore, cache_path
+from python.helpers.scraper_pool import get_scraper
+
+# How long a resolved URL is trusted when it doesn't say when it expires
+DOWNLOAD_INFO_TTL_SECONDS = float(
+    os.getenv("DOWNLOADERS_DOWNLOAD_INFO_TTL_SECONDS", str(30 * 60))
+)
+# Signed URLs are dropped this long before they say they expire, so they
+# don't run out in the middle of a download
+DOWNLOAD_INFO_EXPIRY_MARGIN_SECONDS = 5 * 60
+DOWNLOAD_INFO_PROBE_TIMEOUT_SECONDS = 5.0
+
+# Query parameters signed CDN URLs keep their expiry (a unix timestamp) in
+_EXPIRY_PARAMS = {
+    "e",
+    "exp",
+    "expire",
+    "expires",
+    "expiry",
+    "expiration",
+    "deadline",
+    "validto",
+    "valid_until",
+}
+# Akamai-style tokens (`hdnts=exp=1700000000~acl=...`), also seen in paths
+_EXPIRY_TOKEN_REGEX = re.compile(r"(?:^|[~&/;,])exp=(\d{10,13})(?=$|[~&/;,])")
+
+
+def _timestamp(value: str) -> float | None:
+    if not value.isdigit() or len(value) not in (10, 13):
+        return None
+    timestamp = int(value)
+    return timestamp / 1000 if len(value) == 13 else float(timestamp)
+
+
+def url_expiry(url: str) -> float | None:
+    """When a signed URL says it stops working, if it says so."""
+
+    parsed = urlparse(url)
+    params = parse_qsl(parsed.query, keep_blank_values=True)
+    expiries: list[float] = []
+
+    for key, value in params:
+        if key.lower() in _EXPIRY_PARAMS:
+            timestamp = _timestamp(value)
+            if timestamp is not None:
+                expiries.append(timestamp)
+
+    # Signed at `s`, valid for `e` seconds
+    short = {key.lower(): value for key, value in params if key in ("s", "e")}
+    if short.get("e", "").isdigit() and len(short["e"]) < 10:
+        signed_at = _timestamp(short.get("s", ""))
+        if signed_at is not None:
+            expiries.append(signed_at + int(short["e"]))
+
+    # AWS SigV4: signed at `X-Amz-Date`, valid for `X-Amz-Expires` seconds
+    amz = {key.lower(): value for key, value in params if key.lower().startswith("x-amz-")}
+    if "x-amz-date" in amz and amz.get("x-amz-expires", "").isdigit():
+        try:
+            signed_at = datetime.strptime(amz["x-amz-date"], "%Y%m%dT%H%M%SZ")
+        except ValueError:
+            pass
+        else:
+            expiries.append(
+                signed_at.replace(tzinfo=timezone.utc).timestamp()
+                + int(amz["x-amz-expires"])
+            )
+
+    for value in [parsed.path, *(value for _, value in params)]:
+        for match in _EXPIRY_TOKEN_REGEX.finditer(value):
+            timestamp = _timestamp(match.group(1))
+            if timestamp is not None:
+                expiries.append(timestamp)
+
+    return min(expiries) if expiries else None
+
+
+def probe(download_info: DownloadInfo) -> bool:
+    """Whether the URL still answers, fetching as little of it as possible."""
+
+    try:
+        response = get_scraper(download_info.url).get(
+            download_info.url,
+            headers={**request_headers(download_info), "Range": "bytes=0-0"},
+            timeout=DOWNLOAD_INFO_PROBE_TIMEOUT_SECONDS,
+            stream=True,
+        )
+    except requests.RequestException:
+        return False
+
+    try:
+        return 200 <= response.status_code < 300
+    finally:
+        response.close()
+
+
+class DownloadInfoCache:
+    """
+    On-disk cache of what embed URLs resolved to, so a retried episode can
+    start downloading straight away instead of scraping (and deobfuscating)
+    the embed pages again.
+
+    Entries expire when their URL says it does (see `url_expiry`) or after
+    `DOWNLOAD_INFO_TTL_SECONDS`, and are probed before being handed out.
+    """
+
+    # Don't use what's stored, only store new results
+    refresh: bool
+
+    _store: JsonStore
+
+    def __init__(self, store: JsonStore) -> None:
+        self._store = store
+        self.refresh = False
+
+    def get(self, embed_url: str) -> DownloadInfo | None:
+        if self.refresh:
+            return None
+
+        try:
+            entry = self._store.read().get(embed_url)
+        except OSError:
+            return None
+        if entry is None:
+            return None
+
+        if float(entry.get("expires_at", 0)) < time.time():
+            self.forget(embed_url)
+            return None
+
+        try:
+            download_info = DownloadInfo(**entry["info"])
+        except (KeyError, TypeError):
+            self.forget(embed_url)
+            return None
+
+        if not probe(download_info):
+            self.forget(embed_url)
+            return None
+
+        return download_info
+
+    def put(self, embed_url: str, download_info: DownloadInfo) -> None:
+        now = time.time()
+        expires_at = url_expiry(download_info.url)
+        if expires_at is None:
+            expires_at = now + DOWNLOAD_INFO_TTL_SECONDS
+        else:
+            expires_at -= DOWNLOAD_INFO_EXPIRY_MARGIN_SECONDS
+
+        if expires_at <= now:
+            return
+
+        entry: dict[str, Any] = {
+            "info": asdict(download_info),
+            "stored_at": now,
+            "expires_at": expires_at,
+        }
+
+        try:
+            json.dumps(entry)
+        except (TypeError, ValueError):
+            # A handler put something into the post-processor arguments that
+            # can't be stored
+            return
+
+        try:
+            with self._store.update() as data:
+                for stale_key in [
+                    k for k, v in data.items() if float(v.get("expires_at", 0)) < now
+                ]:
+                    del data[stale_key]
+                data[embed_url] = entry
+        except OSError:
+            pass
+
+    def forget(self, embed_url: str) -> None:
+        try:
+            with self._store.update() as data:
+                data.pop(embed_url, None)
+        except OSError:
+            pass
+
+
+DefaultDownloadInfoCache = DownloadInfoCache(
+    JsonStore(
+        os.getenv("DOWNLOADERS_DOWNLOAD_INFO_CACHE", cache_path("download_infos.json")),
+    )
+)
@@ -0,0 +1,363 @@
+import os
+import subprocess
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from itertools import chain
+from typing import Callable, Iterable, Self
+
+from python.downloaders import DownloadInfo
+from python.helpers.checkpoint import checkpoint_path
+from python.helpers.process_monitor import ProcessMonitor
+from python.helpers.size import human_byte_size
+
+# How long `kill()` waits for a threaded download to wind down
+KILL_TIMEOUT_SECONDS = 5.0
+
+
+@dataclass(frozen=True)
+class ProgressField:
+    key: str
+    label: str
+    pad: int = 0
+    convert: Callable[[str], str] | None = None
+
+
+class ProgressFormatter:
+    """
+    Formats progress blocks by a fixed layout of fields and separators.
+    Fields missing from a block are left out.
+    """
+
+    _parts: tuple[str | ProgressField, ...]
+
+    def __init__(self, layout: Iterable[str | ProgressField]) -> None:
+        self._parts = tuple(layout)
+
+    def format(self, state: dict[str, str]) -> str:
+        out: list[str] = []
+        for part in self._parts:
+            if isinstance(part, str):
+                out.append(part)
+                continue
+
+            value = state.get(part.key)
+            if value is None:
+                continue
+            if part.convert is not None:
+                try:
+                    value = part.convert(value)
+                except ValueError:
+                    # eg. `N/A` before ffmpeg knows
+                    pass
+            out.append(f"{part.label}={value.rjust(part.pad)}")
+        return " ".join(out)
+
+
+PROGRESS_FORMATTER = ProgressFormatter(
+    [
+        ProgressField("out_time", "time"),
+        "|",
+        ProgressField("fps", "fps", 6),
+        ProgressField("speed", "speed", 5),
+        ProgressField("bitrate", "bitrate", 6),
+        "|",
+        ProgressField("total_size", "size", convert=human_byte_size),
+    ]
+)
+
+
+@dataclass
+class DownloadProgressInfo:
+    _state: dict[str, str] = field(default_factory=dict)
+
+    def set(self, key: str, value: str):
+        self._state[key.strip()] = value.strip()
+
+    def get(self, key: str, default):
+        return self._state.get(key, default)
+
+    @property
+    def is_finishing(self) -> bool:
+        # ffmpeg ends its last block with `progress=end`. Whatever comes after
+        # (remuxing, yt-dlp's post-processing) doesn't report any progress
+        return self.get("progress", None) == "end"
+
+    def to_str(self):
+        return PROGRESS_FORMATTER.format(self._state)
+
+    def __str__(self) -> str:
+        return self.to_str()
+
+
+def request_headers(download_info: DownloadInfo) -> dict[str, str]:
+    """The HTTP headers (including the referer) a download needs to send."""
+
+    headers = {}
+    for header in download_info.headers:
+        name, _, value = header.partition(":")
+        headers[name.strip()] = value.strip()
+
+    headers.setdefault("Referer", download_info.referer or download_info.url)
+
+    return headers
+
+
+class DownloadCancelledException(Exception):
+    pass
+
+
+class DownloadJob(ABC):
+    """
+    A single download running in the background.
+
+    Implementations report their progress with the same keys ffmpeg's
+    `-progress` output uses; every complete block replaces `progress` and
+    bumps `progress_version`.
+    """
+
+    download_info: DownloadInfo
+    output_file: str
+    progress: DownloadProgressInfo
+    progress_version: int
+    # When `start()` was called (`time.monotonic()`)
+    started_at: float | None
+    # What was already downloaded by an earlier run this one resumed
+    resumed_bytes: int
+
+    _samples: deque[tuple[float, float]]
+
+    def __init__(self, download_info: DownloadInfo, output_file: str) -> None:
+        self.download_info = download_info
+        self.output_file = output_file
+        self.started_at = None
+        self.resumed_bytes = 0
+        self.progress = DownloadProgressInfo()
+        self.progress_version = 0
+        self._samples = deque(maxlen=256)
+
+    @abstractmethod
+    def start(self) -> Self: ...
+
+    @abstractmethod
+    def poll(self) -> int | None: ...
+
+    @abstractmethod
+    def wait(self) -> int: ...
+
+    @abstractmethod
+    def kill(self) -> None: ...
+
+    @abstractmethod
+    def stderr(self) -> str: ...
+
+    def describe(self) -> str:
+        return f"{type(self).__name__} {self.download_info.url} -> {self.output_file}"
+
+    def partial_files(self) -> list[str]:
+        return [
+            self.output_file,
+            f"{self.output_file}.part",
+            checkpoint_path(self.output_file),
+        ]
+
+    def remove_partial_files(self) -> None:
+        for path in self.partial_files():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _publish_progress(self, block: DownloadProgressInfo) -> None:
+        self.progress = DownloadProgressInfo(dict(block._state))
+        self.progress_version += 1
+
+        try:
+            self._samples.append((time.monotonic(), float(block.get("total_size", 0))))
+        except ValueError:
+            pass
+
+    def throughput(self, *, window_secs: float = 10.0) -> float:
+        """Average bytes per second written over the last `window_secs`."""
+
+        samples = list(self._samples)
+        if len(samples) < 2:
+            return 0.0
+
+        last_time, last_size = samples[-1]
+        first_time, first_size = next(
+            (s for s in samples if last_time - s[0] <= window_secs),
+            samples[0],
+        )
+
+        if last_time <= first_time:
+            return 0.0
+
+        return max(0.0, last_size - first_size) / (last_time - first_time)
+
+
+class YtDlpDownloadJob(DownloadJob):
+    """Downloads through `yt-dlp` with ffmpeg, parsing its `-progress` output."""
+
+    _proc: subprocess.Popen | None
+    _monitor: ProcessMonitor | None
+    _block: DownloadProgressInfo
+
+    def __init__(self, download_info: DownloadInfo, output_file: str) -> None:
+        super().__init__(download_info, output_file)
+        self._proc = None
+        self._monitor = None
+        self._block = DownloadProgressInfo()
+
+    @property
+    def cmd(self) -> list[str]:
+        url = self.download_info.url
+        referer = self.download_info.referer or url
+
+        return [
+            "yt-dlp",
+            "--ignore-config",
+            "--no-warnings",
+            "--no-check-certificate",
+            "--abort-on-unavailable-fragments",
+            "--retries",
+            "infinite",
+            "--downloader",
+            "ffmpeg",
+            "--downloader-args",
+            "-hide_banner -loglevel error -progress - -nostats",
+            "--referer",
+            referer,
+            *list(
+                chain(
+                    *[
+                        ["--add-header", header]
+                        for header in self.download_info.headers
+                    ]
+                )
+            ),
+            "--output",
+            self.output_file,
+            url,
+        ]
+
+    def start(self) -> Self:
+        self.started_at = time.monotonic()
+        self._proc = subprocess.Popen(
+            self.cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+        )
+        self._monitor = ProcessMonitor(
+            self._proc,
+            on_stdout=self._on_progress_line,
+        ).start(name=f"progress {self.output_file}")
+        return self
+
+    def _on_progress_line(self, line: str) -> None:
+        # Skip yt-dlp's own messages until ffmpeg starts reporting
+        if line.startswith("[") or "=" not in line:
+            return
+
+        key, value = line.strip().split("=", maxsplit=1)
+        self._block.set(key, value)
+        if key == "progress":
+            self._publish_progress(self._block)
+
+    def poll(self) -> int | None:
+        return self._proc.poll() if self._proc else None
+
+    def wait(self) -> int:
+        assert self._proc is not None
+        ecode = self._proc.wait()
+        if self._monitor is not None:
+            # Whatever the process wrote last is still in the pipes
+            self._monitor.join(timeout=5)
+        return ecode
+
+    def kill(self) -> None:
+        if self._proc and self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+
+    def stderr(self) -> str:
+        if self._monitor is None:
+            return ""
+        return self._monitor.stderr()
+
+    def describe(self) -> str:
+        return subprocess.list2cmdline(self.cmd)
+
+
+class ThreadedDownloadJob(DownloadJob):
+    """
+    Base for downloads implemented in Python. `prepare()` runs synchronously
+    in `start()` (and may raise to reject the download), `run()` runs on a
+    background thread and should check `cancelled` regularly.
+    """
+
+    cancelled: threading.Event
+
+    _thread: threading.Thread | None
+    _exit_code: int | None
+    _error: str
+
+    def __init__(self, download_info: DownloadInfo, output_file: str) -> None:
+        super().__init__(download_info, output_file)
+        self.cancelled = threading.Event()
+        self._thread = None
+        self._exit_code = None
+        self._error = ""
+
+    def prepare(self) -> None:
+        pass
+
+    @abstractmethod
+    def run(self) -> None: ...
+
+    def start(self) -> Self:
+        self.started_at = time.monotonic()
+        self.prepare()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"download {self.output_file}",
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        try:
+            self.run()
+            self._exit_code = 0
+        except DownloadCancelledException:
+            self._exit_code = -9
+        except Exception as e:
+            self._error = f"{type(e).__name__}: {e}"
+            self._exit_code = 1
+
+    def check_cancelled(self) -> None:
+        if self.cancelled.is_set():
+            raise DownloadCancelledException()
+
+    def poll(self) -> int | None:
+        return self._exit_code
+
+    def wait(self) -> int:
+        assert self._thread is not None
+        self._thread.join()
+        return self._exit_code if self._exit_code is not None else 1
+
+    def kill(self) -> None:
+        self.cancelled.set()
+        if self._thread:
+            # Whatever can't be interrupted (eg. a request in flight) is left
+            # to notice on its own, in the background
+            self._thread.join(KILL_TIMEOUT_SECONDS)
+
+    def stderr(self) -> str:
+        return self._error
@@ -0,0 +1,431 @@
+import hashlib
+import os
+import re
+import subprocess
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any
+from urllib.parse import urljoin, urlparse
+
+from python.downloaders import DownloadInfo
+from python.helpers.checkpoint import DownloadCheckpoint
+from python.helpers.download_job import (
+    DownloadProgressInfo,
+    ThreadedDownloadJob,
+    request_headers,
+)
+from python.helpers.scraper_pool import get_scraper
+
+HLS_WORKERS = int(os.getenv("DOWNLOADERS_HLS_WORKERS", "8"))
+HLS_SEGMENT_RETRIES = int(os.getenv("DOWNLOADERS_HLS_SEGMENT_RETRIES", "5"))
+HLS_REQUEST_TIMEOUT_SECONDS = 30.0
+
+_ATTRIBUTE_REGEX = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+class HlsUnsupportedException(Exception):
+    pass
+
+
+@dataclass
+class HlsSegment:
+    index: int
+    url: str
+    duration: float = 0.0
+    # (offset, length)
+    byte_range: tuple[int, int] | None = None
+
+
+@dataclass
+class HlsVariant:
+    bandwidth: int
+    url: str
+    resolution: str | None = None
+    # `GROUP-ID` of the audio renditions that go with this variant
+    audio: str | None = None
+
+
+@dataclass
+class HlsPlaylist:
+    segments: list[HlsSegment] = field(default_factory=list)
+    init_segment: HlsSegment | None = None
+    variants: list[HlsVariant] = field(default_factory=list)
+    # Playlist URLs of the alternate audio renditions, by `GROUP-ID`
+    audio_groups: dict[str, list[str]] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return sum(segment.duration for segment in self.segments)
+
+
+def is_hls_url(url: str) -> bool:
+    return urlparse(url).path.endswith(".m3u8")
+
+
+def _parse_attributes(value: str) -> dict[str, str]:
+    return {
+        key: attr_value.strip('"')
+        for key, attr_value in _ATTRIBUTE_REGEX.findall(value)
+    }
+
+
+def _parse_byte_range(value: str, default_offset: int) -> tuple[int, int]:
+    length, _, offset = value.partition("@")
+    return (int(offset) if offset else default_offset, int(length))
+
+
+def parse_playlist(text: str, base_url: str) -> HlsPlaylist:
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines or lines[0] != "#EXTM3U":
+        raise HlsUnsupportedException("Not an HLS playlist")
+
+    playlist = HlsPlaylist()
+    ended = False
+    duration = 0.0
+    byte_range: str | None = None
+    next_offsets: dict[str, int] = {}
+    variant_attributes: dict[str, str] | None = None
+
+    for line in lines[1:]:
+        if not line.startswith("#"):
+            url = urljoin(base_url, line)
+
+            if variant_attributes is not None:
+                playlist.variants.append(
+                    HlsVariant(
+                        bandwidth=int(variant_attributes.get("BANDWIDTH", "0") or 0),
+                        url=url,
+                        resolution=variant_attributes.get("RESOLUTION"),
+                        audio=variant_attributes.get("AUDIO"),
+                    )
+                )
+                variant_attributes = None
+                continue
+
+            segment = HlsSegment(
+                index=len(playlist.segments),
+                url=url,
+                duration=duration,
+            )
+            if byte_range is not None:
+                segment.byte_range = _parse_byte_range(
+                    byte_range, next_offsets.get(url, 0)
+                )
+                next_offsets[url] = sum(segment.byte_range)
+
+            playlist.segments.append(segment)
+            duration = 0.0
+            byte_range = None
+            continue
+
+        tag, _, value = line.partition(":")
+        match tag:
+            case "#EXT-X-STREAM-INF":
+                variant_attributes = _parse_attributes(value)
+            case "#EXT-X-MEDIA":
+                attributes = _parse_attributes(value)
+                # Renditions without a URI are muxed into the variants
+                if attributes.get("TYPE") == "AUDIO" and "URI" in attributes:
+                    playlist.audio_groups.setdefault(
+                        attributes.get("GROUP-ID", ""), []
+                    ).append(urljoin(base_url, attributes["URI"]))
+            case "#EXTINF":
+                duration = float(value.split(",")[0] or 0)
+            case "#EXT-X-BYTERANGE":
+                byte_range = value
+            case "#EXT-X-KEY":
+                method = _parse_attributes(value).get("METHOD", "NONE")
+                if method != "NONE":
+                    raise HlsUnsupportedException(f"Encrypted stream ({method})")
+            case "#EXT-X-MAP":
+                attributes = _parse_attributes(value)
+                playlist.init_segment = HlsSegment(
+                    index=-1,
+                    url=urljoin(base_url, attributes["URI"]),
+                    byte_range=(
+                        _parse_byte_range(attributes["BYTERANGE"], 0)
+                        if "BYTERANGE" in attributes
+                        else None
+                    ),
+                )
+            case "#EXT-X-ENDLIST":
+                ended = True
+
+    if not playlist.variants and not ended:
+        raise HlsUnsupportedException("Live streams are not supported")
+
+    return playlist
+
+
+def format_out_time(seconds: float) -> str:
+    hours, rest = divmod(seconds, 3600)
+    minutes, rest = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{rest:09.6f}"
+
+
+class HlsDownloadJob(ThreadedDownloadJob):
+    """
+    Downloads an HLS stream by fetching its segments concurrently over a
+    pooled session and appending them in order, then remuxing the result
+    into `output_file` with ffmpeg.
+    """
+
+    playlist: HlsPlaylist
+    playlist_url: str
+    variant: HlsVariant | None
+
+    _remux_proc: subprocess.Popen | None
+
+    def __init__(self, download_info: DownloadInfo, output_file: str) -> None:
+        super().__init__(download_info, output_file)
+        self.variant = None
+        self._remux_proc = None
+
+    @property
+    def stream_file(self) -> str:
+        return f"{self.output_file}.hls.part"
+
+    def partial_files(self) -> list[str]:
+        return [*super().partial_files(), self.stream_file]
+
+    def _get(self, url: str, *, byte_range: tuple[int, int] | None = None):
+        headers = request_headers(self.download_info)
+        if byte_range is not None:
+            offset, length = byte_range
+            headers["Range"] = f"bytes={offset}-{offset + length - 1}"
+
+        response = get_scraper(url).get(
+            url,
+            headers=headers,
+            timeout=HLS_REQUEST_TIMEOUT_SECONDS,
+        )
+        response.raise_for_status()
+        return response
+
+    def prepare(self) -> None:
+        url = self.download_info.url
+        playlist = parse_playlist(self._get(url).text, url)
+
+        self.variant = None
+        if playlist.variants:
+            self.variant = max(playlist.variants, key=lambda variant: variant.bandwidth)
+            if self.variant.audio and playlist.audio_groups.get(self.variant.audio):
+                # The variant is likely video only, its audio would have to
+                # be downloaded and muxed in separately
+                raise HlsUnsupportedException("Separate audio rendition")
+            url = self.variant.url
+            playlist = parse_playlist(self._get(url).text, url)
+
+        if not playlist.segments:
+            raise HlsUnsupportedException("Playlist has no segments")
+
+        self.playlist = playlist
+        self.playlist_url = url
+
+    def stream_identity(self) -> dict[str, Any]:
+        """
+        What a checkpoint of the same source has to match to be resumed
+        from. Mirrors often serve other renditions with the same segment
+        count and duration, so the rendition and the (unsigned) playlist and
+        segment paths count too; query strings are left out, they're
+        re-signed on every resolve. Other mirrors go through `same_stream`.
+        """
+
+        first_segments = [self.playlist.segments[0]]
+        if self.playlist.init_segment is not None:
+            first_segments.insert(0, self.playlist.init_segment)
+
+        return {
+            "segments": len(self.playlist.segments),
+            "duration": round(self.playlist.duration, 3),
+            "variant": (
+                {
+                    "bandwidth": self.variant.bandwidth,
+                    "resolution": self.variant.resolution,
+                }
+                if self.variant is not None
+                else None
+            ),
+            "playlist": urlparse(self.playlist_url).path,
+            "first_segment": hashlib.sha1(
+                "\n".join(
+                    f"{urlparse(segment.url).path} {segment.byte_range}"
+                    for segment in first_segments
+                ).encode()
+            ).hexdigest(),
+        }
+
+    def same_stream(self, checkpoint: DownloadCheckpoint) -> bool:
+        """
+        Whether a checkpoint left by another mirror is of this very stream:
+        the same segment count and duration, and the same bytes in the first
+        segment.
+        """
+
+        identity = self.stream_identity()
+        if checkpoint.content_hash is None or any(
+            checkpoint.identity.get(key) != identity[key]
+            for key in ("segments", "duration")
+        ):
+            return False
+
+        try:
+            data = self.fetch_segment(self.playlist.segments[0])
+        except Exception:
+            return False
+        return hashlib.sha1(data).hexdigest() == checkpoint.content_hash
+
+    def fetch_segment(self, segment: HlsSegment) -> bytes:
+        last_error: Exception | None = None
+        for attempt in range(HLS_SEGMENT_RETRIES + 1):
+            self.check_cancelled()
+            try:
+                return self._get(segment.url, byte_range=segment.byte_range).content
+            except Exception as e:
+                last_error = e
+                self.cancelled.wait(min(0.5 * 2**attempt, 10))
+
+        raise Exception(f"Segment {segment.index} failed: {last_error}")
+
+    def write_segments(
+        self,
+        out,
+        segments: list[HlsSegment],
+        checkpoint: DownloadCheckpoint,
+    ) -> None:
+        block = DownloadProgressInfo()
+        total_size = out.tell()
+        media_time_before = sum(
+            segment.duration
+            for segment in self.playlist.segments[: checkpoint.completed_segments]
+        )
+        media_time = 0.0
+        started_at = time.monotonic()
+
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, HLS_WORKERS),
+            thread_name_prefix="hls",
+        )
+        pending: dict[int, Future[bytes]] = {}
+        next_to_submit = 0
+        try:
+            for position, segment in enumerate(segments):
+                # Keep a bounded window of segments in flight
+                while next_to_submit < len(segments) and (
+                    next_to_submit < position + HLS_WORKERS * 2
+                ):
+                    pending[next_to_submit] = executor.submit(
+                        self.fetch_segment,
+                        segments[next_to_submit],
+                    )
+                    next_to_submit += 1
+
+                future = pending.pop(position)
+                while not future.done():
+                    self.check_cancelled()
+                    wait([future], timeout=0.5)
+                data = future.result()
+                self.check_cancelled()
+                out.write(data)
+
+                total_size += len(data)
+                media_time += segment.duration
+
+                if segment.index == 0:
+                    checkpoint.content_hash = hashlib.sha1(data).hexdigest()
+                checkpoint.completed_segments = segment.index + 1
+                checkpoint.completed_bytes = total_size
+                if not self.cancelled.is_set():
+                    out.flush()
+                    checkpoint.save()
+
+                elapsed = max(time.monotonic() - started_at, 1e-6)
+                block.set("total_size", str(total_size))
+                block.set("out_time", format_out_time(media_time_before + media_time))
+                block.set("speed", f"{media_time / elapsed:.3g}x")
+                if media_time > 0:
+                    block.set(
+                        "bitrate",
+                        f"{total_size * 8 / (media_time_before + media_time) / 1000:.1f}kbits/s",
+                    )
+                block.set("progress", "continue")
+                self._publish_progress(block)
+
+            # Remuxing comes next, which reports nothing
+            block.set("progress", "end")
+            self._publish_progress(block)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def remux(self) -> None:
+        self.check_cancelled()
+        self._remux_proc = subprocess.Popen(
+            [
+                "ffmpeg",
+                "-hide_banner",
+                "-loglevel",
+                "error",
+                "-y",
+                "-i",
+                self.stream_file,
+                "-map",
+                "0",
+                "-c",
+                "copy",
+                self.output_file,
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        if self.cancelled.is_set():
+            # `kill()` came in before there was anything to kill
+            self._remux_proc.kill()
+        _, stderr = self._remux_proc.communicate()
+        self.check_cancelled()
+        if self._remux_proc.returncode != 0:
+            raise Exception(f"Remuxing failed: {stderr.strip()}")
+
+        os.remove(self.stream_file)
+
+    def kill(self) -> None:
+        self.cancelled.set()
+        proc = self._remux_proc
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+        super().kill()
+
+    def run(self) -> None:
+        checkpoint, resume = DownloadCheckpoint.resume_or_create(
+            self.output_file,
+            kind="hls",
+            identity=self.stream_identity(),
+            same_content=self.same_stream,
+        )
+
+        if resume and os.path.exists(self.stream_file) and (
+            os.path.getsize(self.stream_file) >= checkpoint.completed_bytes
+        ):
+            out = open(self.stream_file, "r+b")
+            out.truncate(checkpoint.completed_bytes)
+            out.seek(checkpoint.completed_bytes)
+            self.resumed_bytes = checkpoint.completed_bytes
+        else:
+            checkpoint.completed_segments = 0
+            out = open(self.stream_file, "wb")
+            if self.playlist.init_segment is not None:
+                out.write(self.fetch_segment(self.playlist.init_segment))
+            checkpoint.completed_bytes = out.tell()
+
+        with out:
+            self.write_segments(
+                out,
+                self.playlist.segments[checkpoint.completed_segments :],
+                checkpoint,
+            )
+        checkpoint.save(force=True)
+
+        self.remux()
+        checkpoint.remove()
@@ -0,0 +1,92 @@
+import os
+import re
+from typing import Iterator
+
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+
+
+def _default_parser() -> str:
+    configured = os.getenv("DOWNLOADERS_HTML_PARSER")
+    if configured:
+        return configured
+
+    try:
+        import lxml  # noqa: F401
+    except ImportError:
+        return "html.parser"
+
+    return "lxml"
+
+
+# `lxml` (C) when it's installed, the pure-Python `html.parser` otherwise
+HTML_PARSER = _default_parser()
+
+# Script contents are raw text up to the first `</script`, so they can be
+# pulled out without building a tree at all
+_INLINE_SCRIPT_REGEX = re.compile(
+    r"<script\b[^>]*>(.*?)</script\s*>",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def parse(html: str, only: str | None = None, **attrs) -> BeautifulSoup:
+    """
+    Parses `html` with the fastest available parser.
+
+    With `only` (a tag name) and/or `attrs` (eg. `class_="server"`), only the
+    matching elements and their children are kept in the tree.
+    """
+
+    parse_only = SoupStrainer(only, **attrs) if only or attrs else None
+    return BeautifulSoup(html, HTML_PARSER, parse_only=parse_only)
+
+
+def inline_scripts(html: str) -> Iterator[str]:
+    for match in _INLINE_SCRIPT_REGEX.finditer(html):
+        yield match.group(1)
+
+
+def find_script(html: str, *needles: str) -> str | None:
+    """Contents of the first inline script containing all of `needles`."""
+
+    if not all(needle in html for needle in needles):
+        return None
+
+    return next(
+        (
+            script
+            for script in inline_scripts(html)
+            if all(needle in script for needle in needles)
+        ),
+        None,
+    )
+
+
+def _as_tree(html: str | Tag) -> Tag:
+    return html if isinstance(html, Tag) else parse(html)
+
+
+def select_one(html: str | Tag, selector: str) -> Tag | None:
+    return _as_tree(html).select_one(selector)
+
+
+def select(html: str | Tag, selector: str) -> list[Tag]:
+    return list(_as_tree(html).select(selector))
+
+
+def select_attr(html: str | Tag, selector: str, attr: str) -> str | None:
+    """`attr` of the first element matching `selector` that has it."""
+
+    for element in _as_tree(html).select(selector):
+        value = element.attrs.get(attr)
+        if value is not None:
+            return " ".join(value) if isinstance(value, list) else str(value)
+    return None
+
+
+def select_attrs(html: str | Tag, selector: str, attr: str) -> list[str]:
+    return [
+        " ".join(value) if isinstance(value, list) else str(value)
+        for element in _as_tree(html).select(selector)
+        if (value := element.attrs.get(attr)) is not None
+    ]
@@ -0,0 +1,289 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from python.helpers.checkpoint import DownloadCheckpoint
+from python.helpers.download_job import (
+    DownloadCancelledException,
+    DownloadProgressInfo,
+    ThreadedDownloadJob,
+    request_headers,
+)
+from python.helpers.scraper_pool import get_scraper
+
+RANGE_MIN_CONNECTIONS = int(os.getenv("DOWNLOADERS_RANGE_MIN_CONNECTIONS", "2"))
+RANGE_MAX_CONNECTIONS = int(os.getenv("DOWNLOADERS_RANGE_MAX_CONNECTIONS", "12"))
+RANGE_CHUNK_BYTES = int(os.getenv("DOWNLOADERS_RANGE_CHUNK_BYTES", str(8 * 1024 * 1024)))
+RANGE_RETRIES = int(os.getenv("DOWNLOADERS_RANGE_RETRIES", "5"))
+RANGE_REQUEST_TIMEOUT_SECONDS = 30.0
+RANGE_ADAPT_INTERVAL_SECONDS = 3.0
+
+_CONTENT_RANGE_REGEX = re.compile(r"bytes\s+\d+-\d+/(\d+)")
+
+
+class RangeUnsupportedException(Exception):
+    pass
+
+
+def merge_ranges(ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def missing_ranges(
+    completed: list[tuple[int, int]],
+    length: int,
+    chunk_size: int,
+) -> list[tuple[int, int]]:
+    """Split everything in `[0, length)` not covered by `completed` into chunks."""
+
+    gaps: list[tuple[int, int]] = []
+    position = 0
+    for start, end in merge_ranges(completed):
+        if start > position:
+            gaps.append((position, start))
+        position = max(position, end)
+    if position < length:
+        gaps.append((position, length))
+
+    return [
+        (offset, min(offset + chunk_size, end))
+        for start, end in gaps
+        for offset in range(start, end, chunk_size)
+    ]
+
+
+class RangeDownloadJob(ThreadedDownloadJob):
+    """
+    Downloads a progressive file over several connections at once, each
+    fetching its own byte range straight into its offset of a preallocated
+    file. The number of connections grows while it keeps improving the
+    throughput and shrinks when the host starts failing requests.
+    """
+
+    url: str
+    content_length: int
+
+    _lock: threading.Lock
+    _pending: deque[tuple[int, int]]
+    _downloaded: int
+    _errors: int
+    _retries: dict[int, int]
+    _active: int
+    _target_connections: int
+
+    @property
+    def part_file(self) -> str:
+        return f"{self.output_file}.part"
+
+    def prepare(self) -> None:
+        headers = request_headers(self.download_info)
+        headers["Range"] = "bytes=0-0"
+
+        response = get_scraper(self.download_info.url).get(
+            self.download_info.url,
+            headers=headers,
+            stream=True,
+            timeout=RANGE_REQUEST_TIMEOUT_SECONDS,
+        )
+        response.close()
+
+        content_type = response.headers.get("Content-Type", "")
+        content_range = _CONTENT_RANGE_REGEX.match(
+            response.headers.get("Content-Range", "")
+        )
+
+        if response.status_code != 206 or not content_range:
+            raise RangeUnsupportedException("Host doesn't support range requests")
+
+        if "mpegurl" in content_type or content_type.startswith("text/"):
+            raise RangeUnsupportedException(f"Not a media file ({content_type})")
+
+        # Skip the redirects on every range request
+        self.url = response.url
+        self.content_length = int(content_range.group(1))
+
+    def _fetch_range(self, start: int, end: int, fd: int) -> int:
+        """Returns how far the range got, even when the request fails midway."""
+
+        headers = request_headers(self.download_info)
+        headers["Range"] = f"bytes={start}-{end - 1}"
+
+        position = start
+        try:
+            response = get_scraper(self.url).get(
+                self.url,
+                headers=headers,
+                stream=True,
+                timeout=RANGE_REQUEST_TIMEOUT_SECONDS,
+            )
+            with response:
+                if response.status_code != 206:
+                    raise Exception(f"Got HTTP {response.status_code} for range")
+
+                for data in response.iter_content(64 * 1024):
+                    self.check_cancelled()
+                    data = data[: end - position]
+                    os.pwrite(fd, data, position)
+                    position += len(data)
+                    with self._lock:
+                        self._downloaded += len(data)
+                    if position >= end:
+                        break
+        except Exception:
+            self.check_cancelled()
+            with self._lock:
+                self._errors += 1
+
+        return position
+
+    def _worker(self, fd: int, checkpoint: DownloadCheckpoint) -> None:
+        counted = True
+        try:
+            while not self.cancelled.is_set():
+                with self._lock:
+                    if self._active > self._target_connections or not self._pending:
+                        # Leave the pool in the same step as deciding to, so
+                        # the other workers don't all see the old count and
+                        # leave with it
+                        self._active -= 1
+                        counted = False
+                        return
+                    start, end = self._pending.popleft()
+
+                position = self._fetch_range(start, end, fd)
+
+                with self._lock:
+                    if position > start:
+                        checkpoint.completed_ranges = merge_ranges(
+                            [*checkpoint.completed_ranges, (start, position)]
+                        )
+                        checkpoint.save()
+
+                    if position < end:
+                        self._retries[end] = self._retries.get(end, 0) + 1
+                        if self._retries[end] > RANGE_RETRIES:
+                            self._error = f"Range {start}-{end} failed too many times"
+                            self.cancelled.set()
+                            return
+                        self._pending.appendleft((position, end))
+        except DownloadCancelledException:
+            pass
+        finally:
+            if counted:
+                with self._lock:
+                    self._active -= 1
+
+    def _spawn_worker(self, fd: int, checkpoint: DownloadCheckpoint) -> threading.Thread:
+        with self._lock:
+            self._active += 1
+        thread = threading.Thread(
+            target=self._worker,
+            args=(fd, checkpoint),
+            name=f"range {self.output_file}",
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def run(self) -> None:
+        checkpoint, resume = DownloadCheckpoint.resume_or_create(
+            self.output_file,
+            kind="range",
+            identity={"length": self.content_length},
+        )
+        if not resume or not os.path.exists(self.part_file):
+            checkpoint.completed_ranges = []
+
+        with open(self.part_file, "r+b" if checkpoint.completed_ranges else "wb") as f:
+            f.truncate(self.content_length)
+
+        self._lock = threading.Lock()
+        self._pending = deque(
+            missing_ranges(
+                checkpoint.completed_ranges,
+                self.content_length,
+                RANGE_CHUNK_BYTES,
+            )
+        )
+        self._downloaded = sum(end - start for start, end in checkpoint.completed_ranges)
+        self.resumed_bytes = self._downloaded
+        self._errors = 0
+        self._retries = {}
+        self._active = 0
+        self._target_connections = max(1, RANGE_MIN_CONNECTIONS)
+
+        fd = os.open(self.part_file, os.O_WRONLY)
+        try:
+            workers = [
+                self._spawn_worker(fd, checkpoint)
+                for _ in range(self._target_connections)
+            ]
+
+            block = DownloadProgressInfo()
+            last_adapted_at = time.monotonic()
+            last_throughput = 0.0
+            while True:
+                workers = [worker for worker in workers if worker.is_alive()]
+                with self._lock:
+                    # Replace workers that left while there's still work, eg.
+                    # ranges put back after failing once everyone else quit
+                    missing = (
+                        0
+                        if self.cancelled.is_set()
+                        else min(
+                            self._target_connections - self._active,
+                            len(self._pending),
+                        )
+                    )
+                if missing <= 0 and not workers:
+                    break
+                for _ in range(missing):
+                    workers.append(self._spawn_worker(fd, checkpoint))
+
+                time.sleep(0.5)
+
+                with self._lock:
+                    block.set("total_size", str(self._downloaded))
+                block.set("progress", "continue")
+                self._publish_progress(block)
+
+                if time.monotonic() - last_adapted_at < RANGE_ADAPT_INTERVAL_SECONDS:
+                    continue
+                last_adapted_at = time.monotonic()
+
+                throughput = self.throughput(window_secs=RANGE_ADAPT_INTERVAL_SECONDS)
+                with self._lock:
+                    if self._errors:
+                        self._target_connections = max(1, self._target_connections - 1)
+                        self._errors = 0
+                        can_grow = False
+                    else:
+                        can_grow = (
+                            self._target_connections < RANGE_MAX_CONNECTIONS
+                            and throughput > last_throughput * 1.1
+                            and len(self._pending) > 0
+                        )
+                        if can_grow:
+                            # The new worker is spawned on the next round
+                            self._target_connections += 1
+                last_throughput = throughput
+        finally:
+            os.close(fd)
+
+        if self._error:
+            raise Exception(self._error)
+        self.check_cancelled()
+
+        if self._pending or self._downloaded < self.content_length:
+            raise Exception("Download finished with missing ranges")
+
+        os.replace(self.part_file, self.output_file)
+        checkpoint.remove()
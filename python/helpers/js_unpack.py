@@ -0,0 +1,163 @@
+import re
+
+# Decoders for the script obfuscators embed pages use, so unpacking them
+# doesn't need a JS runtime:
+#
+# - Dean Edwards' packer: `eval(function(p,a,c,k,e,d){...}('...',62,99,'...'.split('|'),0,{}))`
+# - the "hunter" packer (kwik): `eval(function(h,u,n,t,e,r){...}("...",12,"abc",34,5,6))`,
+#   whose result is wrapped in `decodeURIComponent(escape(...))`
+
+# The payload and the symbols are matched as whole string literals, so with
+# several packed scripts on a page the first one is found
+_PACKER_REGEXES = [
+    (
+        quote,
+        re.compile(
+            rf"}}\s*\(\s*{quote}((?:[^{quote}\\]|\\.)*){quote},\s*(\d+|\[\]),\s*(\d+),\s*{quote}((?:[^{quote}\\]|\\.)*){quote}\.split\({quote}\|{quote}\)",
+            re.DOTALL,
+        ),
+    )
+    for quote in ("'", '"')
+]
+_HUNTER_REGEX = re.compile(
+    r'}\s*\(\s*"([^"]*)",\s*(\d+),\s*"([^"]*)",\s*(\d+),\s*(\d+),\s*(\d+)\s*\)\s*\)'
+)
+_WORD_REGEX = re.compile(r"\b\w+\b", re.ASCII)
+
+_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ+/"
+
+# How many layers of packing to peel off at most
+MAX_UNPACK_DEPTH = 5
+
+
+def is_packed(source: str) -> bool:
+    return bool(re.search(r"eval\s*\(\s*function\s*\(\s*p\s*,\s*a\s*,\s*c\s*,\s*k\s*,\s*e\s*,", source))
+
+
+def is_hunter_packed(source: str) -> bool:
+    return bool(re.search(r"eval\s*\(\s*function\s*\(\s*h\s*,\s*u\s*,\s*n\s*,\s*t\s*,\s*e\s*,\s*r\s*\)", source))
+
+
+def _unbase(word: str, radix: int) -> int:
+    # Not `int(word, radix)`, that also takes `_`, whitespace and uppercase
+    # digits, none of which the packer produces
+    value = 0
+    for char in word:
+        digit = _ALPHABET.find(char)
+        if not 0 <= digit < radix:
+            raise ValueError(f"`{char}' is not a base {radix} digit")
+        value = value * radix + digit
+    return value
+
+
+def unpack_packer(source: str) -> str | None:
+    """Unpacks the first p,a,c,k,e,d packed script in `source`."""
+
+    matches = [
+        (match, quote)
+        for quote, regex in _PACKER_REGEXES
+        if (match := regex.search(source)) is not None
+    ]
+    if not matches:
+        return None
+    match, quote = min(matches, key=lambda item: item[0].start())
+
+    payload, radix, _count, symbols = match.groups()
+    radix = 62 if radix == "[]" else int(radix)
+    if radix > 62:
+        return None
+
+    payload = payload.replace("\\\\", "\\").replace(f"\\{quote}", quote)
+    symbol_table = symbols.split("|")
+
+    def lookup(word_match: re.Match) -> str:
+        word = word_match.group(0)
+        try:
+            index = _unbase(word, radix)
+        except ValueError:
+            return word
+        if index < len(symbol_table) and symbol_table[index]:
+            return symbol_table[index]
+        return word
+
+    return _WORD_REGEX.sub(lookup, payload)
+
+
+def _hunter_to_decimal(digits: str, base: int) -> int:
+    # Like the packer's own helper, characters outside the base still count
+    # towards the position of the ones after them
+    alphabet = _ALPHABET[:base]
+    return sum(
+        alphabet.index(char) * base**position
+        for position, char in enumerate(reversed(digits))
+        if char in alphabet
+    )
+
+
+def decode_uri_component_escape(value: str) -> str:
+    """`decodeURIComponent(escape(value))`, ie. reading latin-1 as UTF-8."""
+
+    try:
+        return value.encode("latin-1").decode("utf-8")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return value
+
+
+def unpack_hunter(source: str) -> str | None:
+    """Decodes the first h,u,n,t,e,r packed script in `source`."""
+
+    match = _HUNTER_REGEX.search(source)
+    if not match:
+        return None
+
+    encoded, _u, alphabet, offset, base, _r = match.groups()
+    offset, base = int(offset), int(base)
+    if not 0 <= base < len(alphabet):
+        return None
+
+    # Every character ends with the separator, so the last chunk is always empty
+    result = []
+    for chunk in encoded.split(alphabet[base])[:-1]:
+        for digit, char in enumerate(alphabet):
+            chunk = chunk.replace(char, str(digit))
+        result.append(chr(_hunter_to_decimal(chunk, base) - offset))
+
+    return decode_uri_component_escape("".join(result))
+
+
+def unpack_chained_eval(source: str) -> str | None:
+    """
+    Unpacks the script `eval`'d after a preamble, as in kwik's embed pages:
+    `<preamble>;eval(function(p,a,c,k,e,d){...}(...))`. The preamble may be
+    packed itself, so it's skipped rather than unpacked first. `None` if
+    there's no such `eval` or it can't be unpacked.
+    """
+
+    _, found, chained = source.partition(";eval(")
+    if not found:
+        return None
+
+    chained = f"eval({chained}"
+    unpacked = unpack(chained)
+    return unpacked if unpacked != chained else None
+
+
+def unpack(source: str) -> str:
+    """
+    Peels off every layer of packing, whichever packer was used for each.
+    Returns `source` as is when it isn't packed.
+    """
+
+    for _ in range(MAX_UNPACK_DEPTH):
+        if is_hunter_packed(source):
+            unpacked = unpack_hunter(source)
+        elif is_packed(source):
+            unpacked = unpack_packer(source)
+        else:
+            break
+
+        if not unpacked or unpacked == source:
+            break
+        source = unpacked
+
+    return source
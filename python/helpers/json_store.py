@@ -0,0 +1,67 @@
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from typing import Any, Generator
+
+CACHE_DIR = os.getenv(
+    "DOWNLOADERS_CACHE_DIR",
+    os.path.join(
+        os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+        "downloaders",
+    ),
+)
+
+
+def cache_path(*parts: str) -> str:
+    return os.path.join(CACHE_DIR, *parts)
+
+
+class JsonStore:
+    """
+    A JSON object on disk that several processes can safely share.
+
+    Reads take a shared lock, `update()` takes an exclusive one for the whole
+    read-modify-write and replaces the file atomically.
+    """
+
+    path: str
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    @contextmanager
+    def _locked(self, lock_type: int) -> Generator[None, None, None]:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, lock_type)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_unlocked(self) -> dict[str, Any]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+        return data if isinstance(data, dict) else {}
+
+    def _write_unlocked(self, data: dict[str, Any]) -> None:
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def read(self) -> dict[str, Any]:
+        with self._locked(fcntl.LOCK_SH):
+            return self._read_unlocked()
+
+    @contextmanager
+    def update(self) -> Generator[dict[str, Any], None, None]:
+        with self._locked(fcntl.LOCK_EX):
+            data = self._read_unlocked()
+            yield data
+            self._write_unlocked(data)
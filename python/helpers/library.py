@@ -0,0 +1,202 @@
+import os
+import re
+import threading
+from typing import Iterator
+
+from python.helpers.json_store import JsonStore, cache_path
+
+# What downloads end up as (`after_dl` remuxes some of them into `.mkv`)
+EPISODE_EXTENSIONS = ("mp4", "mkv")
+
+_FORMAT_SPEC_REGEX = re.compile(r"%(%|[-+ #0]*\d*(?:\.\d+)?([diufgeFGE]))")
+
+
+def number_format_regex(number_format: str) -> re.Pattern[str]:
+    """
+    Turns a `--number-format` (eg. `%02d` or `S01E%03d`) into a regex that
+    matches the downloaded files, with the episode number as its only group
+    and the rest of the file name in `rest`.
+    """
+
+    parts: list[str] = []
+    position = 0
+    for match in _FORMAT_SPEC_REGEX.finditer(number_format):
+        parts.append(re.escape(number_format[position : match.start()]))
+        if match.group(1) == "%":
+            parts.append("%")
+        elif match.group(2) in "diu":
+            parts.append(r"(\d+)")
+        else:
+            parts.append(r"(\d+(?:\.\d+)?)")
+        position = match.end()
+    parts.append(re.escape(number_format[position:]))
+
+    return re.compile(rf"^{''.join(parts)}\.(?:{'|'.join(EPISODE_EXTENSIONS)})(?P<rest>.*)$")
+
+
+class LibraryIndex:
+    """
+    Which episodes of a series are already in a directory.
+
+    The directory is only rescanned when its mtime changes, and the scan
+    result is kept in a manifest so the next run can skip scanning too.
+    File names that were seen before aren't matched again.
+
+    Numbers are episode numbers, ie. with the `offset` already taken off
+    the numbers in the file names.
+    """
+
+    directory: str
+    number_format: str
+    offset: float
+
+    _pattern: re.Pattern[str]
+    _store: JsonStore
+    _lock: threading.Lock
+    _mtime_ns: int | None
+    _names: dict[str, tuple[float, bool] | None]
+    _complete: set[float]
+    _partial: set[float]
+
+    def __init__(
+        self,
+        directory: str = ".",
+        *,
+        number_format: str = "%02d",
+        offset: float = 0,
+        store: JsonStore | None = None,
+    ) -> None:
+        self.directory = directory
+        self.number_format = number_format
+        self.offset = offset
+        self._pattern = number_format_regex(number_format)
+        self._store = store or JsonStore(
+            os.getenv("DOWNLOADERS_LIBRARY_MANIFEST", cache_path("library.json"))
+        )
+        self._lock = threading.Lock()
+        self._mtime_ns = None
+        self._names = {}
+        self._complete = set()
+        self._partial = set()
+
+    @property
+    def _manifest_key(self) -> str:
+        return f"{os.path.realpath(self.directory)}\0{self.number_format}"
+
+    def _parse_name(self, name: str) -> tuple[float, bool] | None:
+        """`(file number, is complete)` for episode files, otherwise `None`."""
+
+        # Checkpoints of native downloads (`.05.mp4.checkpoint.json`)
+        if name.startswith(".") and name.endswith(".checkpoint.json"):
+            parsed = self._parse_name(name[1 : -len(".checkpoint.json")])
+            return (parsed[0], False) if parsed else None
+
+        match = self._pattern.match(name)
+        if not match:
+            return None
+
+        rest = match.group("rest")
+        if not rest:
+            return (float(match.group(1)), True)
+        # `05.mp4.part`, `05.mp4.hls.part`, `05.mp4.ytdl`, ...
+        if rest.startswith("."):
+            return (float(match.group(1)), False)
+        return None
+
+    def _load_manifest(self, mtime_ns: int) -> bool:
+        try:
+            manifest = self._store.read().get(self._manifest_key)
+        except OSError:
+            return False
+
+        if not manifest or manifest.get("mtime_ns") != mtime_ns:
+            return False
+
+        self._complete = set(map(float, manifest.get("complete", [])))
+        self._partial = set(map(float, manifest.get("partial", [])))
+        return True
+
+    def _save_manifest(self, mtime_ns: int) -> None:
+        try:
+            with self._store.update() as data:
+                data[self._manifest_key] = {
+                    "mtime_ns": mtime_ns,
+                    "complete": sorted(self._complete),
+                    "partial": sorted(self._partial),
+                }
+        except OSError:
+            pass
+
+    def refresh(self) -> None:
+        with self._lock:
+            try:
+                mtime_ns = os.stat(self.directory).st_mtime_ns
+            except FileNotFoundError:
+                self._mtime_ns = None
+                self._complete, self._partial = set(), set()
+                return
+
+            if mtime_ns == self._mtime_ns:
+                return
+
+            if self._mtime_ns is None and self._load_manifest(mtime_ns):
+                self._mtime_ns = mtime_ns
+                return
+
+            complete: set[float] = set()
+            partial: set[float] = set()
+            names: dict[str, tuple[float, bool] | None] = {}
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name in self._names:
+                        parsed = self._names[entry.name]
+                    else:
+                        parsed = self._parse_name(entry.name)
+                    names[entry.name] = parsed
+
+                    if parsed is not None:
+                        (complete if parsed[1] else partial).add(parsed[0])
+
+            self._names = names
+            self._complete = complete
+            self._partial = partial - complete
+            self._mtime_ns = mtime_ns
+            self._save_manifest(mtime_ns)
+
+    def _episode_numbers(self, file_numbers: set[float]) -> set[float]:
+        return {n - self.offset for n in file_numbers if n > self.offset}
+
+    def downloaded(self) -> set[float]:
+        self.refresh()
+        return self._episode_numbers(self._complete)
+
+    def partial(self) -> set[float]:
+        """Episodes with an unfinished download lying around."""
+
+        self.refresh()
+        return self._episode_numbers(self._partial)
+
+    def latest(self) -> float:
+        return max(self.downloaded(), default=0)
+
+    def next_episode(self) -> float:
+        return self.latest() + 1
+
+    def missing(self) -> Iterator[tuple[float, bool]]:
+        """
+        Yields `(episode_number, open_ended)` for every episode that isn't
+        downloaded: the gaps up to the latest downloaded episode, then every
+        one after it.
+        """
+
+        downloaded = self.downloaded()
+        latest = int(max(downloaded, default=0))
+
+        for episode_number in range(1, latest + 1):
+            if float(episode_number) not in downloaded:
+                yield float(episode_number), False
+
+        episode_number = latest + 1
+        while True:
+            yield float(episode_number), True
+            episode_number += 1
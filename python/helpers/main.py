@@ -1,20 +1,49 @@
 import argparse
 import atexit
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
 import json
 import os
 import signal
 import sys
-from typing import Callable, Any
-
-from python.downloaders import sort_download_links
-from python.helpers.download import download_by_sites
+from typing import Callable, Any, Iterator
+
+from python.downloaders import (
+    DownloadInfo,
+    handler_domain,
+    has_handler,
+    sort_download_links,
+)
+from python.helpers.download import (
+    DOWNLOAD_ENGINE,
+    DOWNLOAD_ENGINES,
+    download_by_sites,
+    download_episode,
+    post_process,
+    resolve_ahead,
+)
+from python.helpers.download_info_cache import DefaultDownloadInfoCache
+from python.helpers.library import LibraryIndex
 from python.helpers.list import flatten
+from python.helpers.perf_store import RANKING, RANKINGS, DefaultPerfStore
+from python.helpers.series_cache import DefaultSeriesCache
 from python.log.console import Chalk, Console
+from python.log.events import (
+    DefaultEventBus,
+    DoneEvent,
+    ErrorEvent,
+    JsonLinesWriter,
+)
 
 
 ParseArgumentsExtend = Callable[[argparse.ArgumentParser], Any]
 
+# How many episodes of a batch get resolved while the current one downloads
+BATCH_RESOLVE_AHEAD = int(os.getenv("DOWNLOADERS_BATCH_RESOLVE_AHEAD", "1"))
+# How many downloaded episodes may wait for post-processing before downloads pause
+BATCH_POST_PROCESS_QUEUE = 2
+
 
 @dataclass
 class DownloadSite:
@@ -54,8 +83,8 @@ def parse_arguments(
 
     parser.add_argument(
         "-e, --episode",
-        help="Explicitly set which episode to download. Otherwise, latest non-downloaded episode is selected.",
-        type=float,
+        help="Explicitly set which episode(s) to download (eg. 5, 1-24 or 1,3,5-7). Otherwise, latest non-downloaded episode is selected.",
+        type=str,
         nargs="?",
         required=False,
         default=None,
@@ -80,6 +109,57 @@ def parse_arguments(
         dest="series_types",
     )
 
+    parser.add_argument(
+        "--all-missing",
+        help="Download every episode that isn't downloaded yet: the gaps first, then new episodes until one can't be found",
+        required=False,
+        dest="all_missing",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--hedge",
+        help="Start downloading from the N best sources at once and keep only the fastest one",
+        type=int,
+        required=False,
+        default=0,
+        dest="hedge",
+    )
+
+    parser.add_argument(
+        "--engine",
+        help="Which downloader to use. `native` downloads HLS streams and direct files itself, over several connections (falling back to yt-dlp when it can't). Defaults to: %(default)s",
+        choices=DOWNLOAD_ENGINES,
+        required=False,
+        default=DOWNLOAD_ENGINE,
+        dest="engine",
+    )
+
+    parser.add_argument(
+        "--ranking",
+        help="How to order the sources. `adaptive` tries the ones that have been finishing downloads the fastest first (and CDNs that keep failing last), `static` keeps the built-in order. Defaults to: %(default)s",
+        choices=RANKINGS,
+        required=False,
+        default=RANKING,
+        dest="ranking",
+    )
+
+    parser.add_argument(
+        "--refresh",
+        help="Ignore the cached series ids, episode lists and resolved download links and fetch them again",
+        required=False,
+        dest="refresh",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--json",
+        help="Report progress as JSON lines (one event per line) on stdout instead of drawing it. Everything else is written to stderr",
+        required=False,
+        dest="json",
+        action="store_true",
+    )
+
     parser.add_argument(
         "--dump-download-sites",
         help="Dump the list of download sites and exit",
@@ -94,15 +174,31 @@ def parse_arguments(
     return parser.parse_args()
 
 
-def get_episode_number_to_download(argv) -> float:
-    if argv.episode:
-        return argv.episode
+def parse_episode_numbers(spec: str) -> list[float]:
+    """Parses episode specs like `5`, `1-24` or `1,3,5-7`."""
+
+    episode_numbers: list[float] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+
+        start, separator, end = part.partition("-")
+        if separator and start and end:
+            episode_numbers.extend(
+                float(n) for n in range(int(float(start)), int(float(end)) + 1)
+            )
+        else:
+            episode_numbers.append(float(part))
+
+    return episode_numbers
 
-    last_episode_number = os.popen(
-        "ls | sort -h | grep -E '^[0-9]+\\.' | grep -Ev '\\.part$' | tail -n1 | cut -d'.' -f1"
-    ).read()
 
-    return float(last_episode_number or 0) + 1
+def get_episode_number_to_download(argv, library: LibraryIndex) -> float:
+    if argv.episode:
+        return parse_episode_numbers(argv.episode)[0] - library.offset
+
+    return library.next_episode()
 
 
 def parse_series_types(*, series_types: list[str], allowed: list[str] | set[str]):
@@ -127,12 +223,22 @@ def hide_cursor_until_exit():
 
     Console.hide_cursor()
     atexit.register(Console.show_cursor)
+    # Runs first, rows left behind by unfinished work mustn't outlive us
+    atexit.register(Console.clear_rows)
     # signal.signal(signal.SIGINT, handle_exit)
     signal.signal(signal.SIGTERM, handle_exit)
     signal.signal(signal.SIGHUP, handle_exit)
     signal.signal(signal.SIGQUIT, handle_exit)
 
 
+def report_json_lines():
+    DefaultEventBus.subscribe(JsonLinesWriter(sys.stdout))
+    # stdout is only for events now. Everything else printed or logged goes to
+    # stderr as plain text, only the status rows aren't drawn at all
+    sys.stdout = sys.stderr
+    Console.quiet = True
+
+
 @dataclass
 class DownloadSitesCtx:
     series_name: str
@@ -153,10 +259,13 @@ def downloader_main(
     with_additional_args: ParseArgumentsExtend | None = None,
     unwanted_cdn_hostnames: list[str] | set[str] = [],
 ):
-    hide_cursor_until_exit()
-
     argv = parse_arguments(site_name=site_name, extend=with_additional_args)
 
+    if argv.json:
+        report_json_lines()
+
+    hide_cursor_until_exit()
+
     series_name = argv.series_name or argv.series
     number_format = argv.number_format
     series_types = parse_series_types(
@@ -167,8 +276,112 @@ def downloader_main(
     if series_name is None:
         raise Exception("No series name")
 
+    DefaultSeriesCache.refresh = argv.refresh
+    DefaultDownloadInfoCache.refresh = argv.refresh
+    DefaultPerfStore.adaptive = argv.ranking == "adaptive"
+
     episode_number_offset = float(argv.offset)
-    episode_number = get_episode_number_to_download(argv) - episode_number_offset
+    library = LibraryIndex(
+        number_format=number_format,
+        offset=episode_number_offset,
+    )
+    episode_url = episode_page_url_fn(series_name)
+
+    def prepare_episode(file_number: float) -> PreparedEpisode | None:
+        episode_number = file_number - episode_number_offset
+        download_sites = download_sites_fn(
+            DownloadSitesCtx(
+                series_name=series_name,
+                episode_number=episode_number,
+                series_types=series_types,
+            )
+        )
+
+        if not download_sites:
+            return None
+
+        sites = {
+            f"{item.name} {item.type}": item.url
+            for item in sort_download_sites(download_sites, series_types)
+        }
+
+        output_file = f"{number_format % file_number}.mp4"
+        return PreparedEpisode(
+            episode_number=episode_number,
+            output_file=output_file,
+            download_sites=sites,
+            resolved_ahead=resolve_ahead(
+                sites=sites,
+                episode_url=episode_url,
+                output_file=output_file,
+            ),
+        )
+
+    if argv.all_missing or len(parse_episode_numbers(argv.episode or "")) > 1:
+        if argv.all_missing:
+            episodes = (
+                (episode_number + episode_number_offset, open_ended)
+                for episode_number, open_ended in library.missing()
+            )
+        else:
+            episodes = (
+                (file_number, False)
+                for file_number in parse_episode_numbers(argv.episode)
+            )
+
+        if argv.dump_download_sites:
+            for file_number, open_ended in episodes:
+                episode_number = file_number - episode_number_offset
+                try:
+                    download_sites = download_sites_fn(
+                        DownloadSitesCtx(
+                            series_name=series_name,
+                            episode_number=episode_number,
+                            series_types=series_types,
+                        )
+                    )
+                except EpisodeNumberNotFoundException:
+                    download_sites = None
+
+                if not download_sites and open_ended:
+                    break
+
+                Console.log(
+                    json.dumps(
+                        {
+                            "episode": episode_number,
+                            "download_sites": sort_download_sites(
+                                download_sites or [], series_types
+                            ),
+                        },
+                        default=lambda o: o.__dict__,
+                        indent=2,
+                    )
+                )
+            exit(0)
+
+        Console.log(
+            f"Downloading {Chalk.badge(series_name, Chalk.black, Chalk.bg_yellow_bright)} episodes {Chalk.badge(argv.episode or 'missing', Chalk.black, Chalk.bg_blue_bright)}"
+        )
+
+        failed = download_batch(
+            episodes=episodes,
+            prepare_episode=prepare_episode,
+            episode_url=episode_url,
+            unwanted_cdn_hostnames=unwanted_cdn_hostnames,
+            hedge=argv.hedge,
+            engine=argv.engine,
+        )
+
+        if failed:
+            Console.log_error(
+                f"Failed to download episodes {', '.join(map(format_episode_number, failed))}"
+            )
+            exit(1)
+        exit()
+
+    episode_number = get_episode_number_to_download(argv, library)
+    output_file = f"{number_format % (episode_number + episode_number_offset)}.mp4"
 
     offset_str = (
         f" (offset episode {episode_number + episode_number_offset})"
@@ -189,26 +402,30 @@ def downloader_main(
             )
         )
     except EpisodeNumberNotFoundException:
+        DefaultEventBus.emit(
+            ErrorEvent(
+                output_file=output_file,
+                episode=episode_number,
+                message="Episode can't be found",
+            )
+        )
         Console.log_error(f"Episode {episode_number}{offset_str} can't be found")
         exit(1)
 
     if not download_sites:
+        DefaultEventBus.emit(
+            ErrorEvent(
+                output_file=output_file,
+                episode=episode_number,
+                message="No download servers found",
+            )
+        )
         Console.log_error(
             f"Couldn't download {episode_number}: No download servers found"
         )
         exit(1)
 
-    sorted_download_site_urls = sort_download_links(
-        download_sites,
-        to_url=lambda x: x.url,
-    )
-    series_types_order = {t: i for i, t in enumerate(series_types)}
-    sorted_download_site_urls = list(
-        sorted(
-            sorted_download_site_urls,
-            key=lambda x: series_types_order.get(x.type, 9999),
-        )
-    )
+    sorted_download_site_urls = sort_download_sites(download_sites, series_types)
 
     if argv.dump_download_sites:
         Console.clear_line()
@@ -225,7 +442,181 @@ def downloader_main(
             f"{item.name} {item.type}": item.url for item in sorted_download_site_urls
         },
         episode_number=episode_number,
-        episode_url=episode_page_url_fn(series_name),
-        output_file=f"{number_format % (episode_number + episode_number_offset)}.mp4",
+        episode_url=episode_url,
+        output_file=output_file,
         unwanted_cdn_hostnames=unwanted_cdn_hostnames,
+        hedge=argv.hedge,
+        engine=argv.engine,
     )
+
+
+def sort_download_sites(
+    download_sites: list[DownloadSite],
+    series_types: list[str] | set[str],
+) -> list[DownloadSite]:
+    sorted_download_sites = sort_download_links(
+        download_sites,
+        to_url=lambda x: x.url,
+    )
+    if DefaultPerfStore.adaptive:
+        # Sources without a handler stay at the end either way
+        sorted_download_sites = DefaultPerfStore.rank(
+            [x for x in sorted_download_sites if has_handler(x.url)],
+            to_domain=lambda x: handler_domain(x.url),
+        ) + [x for x in sorted_download_sites if not has_handler(x.url)]
+    series_types_order = {t: i for i, t in enumerate(series_types)}
+    return list(
+        sorted(
+            sorted_download_sites,
+            key=lambda x: series_types_order.get(x.type, 9999),
+        )
+    )
+
+
+@dataclass
+class PreparedEpisode:
+    episode_number: float
+    output_file: str
+    download_sites: dict[str, str]
+    # Only the first source, the others are resolved when it's the episode's turn
+    resolved_ahead: dict[str, DownloadInfo | None]
+
+
+def format_episode_number(episode_number: float) -> str:
+    return f"{episode_number:g}"
+
+
+def download_batch(
+    *,
+    episodes: Iterator[tuple[float, bool]],
+    prepare_episode: Callable[[float], PreparedEpisode | None],
+    episode_url: str,
+    unwanted_cdn_hostnames: list[str] | set[str] = [],
+    hedge: int = 0,
+    engine: str = DOWNLOAD_ENGINE,
+) -> list[float]:
+    """
+    Download several episodes as a pipeline: while one episode downloads,
+    the next ones are already being resolved and the previous one is being
+    post-processed.
+
+    `episodes` yields `(file_number, open_ended)` pairs; an open ended
+    episode that can't be found stops the batch instead of failing it.
+    Returns the file numbers that failed.
+    """
+
+    failed: list[float] = []
+    resolving: deque[tuple[float, bool, Future[PreparedEpisode | None]]] = deque()
+    post_processing: deque[tuple[float, PreparedEpisode, Future[None]]] = deque()
+
+    resolver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="resolve")
+    post_processor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="post-process")
+
+    def resolve_episode(file_number: float) -> PreparedEpisode | None:
+        with Console.status_row():
+            return prepare_episode(file_number)
+
+    def finish_episode(episode: PreparedEpisode, download_info: DownloadInfo) -> None:
+        with Console.status_row():
+            post_process(download_info, episode.output_file)
+        DefaultEventBus.emit(
+            DoneEvent(output_file=episode.output_file, episode=episode.episode_number)
+        )
+        Console.log_success(
+            f"Episode {format_episode_number(episode.episode_number)} downloaded"
+        )
+
+    def episode_failed(
+        file_number: float,
+        message: str,
+        episode: PreparedEpisode | None = None,
+    ) -> None:
+        DefaultEventBus.emit(
+            ErrorEvent(
+                output_file=episode.output_file if episode else None,
+                episode=episode.episode_number if episode else None,
+                message=message,
+            )
+        )
+        Console.log_error(f"Episode {format_episode_number(file_number)}: {message}")
+        failed.append(file_number)
+
+    def collect_post_processed() -> None:
+        file_number, episode, future = post_processing.popleft()
+        try:
+            future.result()
+        except Exception as e:
+            episode_failed(file_number, f"Post-processing failed: {e}", episode)
+
+    try:
+        while True:
+            while len(resolving) <= BATCH_RESOLVE_AHEAD:
+                next_episode = next(episodes, None)
+                if next_episode is None:
+                    break
+                file_number, open_ended = next_episode
+                resolving.append(
+                    (
+                        file_number,
+                        open_ended,
+                        resolver.submit(resolve_episode, file_number),
+                    )
+                )
+
+            if not resolving:
+                break
+
+            file_number, open_ended, future = resolving.popleft()
+            try:
+                episode = future.result()
+            except EpisodeNumberNotFoundException:
+                episode = None
+            except Exception as e:
+                episode_failed(file_number, f"Couldn't get the download sites: {e}")
+                # Past the last downloaded episode there's no telling where
+                # the series ends, so don't keep guessing
+                if open_ended:
+                    break
+                continue
+
+            if episode is None:
+                if open_ended:
+                    break
+                episode_failed(file_number, "Can't be found")
+                continue
+
+            Console.log(
+                f"Downloading episode {Chalk.badge(format_episode_number(file_number), Chalk.black, Chalk.bg_blue_bright)}"
+            )
+
+            download_info = download_episode(
+                download_sites=episode.download_sites,
+                episode_url=episode_url,
+                output_file=episode.output_file,
+                unwanted_cdn_hostnames=unwanted_cdn_hostnames,
+                hedge=hedge,
+                engine=engine,
+                resolved_ahead=episode.resolved_ahead,
+            )
+
+            if download_info is None:
+                episode_failed(file_number, "All sources failed", episode)
+                continue
+
+            while len(post_processing) >= BATCH_POST_PROCESS_QUEUE:
+                collect_post_processed()
+            post_processing.append(
+                (
+                    file_number,
+                    episode,
+                    post_processor.submit(finish_episode, episode, download_info),
+                )
+            )
+
+        while post_processing:
+            collect_post_processed()
+    finally:
+        resolver.shutdown(wait=False, cancel_futures=True)
+        post_processor.shutdown(wait=True)
+
+    return failed
@@ -0,0 +1,208 @@
+import os
+import time
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Callable, Iterable, Self, TypeVar
+
+from python.helpers.json_store import JsonStore, cache_path
+
+T = TypeVar("T")
+
+# `static` keeps the handlers' own order, `adaptive` ranks sources by how
+# they've been doing
+RANKINGS = ("static", "adaptive")
+RANKING = os.getenv("DOWNLOADERS_RANKING", "adaptive")
+
+# Old results count half as much after this long, so hosts that were down
+# get another chance eventually
+PERF_HALF_LIFE_SECONDS = float(
+    os.getenv("DOWNLOADERS_PERF_HALF_LIFE_SECONDS", str(3 * 24 * 60 * 60))
+)
+# Weight of the newest sample in the running averages
+PERF_AVERAGE_WEIGHT = 0.3
+
+# Assumed for sources nothing is known about yet
+DEFAULT_RESOLVE_SECONDS = 10.0
+DEFAULT_BYTES_PER_SECOND = 2 * 1024 * 1024
+EXPECTED_DOWNLOAD_BYTES = 300 * 1024 * 1024
+
+# A CDN that failed more than this share of (decayed) downloads is only
+# tried after the others
+CDN_DEMOTE_FAILURE_RATE = 0.75
+CDN_DEMOTE_MIN_SAMPLES = 2.0
+
+
+@dataclass
+class PerfStats:
+    resolve_ok: float = 0.0
+    resolve_failed: float = 0.0
+    resolve_seconds: float | None = None
+    download_ok: float = 0.0
+    download_failed: float = 0.0
+    bytes_per_second: float | None = None
+    updated_at: float = 0.0
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any] | None) -> Self:
+        if not data:
+            return cls()
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in names})
+
+    def decayed(self, now: float) -> Self:
+        """The stats with the counts faded by how long ago they were updated."""
+
+        if self.updated_at <= 0:
+            return self
+
+        factor = 0.5 ** (max(0.0, now - self.updated_at) / PERF_HALF_LIFE_SECONDS)
+        return type(self)(
+            resolve_ok=self.resolve_ok * factor,
+            resolve_failed=self.resolve_failed * factor,
+            resolve_seconds=self.resolve_seconds,
+            download_ok=self.download_ok * factor,
+            download_failed=self.download_failed * factor,
+            bytes_per_second=self.bytes_per_second,
+            updated_at=now,
+        )
+
+    @property
+    def download_samples(self) -> float:
+        return self.download_ok + self.download_failed
+
+    @property
+    def download_failure_rate(self) -> float:
+        if self.download_samples <= 0:
+            return 0.0
+        return self.download_failed / self.download_samples
+
+    def expected_seconds(self) -> float:
+        """
+        Expected time until a finished download, counting failed attempts
+        (with a uniform prior, so unknown sources look average).
+        """
+
+        resolve_rate = (self.resolve_ok + 1) / (self.resolve_ok + self.resolve_failed + 2)
+        download_rate = (self.download_ok + 1) / (self.download_samples + 2)
+
+        resolve_seconds = (
+            DEFAULT_RESOLVE_SECONDS
+            if self.resolve_seconds is None
+            else self.resolve_seconds
+        )
+        bytes_per_second = self.bytes_per_second or DEFAULT_BYTES_PER_SECOND
+
+        return (resolve_seconds + EXPECTED_DOWNLOAD_BYTES / bytes_per_second) / (
+            resolve_rate * download_rate
+        )
+
+
+def _average(previous: float | None, sample: float) -> float:
+    if previous is None:
+        return sample
+    return previous + PERF_AVERAGE_WEIGHT * (sample - previous)
+
+
+def handler_key(domain: str) -> str:
+    return f"handler:{domain}"
+
+
+def cdn_key(hostname: str) -> str:
+    return f"cdn:{hostname}"
+
+
+class PerfStore:
+    """
+    On-disk record of how each handler (by domain) and each CDN (by
+    hostname) has performed: resolution time and success rate, download
+    success rate and throughput.
+    """
+
+    # Whether sources get ranked (and CDNs demoted) by their record at all
+    adaptive: bool
+
+    _store: JsonStore
+
+    def __init__(self, store: JsonStore) -> None:
+        self._store = store
+        self.adaptive = RANKING == "adaptive"
+
+    def _read(self) -> dict[str, Any]:
+        try:
+            return self._store.read()
+        except OSError:
+            return {}
+
+    def stats(self, key: str) -> PerfStats:
+        return PerfStats.from_json(self._read().get(key)).decayed(time.time())
+
+    def _update(self, keys: Iterable[str], fn: Callable[[PerfStats], None]) -> None:
+        now = time.time()
+        try:
+            with self._store.update() as data:
+                for key in keys:
+                    stats = PerfStats.from_json(data.get(key)).decayed(now)
+                    fn(stats)
+                    stats.updated_at = now
+                    data[key] = asdict(stats)
+        except OSError:
+            pass
+
+    def record_resolution(self, domain: str, seconds: float, ok: bool) -> None:
+        def update(stats: PerfStats) -> None:
+            if ok:
+                stats.resolve_ok += 1
+                stats.resolve_seconds = _average(stats.resolve_seconds, seconds)
+            else:
+                stats.resolve_failed += 1
+
+        self._update([handler_key(domain)], update)
+
+    def record_download(
+        self,
+        domain: str,
+        hostname: str,
+        *,
+        ok: bool,
+        bytes_per_second: float | None = None,
+    ) -> None:
+        def update(stats: PerfStats) -> None:
+            if ok:
+                stats.download_ok += 1
+                if bytes_per_second:
+                    stats.bytes_per_second = _average(
+                        stats.bytes_per_second, bytes_per_second
+                    )
+            else:
+                stats.download_failed += 1
+
+        self._update([handler_key(domain), cdn_key(hostname)], update)
+
+    def rank(self, items: list[T], *, to_domain: Callable[[T], str]) -> list[T]:
+        """
+        `items` ordered by the expected time until a finished download from
+        their handler. Ties keep their original order.
+        """
+
+        data = self._read()
+        now = time.time()
+        expected = {
+            domain: PerfStats.from_json(data.get(handler_key(domain)))
+            .decayed(now)
+            .expected_seconds()
+            for domain in {to_domain(item) for item in items}
+        }
+        return sorted(items, key=lambda item: expected[to_domain(item)])
+
+    def is_cdn_demoted(self, hostname: str) -> bool:
+        stats = self.stats(cdn_key(hostname))
+        return (
+            stats.download_samples >= CDN_DEMOTE_MIN_SAMPLES
+            and stats.download_failure_rate > CDN_DEMOTE_FAILURE_RATE
+        )
+
+
+DefaultPerfStore = PerfStore(
+    JsonStore(
+        os.getenv("DOWNLOADERS_PERF_STORE", cache_path("perf.json")),
+    )
+)
@@ -0,0 +1,234 @@
+import os
+import subprocess
+import tempfile
+from dataclasses import dataclass, field
+from fractions import Fraction
+from itertools import chain
+from typing import Any, Callable, Union
+
+from python.log.console import Console
+
+# Post-processors run on a finished download. They're referenced from
+# `DownloadInfo` by name, with JSON-serialisable arguments, so a resolved
+# download info can be stored and used again later.
+PostProcessor = Callable[[str, dict[str, Any]], None]
+
+
+@dataclass
+class Chapter:
+    timebase: Fraction
+    start: int
+    end: int
+    title: Union[str, None] = None
+
+    def __post_init__(self):
+        if self.start > self.end:
+            raise ValueError("Start must be less than end")
+
+        if self.start < 0:
+            raise ValueError("Start must be greater than 0")
+
+        if self.end < 0:
+            raise ValueError("End must be greater than 0")
+
+        if self.timebase > 1:
+            raise ValueError("Timebase must be a fraction less than 1")
+
+    def __str__(self) -> str:
+        parts = []
+        if self.timebase:
+            (num, den) = self.timebase.as_integer_ratio()
+            parts.append(f"TIMEBASE={num}/{den}")
+        if self.start:
+            parts.append(f"START={str(self.start)}")
+        if self.end:
+            parts.append(f"END={str(self.end)}")
+        if self.title:
+            parts.append(f"title={self.title}")
+
+        ret = "[CHAPTER]\n"
+        ret += "\n".join(map(lambda x: x.strip(), parts))
+        return ret.strip()
+
+
+@dataclass
+class Metadata:
+    title: Union[str, None] = None
+    chapters: list[Chapter] = field(default_factory=list)
+
+    def has_data(self) -> bool:
+        return self.title is not None or len(self.chapters) > 0
+
+    def __str__(self) -> str:
+        parts = []
+
+        if self.title:
+            parts.append(f"title={self.title}")
+
+        if self.chapters:
+            parts.extend(self.chapters)
+
+        ret = ";FFMETADATA1\n"
+        ret += "\n\n".join(map(lambda x: str(x).strip(), parts))
+        return ret.strip()
+
+
+def caption_tracks(tracks: list[dict[str, Any]]) -> list[dict[str, str]]:
+    """The subtitles out of a player's `tracks` list."""
+
+    return [
+        {
+            "lang": track["label"],
+            "url": track["file"],
+        }
+        for track in tracks
+        if "captions" == track.get("kind")
+    ]
+
+
+def intro_outro_chapters(intro: dict[str, Any], outro: dict[str, Any]) -> list[Chapter]:
+    timescale = 1000
+
+    intro_start = int(intro["start"]) * timescale
+    intro_end = int(intro["end"]) * timescale
+
+    outro_start = int(outro["start"]) * timescale
+    outro_end = int(outro["end"]) * timescale
+
+    if not (intro_start < intro_end and outro_start < outro_end):
+        return []
+
+    chapters = []
+    if intro_start > 0:
+        chapters.append(
+            Chapter(
+                title="Pre-intro",
+                start=0,
+                end=intro_start - 1,
+                timebase=Fraction(1, timescale),
+            )
+        )
+    chapters.append(
+        Chapter(
+            title="Intro",
+            start=intro_start,
+            end=intro_end - 1,
+            timebase=Fraction(1, timescale),
+        )
+    )
+    chapters.append(
+        Chapter(
+            title="Story",
+            start=intro_end,
+            end=outro_start - 1,
+            timebase=Fraction(1, timescale),
+        )
+    )
+    chapters.append(
+        Chapter(
+            title="Outro",
+            start=outro_start,
+            end=outro_end - 1,
+            timebase=Fraction(1, timescale),
+        )
+    )
+    return chapters
+
+
+def embed_tracks(output_file: str, meta: dict[str, Any]) -> None:
+    """
+    Remuxes `output_file` into an `.mkv` with the subtitles in
+    `meta["subtitles"]` (`[{"lang": ..., "url": ...}]`) and, when `meta` has
+    both an `intro` and an `outro`, chapters around them.
+    """
+
+    Console.log_dim("Download done. Embedding metadata...", return_line=True)
+
+    metadata = Metadata()
+    if meta.get("intro") and meta.get("outro"):
+        metadata.chapters.extend(intro_outro_chapters(meta["intro"], meta["outro"]))
+
+    subtitles: list[dict[str, str]] = meta.get("subtitles") or []
+
+    cleanup_files = []
+
+    cmd_inputs = [
+        (output_file, True),
+    ]
+
+    metadata_cmd = []
+    if metadata.has_data():
+        f = tempfile.NamedTemporaryFile(
+            prefix=f"{meta.get('name', 'download')}.",
+            suffix=".txt",
+            mode="w+",
+            encoding="utf-8",
+        )
+        f.write(str(metadata))
+        f.flush()
+        cleanup_files.append(f)
+        cmd_inputs.append((f.name, False))
+        metadata_cmd.extend(
+            [
+                "-map_metadata",
+                len(cmd_inputs) - 1,
+            ]
+        )
+
+    for sub in subtitles:
+        cmd_inputs.append((sub["url"], True))
+
+    cmd = [
+        "ffmpeg",
+        *list(chain(*[["-i", cmd_input] for (cmd_input, _should_map) in cmd_inputs])),
+        *list(
+            chain(
+                *[
+                    [
+                        "-map",
+                        str(i),
+                    ]
+                    for (i, (_cmd_input, should_map)) in enumerate(cmd_inputs)
+                    if should_map
+                ]
+            )
+        ),
+        *metadata_cmd,
+        "-c",
+        "copy",
+        *list(
+            chain(
+                *[
+                    [
+                        f"-metadata:s:s:{i}",
+                        f'language="{sub["lang"]}"',
+                    ]
+                    for i, sub in enumerate(subtitles)
+                ]
+            )
+        ),
+        os.path.splitext(output_file)[0] + ".mkv",
+    ]
+    cmd = list(map(str, cmd))
+    Console.log_dim("Embedding subtitles...", return_line=True)
+    with subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        bufsize=1,
+        text=True,
+    ) as proc:
+        res = proc.wait()
+
+        for f in cleanup_files:
+            f.close()
+
+        if res != 0:
+            return None
+
+    os.remove(output_file)
+
+
+POST_PROCESSORS: dict[str, PostProcessor] = {
+    "embed_tracks": embed_tracks,
+}
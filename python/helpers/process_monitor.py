@@ -0,0 +1,114 @@
+import codecs
+import os
+import selectors
+import subprocess
+import threading
+from collections import deque
+from typing import IO, Callable, Self
+
+# How much of a process's stderr is kept for error messages
+STDERR_TAIL_LINES = 200
+_READ_SIZE = 64 * 1024
+
+
+class LineBuffer:
+    """Splits a stream that arrives in arbitrary chunks into lines."""
+
+    _decoder: codecs.IncrementalDecoder
+    _partial: str
+
+    def __init__(self, encoding: str = "utf-8") -> None:
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._partial = ""
+
+    def feed(self, data: bytes) -> list[str]:
+        text = self._partial + self._decoder.decode(data)
+        # Progress bars redraw themselves with `\r`
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        *lines, self._partial = text.split("\n")
+        return lines
+
+    def close(self) -> list[str]:
+        rest = self._partial + self._decoder.decode(b"", final=True)
+        self._partial = ""
+        return [rest] if rest else []
+
+
+class ProcessMonitor:
+    """
+    Drains a process's stdout and stderr on one background thread, so
+    neither pipe can fill up and block the process.
+
+    Every stdout line is handed to `on_stdout` as soon as it's complete, the
+    last `STDERR_TAIL_LINES` lines of stderr are kept for `stderr()`.
+    """
+
+    _proc: subprocess.Popen
+    _on_stdout: Callable[[str], None]
+    _stderr: deque[str]
+    _lock: threading.Lock
+    _thread: threading.Thread | None
+
+    def __init__(
+        self,
+        proc: subprocess.Popen,
+        *,
+        on_stdout: Callable[[str], None],
+        stderr_lines: int = STDERR_TAIL_LINES,
+    ) -> None:
+        self._proc = proc
+        self._on_stdout = on_stdout
+        self._stderr = deque(maxlen=stderr_lines)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, *, name: str = "process monitor") -> Self:
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        return self
+
+    def _on_stderr(self, line: str) -> None:
+        if not line.strip():
+            return
+        with self._lock:
+            self._stderr.append(line)
+
+    def _run(self) -> None:
+        streams: list[tuple[IO[bytes] | None, Callable[[str], None]]] = [
+            (self._proc.stdout, self._on_stdout),
+            (self._proc.stderr, self._on_stderr),
+        ]
+
+        with selectors.DefaultSelector() as selector:
+            for stream, on_line in streams:
+                if stream is not None:
+                    selector.register(stream, selectors.EVENT_READ, (LineBuffer(), on_line))
+
+            while selector.get_map():
+                for key, _ in selector.select():
+                    buffer, on_line = key.data
+                    try:
+                        data = os.read(key.fd, _READ_SIZE)
+                    except OSError:
+                        data = b""
+
+                    if data:
+                        lines = buffer.feed(data)
+                    else:
+                        selector.unregister(key.fileobj)
+                        lines = buffer.close()
+
+                    for line in lines:
+                        try:
+                            on_line(line)
+                        except Exception:
+                            # A bad line shouldn't stop the pipes from being drained
+                            pass
+
+    def join(self, timeout: float | None = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stderr(self) -> str:
+        with self._lock:
+            return "\n  ".join(self._stderr)
@@ -3,6 +3,7 @@ from typing import Callable
 
 import requests
 
+from python.helpers import cancellation
 from python.log.console import Console
 
 
@@ -15,10 +16,15 @@ def retried_download(
     timeout_min_secs: float = 0.3,
     timeout_step_secs: float = 0.2,
     response_ok: Callable[[requests.Response], bool] = lambda x: x.ok,
+    on_forbidden: Callable[[], None] | None = None,
 ) -> requests.Response | None:
     response: requests.Response | None = None
     page_try = 0
     while not response:
+        # Nobody's waiting for the page anymore, eg. another source worked
+        if cancellation.is_cancelled():
+            return None
+
         page_try += 1
         Console.log_dim(f"Fetching {name}...", return_line=True)
         response = do_request()
@@ -28,6 +34,8 @@ def retried_download(
             return None
 
         if response.status_code == 403:
+            if on_forbidden:
+                on_forbidden()
             Console.log_dim(
                 f"Got 403 fetching {name}. Retrying... (Attempt {page_try})",
                 return_line=True,
@@ -0,0 +1,225 @@
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Callable, Iterable, Literal, Self
+from urllib.parse import urlparse
+
+from python.log.console import Console
+
+# Extra routes, so new mirror domains can be handled without touching the
+# code:
+#
+#   {
+#     "exact": {"k3x9w2qa.xyz": "filemoon.sx"},
+#     "suffix": {"filemoon.to": "filemoon.sx"},
+#     "pattern": {"vidplay\\d+\\.[a-z]+": "vidplay.xyz"}
+#   }
+#
+# `suffix` rules also match every subdomain, `pattern` rules are regular
+# expressions matched against the whole (normalised) host name.
+ROUTES_FILE = os.getenv(
+    "DOWNLOADERS_ROUTES",
+    os.path.join(
+        os.getenv("XDG_CONFIG_HOME", os.path.join(os.path.expanduser("~"), ".config")),
+        "downloaders",
+        "routes.json",
+    ),
+)
+
+RouteKind = Literal["exact", "suffix", "pattern"]
+ROUTE_KINDS: tuple[RouteKind, ...] = ("exact", "suffix", "pattern")
+
+
+@dataclass(frozen=True)
+class RouteRule:
+    kind: RouteKind
+    match: str
+    handler: str
+
+
+def normalize_host(url_or_host: str) -> str:
+    """Lowercased host name without credentials, port, `www.` or trailing dot."""
+
+    if "://" in url_or_host or url_or_host.startswith("//"):
+        host = urlparse(url_or_host).netloc
+    else:
+        host = url_or_host.split("/", 1)[0]
+
+    host = host.rpartition("@")[2].lower()
+    if host.startswith("["):
+        host = host[: host.find("]") + 1]
+    else:
+        host = host.split(":", 1)[0]
+
+    host = host.rstrip(".")
+    if host.startswith("www."):
+        host = host[len("www.") :]
+    return host
+
+
+def load_route_rules(path: str = ROUTES_FILE) -> list[RouteRule]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return []
+    except (OSError, json.JSONDecodeError) as e:
+        Console.log_error(f"Ignoring routes in {path}: {e}")
+        return []
+
+    if not isinstance(data, dict):
+        Console.log_error(f"Ignoring routes in {path}: expected an object")
+        return []
+
+    rules: list[RouteRule] = []
+    for kind in ROUTE_KINDS:
+        routes = data.get(kind) or {}
+        if not isinstance(routes, dict):
+            Console.log_error(f"Ignoring {kind} routes in {path}: expected an object")
+            continue
+        rules.extend(
+            RouteRule(kind=kind, match=str(match), handler=str(handler))
+            for match, handler in routes.items()
+        )
+    return rules
+
+
+class RoutingTable:
+    """
+    Maps URLs to handler names.
+
+    Exact rules are one dict lookup, suffix rules one lookup per label of
+    the host name, and pattern rules are compiled once and tried in order.
+    The answer for each host is remembered.
+
+    The rules are only loaded and compiled on first use, so a table built at
+    import time doesn't report bad rules before the arguments (eg. `--json`)
+    have been handled.
+    """
+
+    _handlers: list[str]
+    _priorities: dict[str, int]
+    _load_rules: Callable[[], Iterable[RouteRule]]
+    _exact: dict[str, str]
+    _suffix: dict[str, str]
+    _patterns: list[tuple[re.Pattern, str]]
+    _compiled: bool
+
+    _cache: dict[str, str | None]
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        handlers: Iterable[str],
+        rules: Callable[[], Iterable[RouteRule]],
+    ) -> None:
+        self._handlers = list(handlers)
+        self._priorities = {name: i for i, name in enumerate(self._handlers)}
+        self._load_rules = rules
+        self._exact = {}
+        self._suffix = {}
+        self._patterns = []
+        self._compiled = False
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _compile(self) -> None:
+        handler_names = set(self._handlers)
+        self._exact = {normalize_host(name): name for name in self._handlers}
+
+        for rule in self._load_rules():
+            # A rule may point at another rule's domain (eg. an alias of an alias)
+            handler = rule.handler
+            if handler not in handler_names:
+                handler = self._exact.get(normalize_host(handler), handler)
+
+            match rule.kind:
+                case "exact":
+                    self._exact.setdefault(normalize_host(rule.match), handler)
+                case "suffix":
+                    self._suffix.setdefault(
+                        normalize_host(rule.match.lstrip(".*")), handler
+                    )
+                case "pattern":
+                    # Compiled one by one, joined together a pattern's inline
+                    # flags (eg. `(?i)`) would break all the others
+                    try:
+                        self._patterns.append((re.compile(rule.match), handler))
+                    except re.error as e:
+                        Console.log_error(f"Ignoring route pattern {rule.match!r}: {e}")
+                case kind:
+                    Console.log_error(
+                        f"Ignoring route {rule.match!r} of unknown kind {kind!r}"
+                    )
+
+        self._compiled = True
+
+    @classmethod
+    def compile(
+        cls,
+        handlers: Iterable[str],
+        *,
+        aliases: dict[str, str] | None = None,
+        suffixes: dict[str, str] | None = None,
+        patterns: dict[str, str] | None = None,
+        extra_rules: Callable[[], Iterable[RouteRule]] = list,
+    ) -> Self:
+        handlers = list(handlers)
+        # Rules are applied first come, first served, so user rules win
+        builtin_rules = [
+            *(RouteRule("exact", k, v) for k, v in (aliases or {}).items()),
+            *(RouteRule("suffix", k, v) for k, v in (suffixes or {}).items()),
+            # Subdomains of handled domains (eg. `s2.filemoon.sx`)
+            *(RouteRule("suffix", name, name) for name in handlers),
+            *(RouteRule("pattern", k, v) for k, v in (patterns or {}).items()),
+        ]
+        return cls(handlers, lambda: [*extra_rules(), *builtin_rules])
+
+    def _route_host(self, host: str) -> str | None:
+        handler = self._exact.get(host)
+        if handler is not None:
+            return handler
+
+        labels = host.split(".")
+        for i in range(len(labels)):
+            handler = self._suffix.get(".".join(labels[i:]))
+            if handler is not None:
+                return handler
+
+        for pattern, handler in self._patterns:
+            if pattern.fullmatch(host) is not None:
+                return handler
+
+        return None
+
+    def route(self, url_or_host: str) -> str | None:
+        """The name of the handler for `url_or_host`, if there is one."""
+
+        if not self._compiled:
+            with self._lock:
+                if not self._compiled:
+                    self._compile()
+
+        host = normalize_host(url_or_host)
+        try:
+            return self._cache[host]
+        except KeyError:
+            pass
+
+        handler = self._route_host(host)
+        if handler not in self._priorities:
+            handler = None
+
+        with self._lock:
+            self._cache[host] = handler
+        return handler
+
+    def priority(self, url_or_host: str) -> int:
+        """Position of the URL's handler in the handler order, unhandled ones last."""
+
+        handler = self.route(url_or_host)
+        if handler is None:
+            return len(self._handlers) + 1
+        return self._priorities[handler]
@@ -0,0 +1,126 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from urllib.parse import urlparse
+
+import cloudscraper
+from requests.adapters import HTTPAdapter
+
+from python.helpers.cookie_vault import CookieVault, DefaultCookieVault
+
+POOL_MAX_SESSIONS = int(os.getenv("DOWNLOADERS_POOL_MAX_SESSIONS", "32"))
+POOL_CONNECTIONS_PER_HOST = int(os.getenv("DOWNLOADERS_POOL_CONNECTIONS", "16"))
+
+
+@dataclass
+class ScraperPoolStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+def host_of(url_or_host: str) -> str:
+    if "://" in url_or_host or url_or_host.startswith("//"):
+        return (urlparse(url_or_host).hostname or "").lower()
+    return url_or_host.split(":")[0].lower()
+
+
+class ScraperPool:
+    """
+    Process-wide registry of keep-alive scraper sessions, one per host (and
+    per set of `cloudscraper.create_scraper` options).
+
+    Reusing the session keeps the TLS connections and any solved Cloudflare
+    challenge around for the next request to the same host.
+    """
+
+    _sessions: OrderedDict[tuple[str, str], cloudscraper.CloudScraper]
+    _lock: threading.Lock
+    _stats: ScraperPoolStats
+
+    def __init__(
+        self,
+        *,
+        max_sessions: int = POOL_MAX_SESSIONS,
+        connections_per_host: int = POOL_CONNECTIONS_PER_HOST,
+        cookie_vault: CookieVault | None = DefaultCookieVault,
+    ) -> None:
+        self._max_sessions = max_sessions
+        self._cookie_vault = cookie_vault
+        self._connections_per_host = connections_per_host
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = ScraperPoolStats()
+
+        # Forked workers (eg. `multiprocessing.Pool`) must not share the
+        # parent's open sockets
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def get(self, url_or_host: str, **scraper_kwargs) -> cloudscraper.CloudScraper:
+        host = host_of(url_or_host)
+        key = (host, repr(sorted(scraper_kwargs.items())))
+
+        with self._lock:
+            scraper = self._sessions.get(key)
+            if scraper is not None:
+                self._sessions.move_to_end(key)
+                self._stats.hits += 1
+                return scraper
+
+            self._stats.misses += 1
+            scraper = self._create(host, **scraper_kwargs)
+            self._sessions[key] = scraper
+
+            while len(self._sessions) > self._max_sessions:
+                _, evicted = self._sessions.popitem(last=False)
+                self._stats.evictions += 1
+                evicted.close()
+
+            return scraper
+
+    def stats(self) -> ScraperPoolStats:
+        with self._lock:
+            return replace(self._stats)
+
+    def clear(self) -> None:
+        with self._lock:
+            for scraper in self._sessions.values():
+                scraper.close()
+            self._sessions.clear()
+
+    def _create(self, host: str, **scraper_kwargs) -> cloudscraper.CloudScraper:
+        scraper = cloudscraper.create_scraper(**scraper_kwargs)
+
+        # Keep cloudscraper's own TLS adapter, only bound its connection pool
+        https_adapter = scraper.get_adapter("https://")
+        if isinstance(https_adapter, HTTPAdapter):
+            https_adapter.init_poolmanager(
+                1,
+                self._connections_per_host,
+                block=False,
+            )
+        scraper.mount(
+            "http://",
+            HTTPAdapter(pool_connections=1, pool_maxsize=self._connections_per_host),
+        )
+
+        if self._cookie_vault is not None:
+            try:
+                self._cookie_vault.attach(scraper, host)
+            except OSError:
+                pass
+
+        return scraper
+
+    def _reset_after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._stats = ScraperPoolStats()
+
+
+DefaultScraperPool = ScraperPool()
+
+
+def get_scraper(url_or_host: str, **scraper_kwargs) -> cloudscraper.CloudScraper:
+    return DefaultScraperPool.get(url_or_host, **scraper_kwargs)
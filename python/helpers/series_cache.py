@@ -0,0 +1,149 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Generic, Self, TypeVar
+
+import requests
+
+from python.helpers.json_store import JsonStore, cache_path
+
+T = TypeVar("T")
+
+# How long a series' episode list is used without asking the site again
+EPISODE_LIST_TTL_SECONDS = float(
+    os.getenv("DOWNLOADERS_EPISODE_LIST_TTL_SECONDS", str(60 * 60))
+)
+# Series ids practically never change
+SERIES_ID_TTL_SECONDS = float(
+    os.getenv("DOWNLOADERS_SERIES_ID_TTL_SECONDS", str(30 * 24 * 60 * 60))
+)
+# Entries that haven't been refreshed in this long get dropped from the file
+SERIES_CACHE_MAX_AGE_SECONDS = 90 * 24 * 60 * 60
+
+
+class NotModifiedException(Exception):
+    """Raised by a fetch function when the site answered `304 Not Modified`."""
+
+
+@dataclass
+class Fetched(Generic[T]):
+    value: T
+    etag: str | None = None
+    last_modified: str | None = None
+
+    @classmethod
+    def from_response(cls, value: T, response: requests.Response) -> Self:
+        return cls(
+            value=value,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+
+
+def raise_for_not_modified(response: requests.Response) -> None:
+    if response.status_code == 304:
+        raise NotModifiedException()
+
+
+class SeriesCache:
+    """
+    On-disk cache of per-series lookups (ids, episode lists) shared by all
+    the site scripts.
+
+    Fetch functions get the conditional request headers to send
+    (`If-None-Match`/`If-Modified-Since`) and either return a `Fetched`
+    value or raise `NotModifiedException`. Falsy values are never cached.
+    """
+
+    # Ignore what's stored (once per key and run) and fetch everything again
+    refresh: bool
+
+    _store: JsonStore
+    _refreshed: set[str]
+
+    def __init__(self, store: JsonStore) -> None:
+        self._store = store
+        self._refreshed = set()
+        self.refresh = False
+
+    def get(
+        self,
+        key: str,
+        fetch: Callable[[dict[str, str]], Fetched[Any]],
+        *,
+        ttl: float,
+        revalidate: bool = False,
+        encode: Callable[[Any], Any] = lambda x: x,
+        decode: Callable[[Any], Any] = lambda x: x,
+        merge: Callable[[Any, Any], Any] | None = None,
+    ) -> Any:
+        """
+        Returns the cached value for `key` while it's younger than `ttl`,
+        otherwise (or when `revalidate` is set) asks `fetch` for a newer one.
+
+        With `merge`, a fetched value only adds to the cached one
+        (`merge(cached, fetched)`) instead of replacing it.
+        """
+
+        if self.refresh and key not in self._refreshed:
+            self._refreshed.add(key)
+            entry = None
+        else:
+            entry = self._store.read().get(key)
+
+        if entry is not None and not revalidate:
+            if time.time() - float(entry.get("fetched_at", 0)) < ttl:
+                return decode(entry["value"])
+
+        headers: dict[str, str] = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            fetched = fetch(headers)
+        except NotModifiedException:
+            if entry is None:
+                raise
+            self._save(key, {**entry, "fetched_at": time.time()})
+            return decode(entry["value"])
+
+        value = fetched.value
+        if merge is not None and entry is not None:
+            value = merge(decode(entry["value"]), value)
+
+        if value:
+            self._save(
+                key,
+                {
+                    "value": encode(value),
+                    "fetched_at": time.time(),
+                    "etag": fetched.etag,
+                    "last_modified": fetched.last_modified,
+                },
+            )
+
+        return value
+
+    def _save(self, key: str, entry: dict[str, Any]) -> None:
+        now = time.time()
+        try:
+            with self._store.update() as data:
+                for stale_key in [
+                    k
+                    for k, v in data.items()
+                    if now - float(v.get("fetched_at", 0)) > SERIES_CACHE_MAX_AGE_SECONDS
+                ]:
+                    del data[stale_key]
+                data[key] = entry
+        except OSError:
+            pass
+
+
+DefaultSeriesCache = SeriesCache(
+    JsonStore(
+        os.getenv("DOWNLOADERS_SERIES_CACHE", cache_path("series.json")),
+    )
+)
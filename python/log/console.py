@@ -1,6 +1,10 @@
 import sys
+import threading
+from contextlib import contextmanager
 from typing import Generator, Iterable, List, Tuple, TypeVar, Union
 
+from python.log.renderer import DefaultRenderer, strip_escapes
+
 T = TypeVar("T")
 
 
@@ -40,10 +44,21 @@ class Chalk:
 
 
 class Console:
+    # Don't draw status rows and write everything else to stderr as plain
+    # text (eg. when progress is reported as JSON on stdout instead)
+    quiet = False
+
     @staticmethod
     def write(*text):
         out = "".join(text)
-        sys.stdout.write(out)
+        if not Console.quiet:
+            DefaultRenderer.write(out)
+            return out
+
+        plain = strip_escapes(out)
+        if plain:
+            sys.stderr.write(plain)
+            sys.stderr.flush()
         return out
 
     @staticmethod
@@ -64,6 +79,10 @@ class Console:
 
     @staticmethod
     def log(*text: str):
+        # Takes the place of the thread's status row, like it would've
+        # overwritten the returned line
+        if not Console.quiet:
+            DefaultRenderer.remove_row(threading.get_ident())
         return Console.write(
             Console._clear_line(),
             *text,
@@ -72,11 +91,31 @@ class Console:
 
     @staticmethod
     def log_and_return(text: str):
-        lines = str(text).split("\n")
-        lines_written = len(lines)
-        for line in lines:
-            Console.log(line)
-        Console.move_up(lines_written)
+        """Shows `text` as the calling thread's status row until it logs something else."""
+
+        text = str(text)
+        if not Console.quiet:
+            DefaultRenderer.set_row(threading.get_ident(), text)
+        return text
+
+    @staticmethod
+    @contextmanager
+    def status_row() -> Generator[None, None, None]:
+        """
+        Removes the calling thread's status row once the block ends, for
+        tasks on long-lived threads that don't log anything when done.
+        """
+
+        try:
+            yield
+        finally:
+            if not Console.quiet:
+                DefaultRenderer.remove_row(threading.get_ident())
+
+    @staticmethod
+    def clear_rows():
+        if not Console.quiet:
+            DefaultRenderer.clear()
 
     @staticmethod
     def dim(text: str):
@@ -0,0 +1,147 @@
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from enum import StrEnum, auto
+from typing import IO, Any, Callable, ClassVar
+
+
+class DownloadByInfoEvent(StrEnum):
+    RESOLVING = auto()
+    RESOLVED = auto()
+    WAITING_FOR_PROGRESS = auto()
+    DOWNLOAD_PROGRESS = auto()
+    POST_PROCESSING = auto()
+    DONE = auto()
+    ERROR = auto()
+
+
+@dataclass(kw_only=True)
+class DownloadEvent:
+    type: ClassVar[DownloadByInfoEvent]
+
+    # The file the episode is downloaded into, which tells concurrent
+    # downloads apart
+    output_file: str | None = None
+    at: float = field(default_factory=time.time)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {"event": str(self.type), **asdict(self)}
+
+
+@dataclass(kw_only=True)
+class ResolvingEvent(DownloadEvent):
+    type = DownloadByInfoEvent.RESOLVING
+
+    site: str
+    url: str
+
+
+@dataclass(kw_only=True)
+class ResolvedEvent(DownloadEvent):
+    type = DownloadByInfoEvent.RESOLVED
+
+    site: str
+    url: str
+    # `None` when the source couldn't be resolved
+    download_url: str | None
+    cached: bool = False
+    seconds: float = 0.0
+
+
+@dataclass(kw_only=True)
+class WaitingForProgressEvent(DownloadEvent):
+    type = DownloadByInfoEvent.WAITING_FOR_PROGRESS
+
+    site: str | None = None
+    download_url: str
+
+
+@dataclass(kw_only=True)
+class DownloadProgressEvent(DownloadEvent):
+    type = DownloadByInfoEvent.DOWNLOAD_PROGRESS
+
+    site: str | None = None
+    bytes: int | None
+    bytes_per_second: float
+    speed: str | None
+    out_time: str | None
+
+
+@dataclass(kw_only=True)
+class PostProcessingEvent(DownloadEvent):
+    type = DownloadByInfoEvent.POST_PROCESSING
+
+    post_processor: str | None
+
+
+@dataclass(kw_only=True)
+class DoneEvent(DownloadEvent):
+    type = DownloadByInfoEvent.DONE
+
+    episode: float | None = None
+
+
+@dataclass(kw_only=True)
+class ErrorEvent(DownloadEvent):
+    type = DownloadByInfoEvent.ERROR
+
+    message: str
+    site: str | None = None
+    episode: float | None = None
+    # Whether the next source gets tried, or the episode has failed
+    recoverable: bool = False
+
+
+Subscriber = Callable[[DownloadEvent], None]
+
+
+class EventBus:
+    """Hands every emitted event to all subscribers, from any thread."""
+
+    _subscribers: list[Subscriber]
+    _lock: threading.Lock
+
+    def __init__(self) -> None:
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, subscriber: Subscriber) -> Callable[[], None]:
+        """Returns a function that unsubscribes again."""
+
+        with self._lock:
+            self._subscribers = [*self._subscribers, subscriber]
+
+        def unsubscribe() -> None:
+            with self._lock:
+                self._subscribers = [s for s in self._subscribers if s is not subscriber]
+
+        return unsubscribe
+
+    def emit(self, event: DownloadEvent) -> None:
+        for subscriber in self._subscribers:
+            try:
+                subscriber(event)
+            except Exception:
+                # Reporting must never break a download
+                pass
+
+
+class JsonLinesWriter:
+    """Writes events to `stream` as one JSON object per line."""
+
+    _stream: IO[str]
+    _lock: threading.Lock
+
+    def __init__(self, stream: IO[str]) -> None:
+        self._stream = stream
+        self._lock = threading.Lock()
+
+    def __call__(self, event: DownloadEvent) -> None:
+        line = json.dumps(event.as_dict(), default=str)
+        with self._lock:
+            self._stream.write(line + "\n")
+            self._stream.flush()
+
+
+DefaultEventBus = EventBus()
@@ -0,0 +1,184 @@
+import os
+import re
+import sys
+import threading
+import time
+from typing import IO, Hashable
+
+# Status rows are redrawn at most this many times a second, however often
+# they change
+RENDER_FPS = float(os.getenv("DOWNLOADERS_RENDER_FPS", "10"))
+# When not writing to a terminal, status rows are printed as plain lines, at
+# most once per row this often
+PLAIN_ROW_INTERVAL_SECONDS = float(
+    os.getenv("DOWNLOADERS_PLAIN_ROW_INTERVAL_SECONDS", "10")
+)
+
+_ESCAPE_REGEX = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+
+
+def strip_escapes(text: str) -> str:
+    return _ESCAPE_REGEX.sub("", text).replace("\r\n", "\n").replace("\r", "")
+
+
+class Renderer:
+    """
+    Keeps a block of status rows (one per key, eg. one per download) below
+    the regular output and redraws it in frames, at most `fps` times a
+    second, so rapid updates only cost a dict write each.
+
+    Regular output goes through `write`, which clears the rows first; they
+    come back with the next frame. When the stream isn't a terminal, escape
+    codes are dropped and rows are printed as plain lines now and then.
+    """
+
+    _stream: IO[str] | None
+    _is_tty: bool | None
+    _frame_seconds: float
+
+    _rows: dict[Hashable, str]
+    _drawn_lines: int
+    _dirty: bool
+    _printed_rows: dict[Hashable, tuple[float, str]]
+
+    _lock: threading.RLock
+    _wake: threading.Event
+    _thread: threading.Thread | None
+
+    def __init__(
+        self,
+        stream: IO[str] | None = None,
+        *,
+        fps: float = RENDER_FPS,
+        is_tty: bool | None = None,
+    ) -> None:
+        self._stream = stream
+        self._is_tty = is_tty
+        self._frame_seconds = 1 / max(fps, 0.1)
+        self._rows = {}
+        self._drawn_lines = 0
+        self._dirty = False
+        self._printed_rows = {}
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def stream(self) -> IO[str]:
+        # Looked up every time, `sys.stdout` may be swapped out (see `--json`)
+        return self._stream or sys.stdout
+
+    @property
+    def is_tty(self) -> bool:
+        if self._is_tty is None:
+            try:
+                self._is_tty = self.stream.isatty()
+            except (AttributeError, ValueError):
+                self._is_tty = False
+        return self._is_tty
+
+    def _erase(self) -> str:
+        if not self._drawn_lines:
+            return ""
+        lines, self._drawn_lines = self._drawn_lines, 0
+        # To the start of the first row and clear everything below
+        return f"\x1b[{lines}F\x1b[J"
+
+    def write(self, text: str) -> None:
+        with self._lock:
+            if not self.is_tty:
+                text = strip_escapes(text)
+                if text:
+                    self.stream.write(text)
+                    self.stream.flush()
+                return
+
+            self.stream.write(self._erase() + text)
+            self.stream.flush()
+            if self._rows:
+                self._schedule()
+
+    def set_row(self, key: Hashable, text: str) -> None:
+        with self._lock:
+            if not self.is_tty:
+                self._print_row(key, text)
+                return
+
+            if self._rows.get(key) == text:
+                return
+            self._rows[key] = text
+            self._schedule()
+
+    def remove_row(self, key: Hashable) -> None:
+        with self._lock:
+            self._printed_rows.pop(key, None)
+            if self._rows.pop(key, None) is not None:
+                self._schedule()
+
+    def clear(self) -> None:
+        """Removes all rows and erases the drawn ones right away."""
+
+        with self._lock:
+            self._rows.clear()
+            self._printed_rows.clear()
+            self._dirty = False
+            erase = self._erase()
+            if erase:
+                self.stream.write(erase)
+                self.stream.flush()
+
+    def _print_row(self, key: Hashable, text: str) -> None:
+        text = strip_escapes(text).strip()
+        now = time.monotonic()
+        printed_at, printed = self._printed_rows.get(key, (None, None))
+        if text == printed or (
+            printed_at is not None and now - printed_at < PLAIN_ROW_INTERVAL_SECONDS
+        ):
+            return
+
+        self._printed_rows[key] = (now, text)
+        self.stream.write(text + "\n")
+        self.stream.flush()
+
+    def _schedule(self) -> None:
+        self._dirty = True
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run,
+                name="renderer",
+                daemon=True,
+            )
+            self._thread.start()
+        self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            self.render()
+            # Anything that changes in the meantime waits for the next frame
+            time.sleep(self._frame_seconds)
+
+    def render(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+
+            lines = [
+                line for row in self._rows.values() for line in row.split("\n")
+            ]
+            frame = self._erase()
+            if lines:
+                # Without line wrapping every row takes exactly one line, so
+                # the next frame knows how far up to go
+                frame += "\x1b[?7l"
+                frame += "".join(f"\x1b[K{line}\n" for line in lines)
+                frame += "\x1b[?7h"
+            self._drawn_lines = len(lines)
+
+            self.stream.write(frame)
+            self.stream.flush()
+
+
+DefaultRenderer = Renderer()
@@ -1,5 +1,16 @@
+import os
+
+from .node import DefaultNodeWorker
 from .runner import get_runtimes_for, run_code
 
+# `remote` sends snippets to the Piston endpoint, `local` runs them in a
+# long-lived local node process and `auto` prefers local when node is
+# installed. Whatever fails locally is retried remotely.
+#
+# Snippets interpolate scraped page JS, so remote stays the default: the local
+# worker is locked down (see `js_worker.js`), but it still runs on this machine
+JS_RUNNER = os.getenv("DOWNLOADERS_JS_RUNNER", "remote")
+
 
 def run_js(payload: str, *, files: list[dict[str, str]] | None = None) -> str | None:
     res = run_js_full(payload, files=files)
@@ -10,6 +21,20 @@ def run_js(payload: str, *, files: list[dict[str, str]] | None = None) -> str |
 
 def run_js_full(
     payload: str, *, files: list[dict[str, str]] | None = None
+) -> dict | None:
+    if JS_RUNNER == "local" or (JS_RUNNER == "auto" and DefaultNodeWorker.available):
+        try:
+            res = DefaultNodeWorker.run(payload, files=files)
+            if res["code"] == 0:
+                return res
+        except Exception:
+            pass
+
+    return run_js_remote(payload, files=files)
+
+
+def run_js_remote(
+    payload: str, *, files: list[dict[str, str]] | None = None
 ) -> dict | None:
     language = "js"
     runtime = next(
@@ -0,0 +1,234 @@
+// Long-lived JS runner used by `python/runners/node.py`.
+//
+// Reads one JSON request per line from stdin:
+//   {"id": 1, "code": "...", "files": [{"name": "crypto.js", "content": "..."}], "timeout": 10000}
+// and answers each with one JSON line on stdout, shaped like Piston's `run`:
+//   {"id": 1, "stdout": "...", "stderr": "...", "output": "...", "code": 0, "signal": null}
+//
+// Snippets are built from scraped pages, so they're treated as hostile. Every
+// request runs in a fresh `vm` context created from a null-prototype object,
+// and nothing from this realm is handed to it: `console`, `process`, `require`
+// and friends are defined by `BOOTSTRAP` inside the context and only strings
+// come back out. `vm` alone isn't a sandbox, so `node.py` also starts this
+// worker under node's permission model, without an environment.
+//
+// `require("./name")` resolves to the request's files or to the preloaded
+// libraries (eg. crypto-js). Libraries are compiled once per worker but
+// evaluated inside each request's context, and only when the snippet
+// mentions them.
+
+"use strict";
+
+const crypto = require("crypto");
+const fs = require("fs");
+const path = require("path");
+const readline = require("readline");
+const vm = require("vm");
+
+const BOOTSTRAP = `
+(() => {
+  "use strict";
+  // Kept from before the snippet runs, which may replace the globals
+  const stringify = JSON.stringify;
+  const toString = String;
+  const output = [];
+  const modules = Object.create(null);
+
+  const format = (args) => args.map((arg) => {
+    if (typeof arg === "string") return arg;
+    try {
+      const json = JSON.stringify(arg);
+      return json === undefined ? String(arg) : json;
+    } catch (e) {
+      return String(arg);
+    }
+  }).join(" ");
+  const write = (stream) => (chunk) => {
+    output.push([stream, String(chunk)]);
+    return true;
+  };
+  const stdout = write("stdout");
+  const stderr = write("stderr");
+
+  const base64 = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/";
+  globalThis.btoa = (text) => {
+    text = String(text);
+    let out = "";
+    for (let i = 0; i < text.length; i += 3) {
+      const bytes = [0, 1, 2].map((j) => text.charCodeAt(i + j));
+      if (bytes.some((byte) => byte > 255)) throw new Error("btoa: invalid character");
+      const [a, b, c] = bytes;
+      out += base64[a >> 2] + base64[((a & 3) << 4) | ((b || 0) >> 4)];
+      out += Number.isNaN(b) ? "=" : base64[((b & 15) << 2) | ((c || 0) >> 6)];
+      out += Number.isNaN(c) ? "=" : base64[c & 63];
+    }
+    return out;
+  };
+  globalThis.atob = (text) => {
+    text = String(text).replace(/[\\s=]+/g, "");
+    let out = "";
+    let bits = 0;
+    let value = 0;
+    for (const char of text) {
+      const index = base64.indexOf(char);
+      if (index < 0) throw new Error("atob: invalid character");
+      value = (value << 6) | index;
+      bits += 6;
+      if (bits >= 8) {
+        bits -= 8;
+        out += String.fromCharCode((value >> bits) & 255);
+      }
+    }
+    return out;
+  };
+
+  globalThis.console = {
+    log: (...args) => stdout(format(args) + "\\n"),
+    info: (...args) => stdout(format(args) + "\\n"),
+    warn: (...args) => stderr(format(args) + "\\n"),
+    error: (...args) => stderr(format(args) + "\\n"),
+  };
+  globalThis.process = {
+    stdout: { write: stdout },
+    stderr: { write: stderr },
+    env: {},
+    argv: ["node", "file0.code"],
+  };
+
+  const moduleName = (name) => String(name).split("/").pop().replace(/\\.js$/, "");
+  globalThis.require = (name) => {
+    const module = modules[moduleName(name)];
+    if (!module) throw new Error("Cannot find module '" + name + "'");
+    return module.exports;
+  };
+
+  return {
+    define: (name, factory) => {
+      const module = { exports: {} };
+      factory(module, module.exports, globalThis.require);
+      modules[moduleName(name)] = module;
+    },
+    describe: (error) => {
+      try {
+        return toString(error && error.stack ? error.stack : error);
+      } catch (e) {
+        return "Error";
+      }
+    },
+    collect: () => stringify(output),
+  };
+})()
+`;
+
+const bootstrap = new vm.Script(BOOTSTRAP, { filename: "bootstrap.js" });
+const libraries = new Map();
+
+function moduleName(name) {
+  return path.basename(String(name)).replace(/\.js$/, "");
+}
+
+function compileLibrary(name, content) {
+  const key = crypto.createHash("sha1").update(content).digest("hex");
+  if (!libraries.has(key)) {
+    libraries.set(
+      key,
+      new vm.Script(`(function (module, exports, require) {\n${content}\n})`, {
+        filename: name,
+      }),
+    );
+  }
+  return libraries.get(key);
+}
+
+const preloaded = new Map([
+  [
+    "crypto-js",
+    compileLibrary(
+      "crypto-js",
+      fs.readFileSync(
+        path.join(__dirname, "libraries", "js", "crypto-js.min.js"),
+        "utf8",
+      ),
+    ),
+  ],
+]);
+
+function run({ code, files, timeout }) {
+  const context = vm.createContext(Object.create(null), {
+    microtaskMode: "afterEvaluate",
+  });
+  const sandbox = bootstrap.runInContext(context);
+
+  let exitCode = 0;
+  let error = null;
+  try {
+    for (const file of files || []) {
+      const content = file.encoding === "base64"
+        ? Buffer.from(String(file.content), "base64").toString("utf8")
+        : String(file.content);
+      const name = String(file.name || "");
+      sandbox.define(moduleName(name), compileLibrary(name, content).runInContext(context));
+    }
+    for (const [name, script] of preloaded) {
+      if (code.includes(name)) sandbox.define(name, script.runInContext(context));
+    }
+
+    vm.runInContext(code, context, { filename: "file0.code", timeout });
+  } catch (e) {
+    exitCode = 1;
+    // Errors thrown by the snippet belong to its realm, they're only turned
+    // into text over there
+    error = e instanceof Error ? e.stack : sandbox.describe(e);
+  }
+  const collected = sandbox.collect();
+  if (typeof collected !== "string" || (error !== null && typeof error !== "string")) {
+    throw new Error("Snippet tampered with its output");
+  }
+
+  let stdout = "";
+  let stderr = "";
+  let output = "";
+  for (const [stream, text] of JSON.parse(collected)) {
+    if (stream === "stdout") stdout += text;
+    else stderr += text;
+    output += text;
+  }
+  if (error !== null) {
+    stderr += `${error}\n`;
+    output += `${error}\n`;
+  }
+
+  return { stdout, stderr, output, code: exitCode, signal: null };
+}
+
+const input = readline.createInterface({ input: process.stdin, terminal: false });
+
+input.on("line", (line) => {
+  if (!line.trim()) return;
+
+  let request;
+  try {
+    request = JSON.parse(line);
+  } catch (e) {
+    return;
+  }
+
+  let response;
+  try {
+    response = run({
+      code: String(request.code || ""),
+      files: request.files,
+      timeout: Number(request.timeout) || 10000,
+    });
+  } catch (e) {
+    // Eg. a snippet that tampered with its output
+    response = { stdout: "", stderr: "", output: "", code: 1, signal: null };
+  }
+  process.stdout.write(JSON.stringify({ id: request.id, ...response }) + "\n");
+});
+
+// Rejections left behind by a snippet (eg. a refused `import()`) mustn't
+// take the worker down with them
+process.on("unhandledRejection", () => {});
+
+input.on("close", () => process.exit(0));
@@ -0,0 +1,130 @@
+import atexit
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import threading
+
+NODE_BINARY = os.getenv("DOWNLOADERS_NODE_BINARY", "node")
+NODE_RUN_TIMEOUT_SECONDS = float(os.getenv("DOWNLOADERS_NODE_RUN_TIMEOUT_SECONDS", "10"))
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(__file__), "js_worker.js")
+
+
+class NodeWorker:
+    """
+    A long-lived local `node` process that runs JS snippets one at a time,
+    answering with the same shape as Piston's `run` result.
+
+    Started on first use and restarted if it dies.
+    """
+
+    _binary: str
+    _proc: subprocess.Popen | None
+    _lock: threading.Lock
+    _ids: itertools.count
+
+    def __init__(self, binary: str = NODE_BINARY) -> None:
+        self._binary = binary
+        self._proc = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+        atexit.register(self.close)
+
+    @property
+    def available(self) -> bool:
+        return shutil.which(self._binary) is not None
+
+    def _reset_after_fork(self) -> None:
+        # The pipes belong to the parent
+        self._proc = None
+        self._lock = threading.Lock()
+
+    def _start(self) -> subprocess.Popen:
+        if self._proc is None or self._proc.poll() is not None:
+            # Snippets come from scraped pages: the worker gets no
+            # environment and, through node's permission model, can only
+            # read its own directory (no writes, child processes or workers)
+            self._proc = subprocess.Popen(
+                [
+                    shutil.which(self._binary) or self._binary,
+                    "--experimental-permission",
+                    f"--allow-fs-read={os.path.dirname(WORKER_SCRIPT)}",
+                    WORKER_SCRIPT,
+                ],
+                env={},
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                bufsize=1,
+                text=True,
+                encoding="utf-8",
+            )
+        return self._proc
+
+    def run(
+        self,
+        code: str,
+        *,
+        files: list[dict[str, str]] | None = None,
+        timeout: float = NODE_RUN_TIMEOUT_SECONDS,
+    ) -> dict:
+        request_id = next(self._ids)
+        request = json.dumps(
+            {
+                "id": request_id,
+                "code": code,
+                "files": files or [],
+                "timeout": int(timeout * 1000),
+            }
+        )
+
+        with self._lock:
+            # A second try in case the previous worker died in the meantime
+            for _ in range(2):
+                proc = self._start()
+                assert proc.stdin is not None and proc.stdout is not None
+
+                try:
+                    proc.stdin.write(request + "\n")
+                    proc.stdin.flush()
+                    line = proc.stdout.readline()
+                except OSError:
+                    line = ""
+
+                if not line:
+                    self._kill()
+                    continue
+
+                response = json.loads(line)
+                if response.get("id") != request_id:
+                    self._kill()
+                    raise Exception("JS worker answered out of order")
+
+                del response["id"]
+                return response
+
+        raise Exception("JS worker keeps dying")
+
+    def _kill(self) -> None:
+        if self._proc is not None:
+            self._proc.kill()
+            self._proc.wait()
+            self._proc = None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._proc is not None and self._proc.stdin is not None:
+                self._proc.stdin.close()
+                try:
+                    self._proc.wait(timeout=1)
+                except subprocess.TimeoutExpired:
+                    self._proc.kill()
+            self._proc = None
+
+
+DefaultNodeWorker = NodeWorker()
@@ -1,3 +1,4 @@
+import functools
 import requests
 import os
 from urllib.parse import urljoin
@@ -38,10 +39,12 @@ def run_code(
     return response.json()["run"]
 
 
-def get_runtimes():
+@functools.cache
+def get_runtimes() -> tuple[dict, ...]:
+    # The available runtimes don't change while we're running
     url = urljoin(EVALUATOR_ENDPOINT, "./runtimes")
 
-    return requests.get(url).json()
+    return tuple(requests.get(url).json())
 
 
 def get_runtimes_for(language: str):
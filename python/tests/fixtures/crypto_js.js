@@ -0,0 +1,89 @@
+// Generates crypto_js.json with the CryptoJS build the JS runner uses:
+//
+//   node python/tests/fixtures/crypto_js.js > python/tests/fixtures/crypto_js.json
+
+const path = require("path");
+const CryptoJS = require(
+  path.join(__dirname, "..", "..", "runners", "libraries", "js", "crypto-js.min.js"),
+);
+
+const Utf8 = CryptoJS.enc.Utf8;
+const Hex = CryptoJS.enc.Hex;
+
+const plaintexts = [
+  "",
+  "16 bytes exactly",
+  '{"sources":[{"file":"https://cdn.example/v.m3u8"}]}',
+  "Ćevapi, ćufte — 日本語の字幕 🎉",
+];
+
+const keyIv = [
+  ["37911490979715163134003223491201", "3134003223491201"],
+  ["93422192433952489752342908585752", "9262859232435825"],
+];
+
+const withKeyIv = [];
+for (const [key, iv] of keyIv) {
+  for (const plaintext of plaintexts) {
+    withKeyIv.push({
+      key,
+      iv,
+      plaintext,
+      ciphertext: CryptoJS.AES.encrypt(plaintext, Utf8.parse(key), {
+        iv: Utf8.parse(iv),
+      }).toString(),
+    });
+  }
+}
+
+const withPassphrase = [];
+for (const passphrase of ["d4c93c2c5b8e4f1a", "lozinka čćžšđ"]) {
+  for (const plaintext of plaintexts) {
+    const ciphertext = CryptoJS.AES.encrypt(plaintext, passphrase);
+    withPassphrase.push({
+      passphrase,
+      plaintext,
+      salt: ciphertext.salt.toString(Hex),
+      ciphertext: ciphertext.toString(),
+    });
+  }
+}
+
+// Blocks that don't end in valid PKCS#7 padding. CryptoJS only looks at
+// the last byte, whatever the others are.
+const badPadding = [];
+const key = keyIv[0][0];
+const iv = keyIv[0][1];
+for (const block of [
+  "41414141414141414141414141414105",
+  "414141414141414141414141414141ff",
+  "41414141414141414141414141414100",
+  "4141414141414141414141414141414141414141414141414141414141414111",
+]) {
+  const ciphertext = CryptoJS.AES.encrypt(Hex.parse(block), Utf8.parse(key), {
+    iv: Utf8.parse(iv),
+    padding: CryptoJS.pad.NoPadding,
+  }).toString();
+  const decrypted = CryptoJS.AES.decrypt(ciphertext, Utf8.parse(key), {
+    iv: Utf8.parse(iv),
+  });
+  badPadding.push({
+    key,
+    iv,
+    ciphertext,
+    // Padding longer than the data leaves a negative length
+    plaintext_hex: decrypted.sigBytes > 0 ? decrypted.toString(Hex) : "",
+  });
+}
+
+process.stdout.write(
+  JSON.stringify(
+    {
+      with_key_iv: withKeyIv,
+      with_passphrase: withPassphrase,
+      bad_padding: badPadding,
+    },
+    null,
+    2,
+  ) + "\n",
+);
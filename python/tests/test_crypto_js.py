@@ -0,0 +1,77 @@
+import json
+import os
+import unittest
+
+from python.helpers import crypto_js
+
+# Generated by fixtures/crypto_js.js with the vendored CryptoJS
+with open(
+    os.path.join(os.path.dirname(__file__), "fixtures", "crypto_js.json"),
+    encoding="utf-8",
+) as f:
+    VECTORS = json.load(f)
+
+
+class KeyIvTest(unittest.TestCase):
+    def test_decrypt(self):
+        for vector in VECTORS["with_key_iv"]:
+            with self.subTest(plaintext=vector["plaintext"], key=vector["key"]):
+                self.assertEqual(
+                    crypto_js.decrypt(vector["ciphertext"], vector["key"], vector["iv"]),
+                    vector["plaintext"].encode("utf-8"),
+                )
+
+    def test_encrypt(self):
+        for vector in VECTORS["with_key_iv"]:
+            with self.subTest(plaintext=vector["plaintext"], key=vector["key"]):
+                self.assertEqual(
+                    crypto_js.encrypt(vector["plaintext"], vector["key"], vector["iv"]),
+                    vector["ciphertext"],
+                )
+
+    def test_bad_padding_is_stripped_like_cryptojs(self):
+        for vector in VECTORS["bad_padding"]:
+            with self.subTest(ciphertext=vector["ciphertext"]):
+                self.assertEqual(
+                    crypto_js.decrypt(vector["ciphertext"], vector["key"], vector["iv"]),
+                    bytes.fromhex(vector["plaintext_hex"]),
+                )
+
+    def test_partial_block(self):
+        with self.assertRaises(ValueError):
+            crypto_js.aes_cbc_decrypt(b"\0" * 15, b"k" * 32, b"i" * 16)
+
+
+class PassphraseTest(unittest.TestCase):
+    def test_decrypt(self):
+        for vector in VECTORS["with_passphrase"]:
+            with self.subTest(plaintext=vector["plaintext"]):
+                self.assertEqual(
+                    crypto_js.decrypt_with_passphrase(
+                        vector["ciphertext"], vector["passphrase"]
+                    ),
+                    vector["plaintext"].encode("utf-8"),
+                )
+
+    def test_encrypt(self):
+        for vector in VECTORS["with_passphrase"]:
+            with self.subTest(plaintext=vector["plaintext"]):
+                self.assertEqual(
+                    crypto_js.encrypt_with_passphrase(
+                        vector["plaintext"],
+                        vector["passphrase"],
+                        salt=bytes.fromhex(vector["salt"]),
+                    ),
+                    vector["ciphertext"],
+                )
+
+    def test_round_trip_with_random_salt(self):
+        ciphertext = crypto_js.encrypt_with_passphrase("Ćevapi 🎉", "lozinka")
+        self.assertEqual(
+            crypto_js.decrypt_with_passphrase(ciphertext, "lozinka"),
+            "Ćevapi 🎉".encode("utf-8"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
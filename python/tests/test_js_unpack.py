@@ -0,0 +1,95 @@
+import os
+import unittest
+
+from python.helpers import html_extract, js_unpack
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "js_unpack")
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read().removesuffix("\n")
+
+
+class SiteFixturesTest(unittest.TestCase):
+    """Pages packed like each site packs them, unpacked as the browser would."""
+
+    def test_fixtures(self):
+        for name in ("filemoon", "kwik_download", "nested"):
+            with self.subTest(name):
+                self.assertEqual(
+                    js_unpack.unpack(read_fixture(f"{name}.packed.html")),
+                    read_fixture(f"{name}.unpacked"),
+                )
+
+    def test_kwik_embed(self):
+        # The way `handle__kwik_si` gets to the player script, past the
+        # packed preamble in front of it
+        script = html_extract.find_script(read_fixture("kwik_embed.packed.html"), ";eval(")
+        self.assertIsNotNone(script)
+        self.assertEqual(
+            js_unpack.unpack_chained_eval(script),
+            read_fixture("kwik_embed.unpacked"),
+        )
+
+
+class PackerTest(unittest.TestCase):
+    def packed(self, payload: str, radix: int, symbols: list[str], quote: str = "'") -> str:
+        q = quote
+        return (
+            f"eval(function(p,a,c,k,e,d){{return p}}({q}{payload}{q},{radix},"
+            f"{len(symbols)},{q}{'|'.join(symbols)}{q}.split({q}|{q}),0,{{}}))"
+        )
+
+    def test_first_of_several_scripts(self):
+        page = (
+            self.packed("0 1", 10, ["first", "script"])
+            + ";"
+            + self.packed("0 1", 10, ["second", "script"])
+        )
+        self.assertEqual(js_unpack.unpack_packer(page), "first script")
+
+    def test_first_of_several_scripts_with_other_quotes(self):
+        page = (
+            self.packed("0 1", 10, ["first", "script"], quote='"')
+            + ";"
+            + self.packed("0 1", 10, ["second", "script"])
+        )
+        self.assertEqual(js_unpack.unpack_packer(page), "first script")
+
+    def test_escaped_quotes_in_payload(self):
+        self.assertEqual(
+            js_unpack.unpack_packer(self.packed("0(\\'1\\')", 10, ["alert", "hi"])),
+            "alert('hi')",
+        )
+
+    def test_words_outside_the_radix_are_kept(self):
+        symbols = [f"s{i}" for i in range(40)]
+        # `1_0`, ` 1` and `A` would all be numbers to `int(word, 36)`
+        self.assertEqual(
+            js_unpack.unpack_packer(self.packed("1_0 a A", 36, symbols)),
+            "1_0 s10 A",
+        )
+        self.assertEqual(
+            js_unpack.unpack_packer(self.packed("A 10", 62, symbols)),
+            "s36 10",
+        )
+
+    def test_unbase_rejects_malformed_words(self):
+        for word, radix in (("1_0", 36), (" 1", 10), ("A", 36), ("z", 35), ("+", 62)):
+            with self.subTest(word=word, radix=radix):
+                with self.assertRaises(ValueError):
+                    js_unpack._unbase(word, radix)
+
+    def test_chained_eval_without_a_preamble(self):
+        self.assertIsNone(js_unpack.unpack_chained_eval(self.packed("0 1", 10, ["a", "b"])))
+        self.assertIsNone(js_unpack.unpack_chained_eval("var a = 1;eval(a)"))
+
+    def test_not_packed(self):
+        self.assertIsNone(js_unpack.unpack_packer("var a = 1;"))
+        self.assertIsNone(js_unpack.unpack_hunter("var a = 1;"))
+        self.assertEqual(js_unpack.unpack("var a = 1;"), "var a = 1;")
+
+
+if __name__ == "__main__":
+    unittest.main()